@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server';
 import { prisma } from '@/lib/db';
 import { requireAuthFromRequest } from '@/lib/auth';
 import { S3Client, DeleteObjectCommand } from '@aws-sdk/client-s3';
+import Redis from 'ioredis';
 
 const s3Client = new S3Client({
   endpoint: process.env.S3_ENDPOINT,
@@ -45,6 +46,20 @@ export async function DELETE(
       return NextResponse.json({ error: 'File not found' }, { status: 404 });
     }
 
+    // Stop any worker still processing this file
+    try {
+      const redis = new Redis(process.env.REDIS_URL || 'redis://localhost:6379');
+      await redis.publish('worker:control', JSON.stringify({
+        command: 'cancel',
+        fileId: file.id,
+        reason: 'deleted',
+      }));
+      redis.disconnect();
+      console.log(`[Delete] Sent cancel to workers for file ${file.id}`);
+    } catch (redisError) {
+      console.error(`[Delete] Failed to notify workers:`, redisError);
+    }
+
     // Delete from S3
     try {
       await s3Client.send(new DeleteObjectCommand({
@@ -57,6 +72,18 @@ export async function DELETE(
       // Continue anyway - file might not exist in S3
     }
 
+    // Delete the canonical 16kHz copies written by the worker at ingest
+    for (const suffix of ['.canonical.ogg', '.canonical.flac']) {
+      try {
+        await s3Client.send(new DeleteObjectCommand({
+          Bucket: process.env.S3_BUCKET,
+          Key: `${file.s3Key}${suffix}`,
+        }));
+      } catch (s3Error) {
+        console.error(`[Delete] Failed to delete canonical audio from S3:`, s3Error);
+      }
+    }
+
     // Delete transcripts from S3
     if (file.transcripts && file.transcripts.length > 0) {
       try {
@@ -70,6 +97,16 @@ export async function DELETE(
       }
     }
 
+    // Delete the job profile artifact, if the job was profiled
+    try {
+      await s3Client.send(new DeleteObjectCommand({
+        Bucket: process.env.S3_BUCKET,
+        Key: `transcripts/${file.id}.profile.json`,
+      }));
+    } catch (s3Error) {
+      console.error(`[Delete] Failed to delete job profile from S3:`, s3Error);
+    }
+
     // Delete from database (cascade will delete jobs and transcripts)
     console.log(`[Delete] Deleting from database...`);
     await prisma.file.delete({
@@ -49,7 +49,7 @@ export async function PATCH(request: NextRequest) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
     }
 
-    const { fileId } = await request.json();
+    const { fileId, profile } = await request.json();
     if (!fileId) {
       return NextResponse.json({ error: 'Missing fileId' }, { status: 400 });
     }
@@ -81,6 +81,8 @@ export async function PATCH(request: NextRequest) {
       fileId: file.id,
       s3Key: file.s3Key,
       timestamp: Date.now(),
+      // Worker uploads a CPU/memory profile of this job when set
+      ...(profile === true ? { profile: true } : {}),
     }));
     redis.disconnect();
 
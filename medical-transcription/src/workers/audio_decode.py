@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Audio Decode - in-process decoding to 16kHz mono float32
+Containers libsndfile understands (WAV, FLAC, OGG/Opus, MP3, AIFF, ...) are
+read block by block with soundfile, downmixed and resampled with a streaming
+polyphase filter. Anything else (m4a/AAC, video containers) falls back to an
+ffmpeg subprocess, as whisperx.load_audio does.
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import subprocess
+from math import gcd
+from typing import Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+READ_BLOCK_FRAMES = 1 << 18         # ~6 s at 44.1 kHz per soundfile read
+OUTPUT_CHUNK = 8192                 # outputs computed per vectorized step
+ZERO_CROSSINGS = 16                 # sinc lobes on each side of the filter
+KAISER_BETA = 8.6                   # ~80 dB stopband
+
+
+def design_polyphase_filter(up: int, down: int) -> np.ndarray:
+    """
+    Kaiser-windowed sinc low-pass for rational resampling, split into phases
+    
+    Args:
+        up: Interpolation factor L
+        down: Decimation factor M
+    
+    Returns:
+        Array (up, taps_per_phase); row p holds h[p], h[p + L], h[p + 2L], ...
+    """
+    cutoff = 0.5 / max(up, down)                        # cycles per upsampled sample
+    half = ZERO_CROSSINGS * max(up, down)
+    t = np.arange(-half, half + 1, dtype=np.float64)
+    h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(len(t), KAISER_BETA) * up
+    taps = -(-len(h) // up)
+    h = np.concatenate([h, np.zeros(taps * up - len(h))])
+    return h.reshape(taps, up).T.astype(np.float32)
+
+
+class PolyphaseResampler:
+    """Streaming rational resampler: feed input blocks, collect 16kHz output blocks"""
+    
+    def __init__(self, input_rate: int, output_rate: int = SAMPLE_RATE):
+        divisor = gcd(input_rate, output_rate)
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+        self.phases = design_polyphase_filter(self.up, self.down)[:, ::-1].copy()
+        self.taps = self.phases.shape[1]
+        self.delay = ZERO_CROSSINGS * max(self.up, self.down)   # filter centre, upsampled samples
+        # Input history, starting at absolute input index self.offset (zero history before 0)
+        self.buffer = np.zeros(self.taps - 1, dtype=np.float32)
+        self.offset = -(self.taps - 1)
+        self.next_output = 0
+        self.input_count = 0
+    
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Resample the next input block; returns every output sample it completes"""
+        self.input_count += len(block)
+        self.buffer = np.concatenate([self.buffer, block.astype(np.float32, copy=False)])
+        return self._drain(self.offset + len(self.buffer) - 1)
+    
+    def flush(self) -> np.ndarray:
+        """Emit the remaining outputs (zero-padded tail) up to the expected length"""
+        total = -(-self.input_count * self.up // self.down)
+        pad = np.zeros(self.delay // self.up + self.taps + 1, dtype=np.float32)
+        self.buffer = np.concatenate([self.buffer, pad])
+        return self._drain(self.offset + len(self.buffer) - 1, limit=total)
+    
+    def _drain(self, last_input: int, limit: Optional[int] = None) -> np.ndarray:
+        # Output n sits at upsampled position t = n*M + delay and needs inputs up to t // L
+        end = ((last_input + 1) * self.up - 1 - self.delay) // self.down + 1
+        if limit is not None:
+            end = min(end, limit)
+        if end <= self.next_output:
+            return np.zeros(0, dtype=np.float32)
+        
+        windows = np.lib.stride_tricks.sliding_window_view(self.buffer, self.taps)
+        output = np.empty(end - self.next_output, dtype=np.float32)
+        for chunk_start in range(self.next_output, end, OUTPUT_CHUNK):
+            n = np.arange(chunk_start, min(end, chunk_start + OUTPUT_CHUNK), dtype=np.int64)
+            t = n * self.down + self.delay
+            rows = t // self.up - self.offset - (self.taps - 1)
+            output[chunk_start - self.next_output:chunk_start - self.next_output + len(n)] = np.einsum(
+                'ij,ij->i', windows[rows], self.phases[t % self.up]
+            )
+        self.next_output = end
+        
+        # Keep only the history the next output still needs
+        needed = (end * self.down + self.delay) // self.up - (self.taps - 1)
+        drop = max(0, needed - self.offset)
+        self.buffer = self.buffer[drop:]
+        self.offset += drop
+        return output
+
+
+def load_audio_ffmpeg(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode through an ffmpeg subprocess (same command as whisperx.load_audio)"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-",
+    ]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def decode_in_process(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode with soundfile block by block, downmixing and resampling each block
+    
+    Args:
+        path: Audio file path
+        sample_rate: Output sample rate
+    
+    Returns:
+        Mono float32 audio
+    
+    Raises:
+        soundfile.LibsndfileError (RuntimeError) if libsndfile cannot read the file
+    """
+    import soundfile as sf
+    
+    with sf.SoundFile(path) as f:
+        resampler = PolyphaseResampler(f.samplerate, sample_rate) if f.samplerate != sample_rate else None
+        expected = -(-f.frames * sample_rate // f.samplerate) if f.frames > 0 else 0
+        output = np.empty(expected, dtype=np.float32)
+        filled = 0
+        
+        def append(samples: np.ndarray):
+            nonlocal output, filled
+            if filled + len(samples) > len(output):
+                output = np.resize(output, max(filled + len(samples), len(output) * 2))
+            output[filled:filled + len(samples)] = samples
+            filled += len(samples)
+        
+        while True:
+            block = f.read(READ_BLOCK_FRAMES, dtype='float32', always_2d=True)
+            if len(block) == 0:
+                break
+            mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+            append(resampler.process(mono) if resampler else mono)
+        if resampler:
+            append(resampler.flush())
+    return output[:filled]
+
+
+def decode_audio(
+    path: str,
+    sample_rate: int = SAMPLE_RATE,
+    fallback: Optional[Callable[[str], np.ndarray]] = None
+) -> np.ndarray:
+    """
+    Decode any audio file to mono float32 at sample_rate, in-process when possible
+    
+    Args:
+        path: Audio file path
+        sample_rate: Output sample rate
+        fallback: Decoder for formats libsndfile cannot read (default: ffmpeg subprocess)
+    
+    Returns:
+        Mono float32 audio
+    """
+    start = time.time()
+    try:
+        audio = decode_in_process(path, sample_rate)
+        method = 'soundfile'
+    except (ImportError, RuntimeError) as e:
+        # soundfile.LibsndfileError subclasses RuntimeError
+        logger.info(f"In-process decode unavailable for {os.path.basename(path)} ({e}), using ffmpeg")
+        audio = (fallback or load_audio_ffmpeg)(path)
+        method = 'ffmpeg'
+    logger.info(
+        f"Decoded {len(audio) / sample_rate:.1f}s audio via {method} in {time.time() - start:.2f}s"
+    )
+    return audio
+
+
+def _fixture(seconds: float, rate: int) -> np.ndarray:
+    """Stereo speech-like test signal: gliding harmonics with syllable-rate envelope and noise"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t)) ** 2
+    signal = 0.1 * voice * envelope + 0.005 * rng.standard_normal(len(t))
+    return np.stack([signal, 0.8 * signal], axis=1).astype(np.float32)
+
+
+def main():
+    """Benchmark in-process decoding against the ffmpeg subprocess on fixtures in each format"""
+    import tempfile
+    import soundfile as sf
+    
+    logging.basicConfig(level=logging.WARNING)
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 300.0
+    
+    # Resampler accuracy: a 1 kHz tone must survive, a 10 kHz tone must be removed
+    for rate in (8000, 22050, 44100, 48000):
+        t = np.arange(rate * 2) / rate
+        for tone, label in ((1000, 'pass'), (10000, 'stop')):
+            if tone >= rate / 2:
+                continue
+            resampler = PolyphaseResampler(rate)
+            y = np.concatenate([
+                resampler.process(np.sin(2 * np.pi * tone * t).astype(np.float32)),
+                resampler.flush()
+            ])
+            core = y[len(y) // 4:3 * len(y) // 4]
+            n = np.arange(len(y))[len(y) // 4:3 * len(y) // 4]
+            if label == 'pass':
+                error = core - np.sin(2 * np.pi * tone * n / SAMPLE_RATE)
+                print(f"{rate:>6} Hz → 16 kHz: {len(y)} samples, 1 kHz tone SNR "
+                      f"{10 * np.log10(np.mean(core ** 2) / np.mean(error ** 2)):.1f} dB", end='')
+            else:
+                print(f", 10 kHz tone residual {20 * np.log10(np.sqrt(np.mean(core ** 2)) + 1e-12):.1f} dBFS", end='')
+        print()
+    
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        spawn_start = time.time()
+        for _ in range(5):
+            subprocess.run([ffmpeg, '-version'], capture_output=True)
+        print(f"\nffmpeg process spawn: {(time.time() - spawn_start) / 5 * 1000:.0f} ms per run")
+    else:
+        print("\nffmpeg not found: subprocess timings skipped")
+    
+    print(f"\nDecode of {seconds:.0f}s stereo fixture → 16 kHz mono (x realtime):")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, rate, fmt, subtype in [
+            ('wav', 44100, 'WAV', 'PCM_16'),
+            ('wav', 48000, 'WAV', 'PCM_16'),
+            ('wav', 16000, 'WAV', 'PCM_16'),
+            ('flac', 44100, 'FLAC', 'PCM_16'),
+            ('ogg', 48000, 'OGG', 'OPUS'),
+            ('ogg', 44100, 'OGG', 'VORBIS'),
+            ('mp3', 44100, 'MP3', 'MPEG_LAYER_III'),
+        ]:
+            path = os.path.join(tmp, f"fixture_{rate}_{subtype.lower()}.{name}")
+            try:
+                # Block-wise writes: libsndfile's Vorbis encoder crashes on very large single writes
+                signal = _fixture(seconds, rate)
+                with sf.SoundFile(path, 'w', rate, 2, format=fmt, subtype=subtype) as out:
+                    for block_start in range(0, len(signal), 65536):
+                        out.write(signal[block_start:block_start + 65536])
+            except Exception as e:
+                print(f"  {name:5s} {subtype:15s} skipped ({e})")
+                continue
+            start = time.time()
+            audio = decode_in_process(path)
+            in_process = time.time() - start
+            line = (f"  {name:5s} {subtype:15s} {rate:>6} Hz {os.path.getsize(path) / 2**20:6.1f} MB  "
+                    f"in-process {in_process:6.2f}s ({seconds / in_process:6.0f}x)")
+            if ffmpeg:
+                start = time.time()
+                reference = load_audio_ffmpeg(path)
+                subprocess_seconds = time.time() - start
+                n = min(len(audio), len(reference))
+                diff = np.sqrt(np.mean((audio[:n] - reference[:n]) ** 2))
+                line += (f"  ffmpeg {subprocess_seconds:6.2f}s ({seconds / subprocess_seconds:6.0f}x)"
+                         f"  rms diff {diff:.4f}, length {len(audio)} vs {len(reference)}")
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
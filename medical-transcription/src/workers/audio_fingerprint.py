@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Audio Fingerprint - spectral-peak landmark fingerprints for near-duplicate detection
+Detects re-encoded copies of the same recording, including partial overlaps
+where one recording contains the other, before ASR runs.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_SIZE = 1024
+HOP_SIZE = 512                      # 32 ms per fingerprint frame
+MAX_BIN = 320                       # ignore content above 5 kHz
+PEAK_TIME_RADIUS = 10               # neighbourhood for local maxima (frames)
+PEAK_FREQ_RADIUS = 12               # neighbourhood for local maxima (bins)
+PEAKS_PER_SECOND = 15
+FAN_OUT = 5
+MAX_DT = 63                         # target zone length (frames, 6 bits)
+BLOCK_FRAMES = 4096                 # frames per spectrogram block (~2 min)
+MAX_HASH_POSTINGS = 500             # hashes stored more often than this (hum, silence) are skipped
+TOP_OFFSETS = 64                    # (recording, offset) histogram bins examined per query
+
+
+@dataclass
+class FingerprintMatch:
+    """A stored recording overlapping the query (stored_time = query_time + offset)"""
+    file_id: str
+    offset: float
+    matches: int
+    query_start: float
+    query_end: float
+    coverage: float
+    density: float
+
+
+def frames_to_seconds(frames):
+    return frames * HOP_SIZE / SAMPLE_RATE
+
+
+def _log_spectrogram(block: np.ndarray) -> np.ndarray:
+    """Log-magnitude spectrogram of a block of samples (frames × bins)"""
+    frames = np.lib.stride_tricks.sliding_window_view(block, FRAME_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE).astype(np.float32), axis=1))
+    return np.log(spectrum[:, :MAX_BIN] + 1e-6).astype(np.float32)
+
+
+def _max_filter(values: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """Sliding maximum over ±radius along one axis"""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (radius, radius)
+    padded = np.pad(values, pad, mode='constant', constant_values=-np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1, axis=axis)
+    return windows.max(axis=-1)
+
+
+def find_peaks(audio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pick spectral peaks (local maxima in a time/frequency neighbourhood)
+    
+    Args:
+        audio: Mono float32 audio at 16kHz
+    
+    Returns:
+        Tuple of (frame indices, frequency bins), sorted by time
+    """
+    n_frames = max(0, (len(audio) - FRAME_SIZE) // HOP_SIZE + 1)
+    peak_times, peak_bins = [], []
+    per_chunk = max(1, int(PEAKS_PER_SECOND * SAMPLE_RATE / HOP_SIZE / 32))
+    
+    for block_start in range(0, n_frames, BLOCK_FRAMES):
+        # Extend each block by the neighbourhood radius so maxima at block edges are exact
+        lo = max(0, block_start - PEAK_TIME_RADIUS)
+        hi = min(n_frames, block_start + BLOCK_FRAMES + PEAK_TIME_RADIUS)
+        spec = _log_spectrogram(audio[lo * HOP_SIZE:(hi - 1) * HOP_SIZE + FRAME_SIZE])
+        local_max = _max_filter(_max_filter(spec, PEAK_FREQ_RADIUS, 1), PEAK_TIME_RADIUS, 0)
+        floor = np.median(spec) + 2.0
+        is_peak = (spec == local_max) & (spec > floor)
+        
+        core = slice(block_start - lo, block_start - lo + min(BLOCK_FRAMES, n_frames - block_start))
+        t, f = np.nonzero(is_peak[core])
+        strength = spec[core][t, f]
+        t = t + block_start
+        
+        # Keep the strongest peaks per ~1 s chunk for an even density
+        chunk = t // 32
+        order = np.lexsort((-strength, chunk))
+        t, f, chunk = t[order], f[order], chunk[order]
+        first = np.searchsorted(chunk, chunk, side='left')
+        keep = (np.arange(len(chunk)) - first) < per_chunk
+        peak_times.append(t[keep])
+        peak_bins.append(f[keep])
+    
+    if not peak_times:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    times = np.concatenate(peak_times)
+    bins = np.concatenate(peak_bins)
+    order = np.argsort(times, kind='stable')
+    return times[order], bins[order]
+
+
+def fingerprint(audio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute landmark hashes pairing each peak with the next peaks in time
+    
+    Args:
+        audio: Mono float32 audio at 16kHz
+    
+    Returns:
+        Tuple of (hashes, anchor frame times)
+    """
+    times, bins = find_peaks(audio)
+    hashes, anchors = [], []
+    for k in range(1, FAN_OUT + 1):
+        dt = times[k:] - times[:-k]
+        valid = (dt > 0) & (dt <= MAX_DT)
+        f1, f2 = bins[:-k][valid], bins[k:][valid]
+        hashes.append((f1 << 15) | (f2 << 6) | dt[valid])
+        anchors.append(times[:-k][valid])
+    if not hashes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(hashes).astype(np.int64), np.concatenate(anchors).astype(np.int64)
+
+
+class FingerprintIndex:
+    """SQLite index of landmark hashes; lookups go through a B-tree on the hash"""
+    
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the index database
+        
+        Args:
+            db_path: SQLite file path
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS recordings (
+                id INTEGER PRIMARY KEY,
+                file_id TEXT NOT NULL UNIQUE,
+                duration REAL NOT NULL,
+                hash_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS hashes (
+                hash INTEGER NOT NULL,
+                recording_id INTEGER NOT NULL,
+                t INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_hashes_hash ON hashes(hash);
+            CREATE INDEX IF NOT EXISTS idx_hashes_recording ON hashes(recording_id);
+        """)
+        self.conn.commit()
+    
+    def add(self, file_id: str, hashes: np.ndarray, times: np.ndarray, duration: float):
+        """
+        Store (or replace) the fingerprint of a recording
+        
+        Args:
+            file_id: File ID
+            hashes: Landmark hashes from fingerprint()
+            times: Anchor frame times from fingerprint()
+            duration: Audio duration in seconds
+        """
+        with self._lock, self.conn:
+            self._remove_locked(file_id)
+            cursor = self.conn.execute(
+                "INSERT INTO recordings (file_id, duration, hash_count) VALUES (?, ?, ?)",
+                (file_id, duration, len(hashes))
+            )
+            recording_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO hashes (hash, recording_id, t) VALUES (?, ?, ?)",
+                zip(hashes.tolist(), [recording_id] * len(hashes), times.tolist())
+            )
+        logger.info(f"Stored fingerprint for file {file_id}: {len(hashes)} hashes")
+    
+    def remove(self, file_id: str):
+        """Remove a recording from the index"""
+        with self._lock, self.conn:
+            self._remove_locked(file_id)
+    
+    def _remove_locked(self, file_id: str):
+        row = self.conn.execute("SELECT id FROM recordings WHERE file_id = ?", (file_id,)).fetchone()
+        if row:
+            self.conn.execute("DELETE FROM hashes WHERE recording_id = ?", (row[0],))
+            self.conn.execute("DELETE FROM recordings WHERE id = ?", (row[0],))
+    
+    def match(
+        self,
+        hashes: np.ndarray,
+        times: np.ndarray,
+        min_matches: int = 30,
+        exclude_file_id: Optional[str] = None,
+        max_postings: int = MAX_HASH_POSTINGS
+    ) -> List[FingerprintMatch]:
+        """
+        Find stored recordings sharing a consistent time offset with the query.
+        The offset histogram is built in SQL and only its top bins are read,
+        so the cost does not grow with the size of the archive.
+        
+        Args:
+            hashes: Query landmark hashes
+            times: Query anchor frame times
+            min_matches: Minimum aligned hash matches to report a recording
+            exclude_file_id: File ID to ignore (the query itself on re-runs)
+            max_postings: Skip hashes stored more often than this (carry no identity)
+        
+        Returns:
+            Matches ordered by number of aligned hashes
+        """
+        if len(hashes) == 0:
+            return []
+        # Committed (or rolled back) as one transaction: the temp tables never hold a write open
+        with self._lock, self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS query (hash INTEGER, t INTEGER)")
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_hashes (hash INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM query")
+            self.conn.execute("DELETE FROM query_hashes")
+            self.conn.executemany("INSERT INTO query VALUES (?, ?)", zip(hashes.tolist(), times.tolist()))
+            # Distinctive hashes only: the posting probe stops after max_postings entries
+            self.conn.execute(
+                "INSERT INTO query_hashes SELECT DISTINCT hash FROM query q WHERE NOT EXISTS "
+                "(SELECT 1 FROM hashes h WHERE h.hash = q.hash LIMIT 1 OFFSET ?)",
+                (max_postings,)
+            )
+            excluded = self.conn.execute(
+                "SELECT id FROM recordings WHERE file_id = ?", (exclude_file_id or '',)
+            ).fetchone()
+            excluded_id = excluded[0] if excluded else -1
+            
+            # Offset histogram per recording, largest bins first; re-encoding jitters offsets by ±1 frame.
+            # CROSS JOIN and +recording_id pin the plan to hash lookups (never a scan of the archive)
+            bins = self.conn.execute(
+                "SELECT h.recording_id, h.t - q.t AS delta, COUNT(*) AS n FROM query q "
+                "CROSS JOIN query_hashes d ON d.hash = q.hash "
+                "CROSS JOIN hashes h ON h.hash = q.hash "
+                "WHERE +h.recording_id != ? "
+                "GROUP BY h.recording_id, delta HAVING n >= ? ORDER BY n DESC LIMIT ?",
+                (excluded_id, max(1, min_matches // 3), TOP_OFFSETS)
+            ).fetchall()
+            histogram: Dict[int, Dict[int, int]] = {}
+            for recording_id, delta, count in bins:
+                histogram.setdefault(recording_id, {})[delta] = count
+            
+            candidates = []
+            for recording_id, counts in histogram.items():
+                best = max(counts, key=lambda delta: sum(counts.get(delta + d, 0) for d in (-1, 0, 1)))
+                n_aligned, start, end = self.conn.execute(
+                    "SELECT COUNT(*), MIN(q.t), MAX(q.t) FROM query q "
+                    "CROSS JOIN query_hashes d ON d.hash = q.hash "
+                    "CROSS JOIN hashes h ON h.hash = q.hash "
+                    "WHERE +h.recording_id = ? AND h.t - q.t BETWEEN ? AND ?",
+                    (recording_id, best - 1, best + 1)
+                ).fetchone()
+                if n_aligned >= min_matches:
+                    file_id = self.conn.execute(
+                        "SELECT file_id FROM recordings WHERE id = ?", (recording_id,)
+                    ).fetchone()[0]
+                    candidates.append((file_id, best, n_aligned, start, end))
+            self.conn.execute("DELETE FROM query")
+            self.conn.execute("DELETE FROM query_hashes")
+        
+        query_span = max(1, int(times.max()) - int(times.min()))
+        results = []
+        for file_id, best, n_aligned, start, end in candidates:
+            in_span = np.count_nonzero((times >= start) & (times <= end))
+            results.append(FingerprintMatch(
+                file_id=file_id,
+                offset=frames_to_seconds(int(best)),
+                matches=n_aligned,
+                query_start=frames_to_seconds(start),
+                query_end=frames_to_seconds(end),
+                coverage=(end - start) / query_span,
+                density=float(n_aligned / max(1, in_span)),
+            ))
+        results.sort(key=lambda m: m.matches, reverse=True)
+        return results
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
+
+
+def main():
+    """Fingerprint an audio file and look it up in the index"""
+    import soundfile as sf
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    if len(sys.argv) < 2:
+        print("Usage: python audio_fingerprint.py <audio_file> [file_id_to_add]")
+        sys.exit(1)
+    
+    audio, sample_rate = sf.read(sys.argv[1], dtype='float32', always_2d=True)
+    audio = audio.mean(axis=1)
+    if sample_rate != SAMPLE_RATE:
+        print(f"Expected {SAMPLE_RATE} Hz audio, got {sample_rate} Hz")
+        sys.exit(1)
+    
+    start = time.time()
+    hashes, times = fingerprint(audio)
+    print(f"{len(hashes)} hashes for {len(audio) / SAMPLE_RATE:.1f}s audio in {time.time() - start:.2f}s")
+    
+    index = FingerprintIndex(os.getenv(
+        'FINGERPRINT_INDEX_PATH',
+        data_path('fingerprints.db')
+    ))
+    start = time.time()
+    for match in index.match(hashes, times):
+        print(match)
+    print(f"Lookup in {(time.time() - start) * 1000:.0f} ms")
+    if len(sys.argv) > 2:
+        index.add(sys.argv[2], hashes, times, len(audio) / SAMPLE_RATE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Audio Ingest - canonical 16kHz mono copy of every upload
+The first job for an upload transcodes the decoded audio once into a compact
+canonical object stored next to the original ({s3Key}.canonical.ogg, Opus,
+or .canonical.flac); every later run downloads and decodes that object
+instead of the original 44.1/48 kHz stereo recording.
+
+Encoding runs in-process with soundfile (libsndfile 1.0.29+ writes Ogg/Opus),
+so no ffmpeg is needed for the canonical copy.
+
+The copy is not free: Opus encoding takes about 2.2 s per minute of audio on
+one core (~7 CPU-minutes for a 3-hour recording), paid once by the first
+job on the ingest thread while ASR runs. It only pays off once a file is
+transcribed again, after roughly 2-3 runs (see the break-even column of the
+benchmark below). FLAC encodes ~100x faster but is ~5x larger, and breaks
+even on the first re-run. Each job reports the encode time as
+ingest.encode_seconds.
+"""
+
+import io
+import os
+import sys
+import time
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# codec → (soundfile format, subtype, key suffix, content type)
+CODECS = {
+    'opus': ('OGG', 'OPUS', '.canonical.ogg', 'audio/ogg'),
+    'flac': ('FLAC', 'PCM_16', '.canonical.flac', 'audio/flac'),
+}
+
+
+def canonical_codec() -> Optional[str]:
+    """Codec of the canonical copy (CANONICAL_AUDIO_CODEC: opus, flac or off); None if disabled"""
+    codec = os.getenv('CANONICAL_AUDIO_CODEC', 'opus').lower()
+    if codec == 'off':
+        return None
+    if codec not in CODECS:
+        raise ValueError(f"CANONICAL_AUDIO_CODEC must be opus, flac or off: {codec}")
+    return codec
+
+
+def canonical_key(s3_key: str, codec: str) -> str:
+    """S3 key of the canonical copy of an upload"""
+    return s3_key + CODECS[codec][2]
+
+
+def opus_compression_level(bitrate_kbps: float) -> float:
+    """
+    libsndfile compression level for an Opus bitrate: the level maps linearly
+    from ~256 kbit/s (0.0) down to ~6 kbit/s (1.0) per channel
+    """
+    return float(min(1.0, max(0.0, 1.0 - (bitrate_kbps - 6.0) / 250.0)))
+
+
+def encode_canonical(audio: np.ndarray, codec: str = 'opus', bitrate_kbps: Optional[float] = None) -> bytes:
+    """
+    Encode decoded audio as the canonical object
+    
+    Args:
+        audio: Mono float32 audio at 16kHz
+        codec: opus or flac
+        bitrate_kbps: Opus bitrate (default: CANONICAL_OPUS_KBPS or 32)
+    
+    Returns:
+        Encoded file contents
+    """
+    import soundfile as sf
+    
+    file_format, subtype, _, _ = CODECS[codec]
+    options: Dict[str, Any] = {}
+    if codec == 'opus':
+        bitrate_kbps = bitrate_kbps or float(os.getenv('CANONICAL_OPUS_KBPS', '32'))
+        options['compression_level'] = opus_compression_level(bitrate_kbps)
+    buffer = io.BytesIO()
+    sf.write(buffer, np.asarray(audio, dtype=np.float32), SAMPLE_RATE, format=file_format, subtype=subtype, **options)
+    return buffer.getvalue()
+
+
+@dataclass
+class IngestStats:
+    """Where a job's audio came from and what fetching and decoding it cost"""
+    source: str                          # canonical or original
+    codec: Optional[str]
+    bytes: int                           # downloaded
+    original_bytes: Optional[int]        # size of the upload (from the canonical object's metadata)
+    download_seconds: float
+    decode_seconds: float = 0.0
+    encode_seconds: Optional[float] = None   # canonical copy written by this job
+    
+    def to_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        if self.original_bytes:
+            stats['bytes_saved_ratio'] = round(self.original_bytes / max(self.bytes, 1), 1)
+        return stats
+
+
+def _fixture(seconds: float, rate: int, channels: int) -> np.ndarray:
+    """Speech-like test signal: voiced bursts with formant-ish harmonics and pauses"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8)) * (np.sin(2 * np.pi * 1.7 * t) > -0.2)
+    signal = 0.2 * voiced + 0.005 * rng.standard_normal(len(t))
+    return np.repeat(signal[:, None], channels, axis=1).astype(np.float32)
+
+
+def main():
+    """
+    Ingest saving benchmark: bytes, download time and decode time of a typical
+    recorder upload against its canonical copies
+    
+    Usage:
+        python audio_ingest.py [minutes] [download_mbps]
+    """
+    import tempfile
+    import soundfile as sf
+    from audio_decode import decode_audio
+    
+    logging.basicConfig(level=logging.WARNING)
+    args = sys.argv[1:]
+    minutes = float(args[0]) if args else 10.0
+    mbps = float(args[1]) if len(args) > 1 else 100.0
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        original = os.path.join(workdir, 'upload.wav')
+        sf.write(original, _fixture(minutes * 60, 48000, 2), 48000, subtype='PCM_16')
+        
+        start = time.time()
+        audio = decode_audio(original)
+        original_decode = time.time() - start
+        original_bytes = os.path.getsize(original)
+        print(f"{minutes:.0f} min 48 kHz stereo WAV, download at {mbps:.0f} Mbit/s")
+        print(f"  {'object':22s} {'bytes':>12s} {'download':>9s} {'decode':>8s} {'encode':>8s} {'break-even':>11s}")
+        original_fetch = original_bytes * 8 / mbps / 1e6 + original_decode
+        print(f"  {'original':22s} {original_bytes:12,d} {original_bytes * 8 / mbps / 1e6:8.2f}s "
+              f"{original_decode:7.2f}s {'-':>8s} {'-':>11s}")
+        
+        for codec in CODECS:
+            start = time.time()
+            data = encode_canonical(audio, codec)
+            encode = time.time() - start
+            path = os.path.join(workdir, 'upload' + CODECS[codec][2])
+            with open(path, 'wb') as f:
+                f.write(data)
+            start = time.time()
+            decoded = decode_audio(path)
+            decode = time.time() - start
+            download = len(data) * 8 / mbps / 1e6
+            # Re-runs after the first job needed to earn back the encoding time
+            saved = original_fetch - (download + decode)
+            break_even = f"{encode / saved:.1f} runs" if saved > 0 else "never"
+            print(f"  {canonical_key('', codec)[1:]:22s} {len(data):12,d} {download:8.2f}s {decode:7.2f}s {encode:7.2f}s"
+                  f" {break_even:>11s}  ({original_bytes / len(data):.0f}x smaller, "
+                  f"{original_fetch / (download + decode):.1f}x faster to fetch+decode,"
+                  f" {len(decoded) / SAMPLE_RATE:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Audio Segmentation - energy-based VAD and silence-aligned windowing
+Splits decoded 16kHz audio into windows that can be transcribed independently
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+@dataclass
+class AudioWindow:
+    """Silence-aligned slice of the decoded audio (sample offsets)"""
+    index: int
+    start: int
+    end: int
+    
+    @property
+    def start_time(self) -> float:
+        return self.start / SAMPLE_RATE
+    
+    @property
+    def end_time(self) -> float:
+        return self.end / SAMPLE_RATE
+    
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start) / SAMPLE_RATE
+
+
+def frame_energy(audio: np.ndarray, frame_ms: int = 30) -> np.ndarray:
+    """
+    Compute per-frame RMS energy
+    
+    Args:
+        audio: Mono float32 audio at 16kHz
+        frame_ms: Frame length in milliseconds
+    
+    Returns:
+        Array of RMS values, one per frame
+    """
+    hop = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(audio) // hop
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * hop].reshape(n_frames, hop).astype(np.float32)
+    return np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+
+
+def detect_voice_activity(
+    energy: np.ndarray,
+    threshold_ratio: float = 3.0,
+    noise_percentile: float = 5.0,
+    min_threshold: float = 1e-5
+) -> np.ndarray:
+    """
+    Mark frames as voiced when their energy clearly exceeds the recording's
+    own noise floor (a low percentile of the frame energies), so speech from a
+    quiet, low-gain recorder counts as well as from a loud one. The threshold
+    is capped relative to the loudest frames so recordings with hardly any
+    pauses still count as speech.
+    
+    Args:
+        energy: Per-frame RMS energy
+        threshold_ratio: Multiple of the noise floor counted as speech
+        noise_percentile: Percentile of the frame energies taken as noise floor
+        min_threshold: Digital silence (about -100 dBFS), never speech
+    
+    Returns:
+        Boolean array, True for voiced frames
+    """
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor, loud = np.percentile(energy, [noise_percentile, 95])
+    threshold = max(min(noise_floor * threshold_ratio, loud * 0.1), min_threshold)
+    return energy > threshold
+
+
+def split_audio(
+    audio: np.ndarray,
+    window_seconds: float = 240.0,
+    search_seconds: float = 30.0,
+    padding_seconds: float = 0.2,
+    frame_ms: int = 30
+) -> List[AudioWindow]:
+    """
+    Split audio into windows of roughly window_seconds, cutting at the
+    quietest frame near each boundary and dropping silent windows.
+    
+    Args:
+        audio: Mono float32 audio at 16kHz
+        window_seconds: Target window length
+        search_seconds: How far before the target boundary to look for silence
+        padding_seconds: Silence kept around voiced regions inside a window
+        frame_ms: Frame length used for energy/VAD
+    
+    Returns:
+        List of AudioWindow in chronological order
+    """
+    hop = SAMPLE_RATE * frame_ms // 1000
+    energy = frame_energy(audio, frame_ms)
+    voiced = detect_voice_activity(energy)
+    n_frames = len(energy)
+    
+    window_frames = max(1, int(window_seconds * 1000 / frame_ms))
+    search_frames = max(1, int(search_seconds * 1000 / frame_ms))
+    pad_frames = int(padding_seconds * 1000 / frame_ms)
+    
+    windows: List[AudioWindow] = []
+    cursor = 0
+    while cursor < n_frames:
+        target = cursor + window_frames
+        if target >= n_frames:
+            boundary = n_frames
+        else:
+            lo = max(cursor + 1, target - search_frames)
+            boundary = lo + int(np.argmin(energy[lo:target]))
+        
+        speech = voiced[cursor:boundary]
+        if speech.any():
+            first = cursor + int(np.argmax(speech))
+            last = boundary - int(np.argmax(speech[::-1]))
+            first = max(cursor, first - pad_frames)
+            last = min(boundary, last + pad_frames)
+            end_sample = len(audio) if boundary == n_frames and last == boundary else last * hop
+            windows.append(AudioWindow(len(windows), first * hop, end_sample))
+        cursor = boundary
+    
+    logger.info(
+        f"Split {len(audio) / SAMPLE_RATE:.1f}s audio into {len(windows)} windows "
+        f"({int(voiced.sum()) * frame_ms / 1000:.1f}s voiced)"
+    )
+    return windows
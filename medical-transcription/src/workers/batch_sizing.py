@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Batch Sizing - pick the ASR batch size from free memory and model footprint
+Halves the batch size and retries on out-of-memory instead of failing the job,
+and remembers per host/device/model what worked in a small JSON profile.
+WORKER_SIMULATED_MEMORY_MB emulates a memory limit so the backoff can be
+exercised on CPU.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import socket
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+# Approximate float16 footprint: (weights MB, activation MB per batch item)
+MODEL_FOOTPRINT_MB = {
+    'tiny': (150, 40),
+    'base': (300, 60),
+    'small': (1000, 120),
+    'medium': (2600, 220),
+    'large-v1': (4700, 350),
+    'large-v2': (4700, 350),
+    'large-v3': (4700, 350),
+    'distil-large-v3': (2600, 300),
+    'kotoba-tech/kotoba-whisper-v2.0-faster': (2600, 300),
+}
+COMPUTE_TYPE_SCALE = {
+    'int8': 0.5,
+    'int8_float16': 0.6,
+    'float16': 1.0,
+    'float32': 2.0,
+}
+SAFETY_FRACTION = 0.8
+
+
+def is_out_of_memory(error: BaseException) -> bool:
+    """True for host or GPU allocation failures (torch, CTranslate2, Python)"""
+    if isinstance(error, MemoryError) or type(error).__name__ == 'OutOfMemoryError':
+        return True
+    message = str(error).lower()
+    return isinstance(error, RuntimeError) and (
+        'out of memory' in message or 'cuda_error_out_of_memory' in message
+    )
+
+
+def host_available_memory_mb() -> float:
+    """Available host memory (MemAvailable on Linux)"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (ValueError, OSError, AttributeError):
+        return 4096.0
+
+
+class BatchProfile:
+    """Per host/device/model/compute-type record of batch sizes that worked or failed"""
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable batch profile {self.path}: {e}")
+    
+    def get(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.entries.get(key, {}))
+    
+    def record(self, key: str, batch_size: int, ok: bool):
+        """
+        Remember a success (largest OK) or an out-of-memory (smallest failing)
+        batch size; the file is only rewritten when one of them changes
+        """
+        with self._lock:
+            entry = self.entries.setdefault(key, {'max_ok': None, 'min_failed': None})
+            before = (entry.get('max_ok'), entry.get('min_failed'))
+            field, better = ('max_ok', max) if ok else ('min_failed', min)
+            previous = entry.get(field)
+            entry[field] = batch_size if previous is None else better(previous, batch_size)
+            # Newest observation wins when the two disagree (free memory changed)
+            if ok and entry.get('min_failed') is not None and entry['min_failed'] <= batch_size:
+                entry['min_failed'] = None
+            if not ok and entry.get('max_ok') is not None and entry['max_ok'] >= batch_size:
+                entry['max_ok'] = None
+            if (entry.get('max_ok'), entry.get('min_failed')) == before:
+                return
+            entry['updated'] = time.time()
+            self._save_locked()
+    
+    def _save_locked(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save batch profile {self.path}: {e}")
+
+
+class BatchSizer:
+    """Chooses and adapts the batch size for one model on one device"""
+    
+    def __init__(
+        self,
+        model_size: str,
+        device: str,
+        compute_type: str,
+        profile: Optional[BatchProfile] = None,
+        free_memory_mb: Optional[Callable[[], float]] = None,
+        on_out_of_memory: Optional[Callable[[], None]] = None
+    ):
+        """
+        Args:
+            model_size: Whisper model name (key of MODEL_FOOTPRINT_MB)
+            device: cuda or cpu
+            compute_type: float16, int8, ...
+            profile: Persisted batch profile (None: do not learn)
+            free_memory_mb: Probe for free device memory (default: host MemAvailable)
+            on_out_of_memory: Cleanup after an out-of-memory error (e.g. torch.cuda.empty_cache)
+        """
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.profile = profile
+        self.free_memory_mb = free_memory_mb or host_available_memory_mb
+        self.on_out_of_memory = on_out_of_memory
+        self.fixed = int(os.getenv('WORKER_BATCH_SIZE', '0'))
+        # CPU inference gains little from batching beyond a few items and the
+        # host memory is shared with decoding and diarization
+        self.max_batch_size = int(os.getenv('WORKER_MAX_BATCH_SIZE', '64' if device == 'cuda' else '8'))
+        simulated = os.getenv('WORKER_SIMULATED_MEMORY_MB')
+        self.simulated_memory_mb = float(simulated) if simulated else None
+        self.key = f"{socket.gethostname()}|{device}|{model_size}|{compute_type}"
+        
+        weights, per_item = MODEL_FOOTPRINT_MB.get(model_size, MODEL_FOOTPRINT_MB['large-v2'])
+        scale = COMPUTE_TYPE_SCALE.get(compute_type, 1.0)
+        self.weights_mb = weights * scale
+        self.per_item_mb = per_item * scale
+    
+    def choose(self) -> int:
+        """
+        Batch size for the next call
+        
+        Without a learned size this is the memory estimate. Once a size has
+        worked it is the starting point: the next call probes twice that size
+        while it is still below the smallest failing one, so the profile
+        converges on the largest size that fits.
+        """
+        if self.fixed > 0:
+            return self.fixed
+        if self.simulated_memory_mb is not None:
+            free = self.simulated_memory_mb - self.weights_mb
+        else:
+            free = self.free_memory_mb()
+        batch_size = self._power_of_two(free * SAFETY_FRACTION / self.per_item_mb)
+        
+        learned = self.profile.get(self.key) if self.profile else {}
+        max_ok, min_failed = learned.get('max_ok'), learned.get('min_failed')
+        if max_ok:
+            batch_size = max(max_ok, batch_size) if min_failed is None else max_ok * 2
+        if min_failed:
+            batch_size = min(batch_size, min_failed - 1)
+        return self._power_of_two(batch_size)
+    
+    def _power_of_two(self, value: float) -> int:
+        size = 1
+        while size * 2 <= min(value, self.max_batch_size):
+            size *= 2
+        return size
+    
+    def run(self, fn: Callable[[int], Any], stage: str = "asr") -> Any:
+        """
+        Call fn(batch_size), halving the batch size on out-of-memory until it fits
+        
+        Args:
+            fn: Work to run with a given batch size
+            stage: Stage name for logging
+        
+        Returns:
+            fn's result
+        """
+        batch_size = self.choose()
+        while True:
+            try:
+                self._check_simulated_limit(batch_size)
+                result = fn(batch_size)
+            except Exception as e:
+                if not is_out_of_memory(e):
+                    raise
+                if self.profile and not self.fixed:
+                    self.profile.record(self.key, batch_size, ok=False)
+                if batch_size == 1:
+                    raise
+                logger.warning(f"Out of memory in {stage} at batch_size={batch_size}, retrying with {batch_size // 2}")
+                batch_size //= 2
+                gc.collect()
+                if self.on_out_of_memory:
+                    self.on_out_of_memory()
+                continue
+            if self.profile and not self.fixed:
+                self.profile.record(self.key, batch_size, ok=True)
+            return result
+    
+    def _check_simulated_limit(self, batch_size: int):
+        """Raise MemoryError like a real allocation would under the simulated limit"""
+        if self.simulated_memory_mb is None:
+            return
+        needed = self.weights_mb + batch_size * self.per_item_mb
+        if needed > self.simulated_memory_mb:
+            raise MemoryError(
+                f"simulated out of memory: {needed:.0f} MB needed, limit {self.simulated_memory_mb:.0f} MB"
+            )
+
+
+def main():
+    """Show the batch size chosen for a model and exercise the out-of-memory backoff"""
+    logging.basicConfig(level=logging.INFO)
+    
+    model_size = sys.argv[1] if len(sys.argv) > 1 else 'large-v2'
+    compute_type = sys.argv[2] if len(sys.argv) > 2 else 'float16'
+    profile = BatchProfile(os.getenv(
+        'BATCH_PROFILE_PATH',
+        data_path('batch_profile.json')
+    ))
+    sizer = BatchSizer(model_size, 'cpu', compute_type, profile=profile)
+    print(f"{sizer.key}: weights {sizer.weights_mb:.0f} MB, {sizer.per_item_mb:.0f} MB per batch item")
+    print(f"Chosen batch size: {sizer.choose()}")
+    
+    # Pretend the real limit is half of what the footprint table predicts
+    real_limit = sizer.choose() // 2 or 1
+    
+    def fake_transcribe(batch_size: int) -> int:
+        if batch_size > real_limit:
+            raise RuntimeError("CUDA failed with error out of memory")
+        return batch_size
+    
+    print(f"Ran with batch size {sizer.run(fake_transcribe)} (limit {real_limit})")
+    print(f"Next run chooses {sizer.choose()}; profile: {json.dumps(profile.get(sizer.key))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Calibration - pick the Whisper model size and compute type for this host
+Benchmarks candidate models and compute types on a short reference clip,
+most accurate first, and keeps the first configuration whose real-time
+factor (processing seconds per audio second) meets the target. The result
+is stored per host in a JSON profile; WHISPER_MODEL_SIZE=auto uses it.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import socket
+import platform
+import logging
+import threading
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+import numpy as np
+
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Most accurate first; second field restricts a model to one language
+CANDIDATE_MODELS: List[Tuple[str, Optional[str]]] = [
+    ('large-v3', None),
+    ('large-v2', None),
+    ('kotoba-tech/kotoba-whisper-v2.0-faster', 'ja'),   # Japanese distillation of large-v3
+    ('distil-large-v3', 'en'),
+    ('medium', None),
+    ('small', None),
+    ('base', None),
+    ('tiny', None),
+]
+
+# Most accurate first per device; float16 before float32 on GPU (same accuracy, faster)
+COMPUTE_TYPE_ORDER = {
+    'cuda': ['float16', 'float32', 'int8_float16', 'int8'],
+    'cpu': ['float32', 'int8'],
+}
+COMPUTE_TYPE_TIER = {'float32': 2, 'float16': 2, 'int8_float16': 1, 'int8': 0}
+
+
+@dataclass
+class CalibrationResult:
+    """Measured speed of one model/compute-type candidate"""
+    model_size: str
+    compute_type: str
+    rtf: Optional[float] = None
+    load_seconds: Optional[float] = None
+    meets_target: bool = False
+    error: Optional[str] = None
+
+
+def host_key(device: str) -> str:
+    """Profile key: host name, device and accelerator/CPU description"""
+    accelerator = f"{platform.processor() or platform.machine()} x{os.cpu_count()}"
+    if device == 'cuda':
+        try:
+            import torch
+            accelerator = torch.cuda.get_device_name(0)
+        except Exception as e:
+            logger.debug(f"GPU name unavailable: {e}")
+    return f"{socket.gethostname()}|{device}|{accelerator}"
+
+
+def supported_compute_types(device: str) -> List[str]:
+    """Compute types CTranslate2 supports on the device, most accurate first"""
+    order = COMPUTE_TYPE_ORDER.get(device, COMPUTE_TYPE_ORDER['cpu'])
+    try:
+        import ctranslate2
+        supported = ctranslate2.get_supported_compute_types(device)
+    except Exception:
+        return order
+    return [compute_type for compute_type in order if compute_type in supported]
+
+
+def candidate_models(language: Optional[str] = 'ja') -> List[str]:
+    """Candidate model names, most accurate first (CALIBRATION_CANDIDATES overrides)"""
+    override = os.getenv('CALIBRATION_CANDIDATES')
+    if override:
+        return [name.strip() for name in override.split(',') if name.strip()]
+    return [name for name, only in CANDIDATE_MODELS if only is None or language is None or only == language]
+
+
+def load_reference_clip(path: Optional[str], seconds: float = 60.0) -> Tuple[np.ndarray, str]:
+    """
+    Reference audio for benchmarking
+    
+    Args:
+        path: Speech recording (CALIBRATION_CLIP)
+        seconds: Clip length
+    
+    Returns:
+        (16kHz mono float32 audio, clip description)
+    
+    Raises:
+        ValueError: No clip is configured
+    """
+    if not path:
+        # VAD and decoding run far faster on synthetic audio than on speech, which
+        # would pick a model too slow for real recordings
+        raise ValueError(
+            "CALIBRATION_CLIP is required to calibrate: set it to a speech recording "
+            "(a real consultation recording is best)"
+        )
+    from audio_decode import decode_audio
+    audio = decode_audio(path)[:int(seconds * SAMPLE_RATE)]
+    return audio, os.path.basename(path)
+
+
+class CalibrationProfile:
+    """Per-host calibration results, stored as JSON"""
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable calibration profile {self.path}: {e}")
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self.entries.get(key)
+            return dict(entry) if entry else None
+    
+    def store(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self.entries[key] = entry
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_name(self.path.name + '.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to save calibration profile {self.path}: {e}")
+
+
+def calibrate(
+    load_model: Callable[[str, str], Any],
+    transcribe: Callable[[Any, np.ndarray], Any],
+    audio: np.ndarray,
+    device: str,
+    target_rtf: float = 1.0,
+    models: Optional[List[str]] = None,
+    compute_types: Optional[List[str]] = None,
+    unload: Optional[Callable[[], None]] = None,
+    exhaustive: bool = False
+) -> Dict[str, Any]:
+    """
+    Benchmark candidates, most accurate first, and pick the first that meets the target
+    
+    A warm-up run absorbs one-off costs (CUDA kernels, caches); only when its
+    RTF is within twice the target is a second, timed run made. Once a
+    compute type misses the target, compute types of the same accuracy tier
+    are skipped for that model.
+    
+    Args:
+        load_model: Loads (model_size, compute_type) on the device
+        transcribe: Transcribes audio with a loaded model
+        audio: Reference clip (16kHz mono float32)
+        device: cuda or cpu
+        target_rtf: Required processing seconds per audio second
+        models: Candidate models, most accurate first (default: candidate_models())
+        compute_types: Candidate compute types (default: supported_compute_types(device))
+        unload: Frees device memory between candidates (e.g. torch.cuda.empty_cache)
+        exhaustive: Measure every candidate instead of stopping at the first match
+    
+    Returns:
+        Profile entry: chosen model_size/compute_type, its rtf and all results
+    """
+    models = models or candidate_models()
+    compute_types = compute_types or supported_compute_types(device)
+    clip_seconds = len(audio) / SAMPLE_RATE
+    results: List[CalibrationResult] = []
+    chosen: Optional[CalibrationResult] = None
+    
+    for model_size in models:
+        failed_tiers = set()
+        for compute_type in compute_types:
+            tier = COMPUTE_TYPE_TIER.get(compute_type, 0)
+            if tier in failed_tiers and not exhaustive:
+                continue
+            result = _measure(load_model, transcribe, audio, model_size, compute_type, target_rtf, unload)
+            results.append(result)
+            rtf_text = f"RTF {result.rtf:.3f}" if result.rtf is not None else f"failed ({result.error})"
+            logger.info(f"Calibration {model_size}/{compute_type}: {rtf_text} (target {target_rtf})")
+            if result.meets_target:
+                chosen = chosen or result
+            else:
+                failed_tiers.add(tier)
+            if chosen and not exhaustive:
+                break
+        if chosen and not exhaustive:
+            break
+    
+    if chosen is None:
+        measured = [result for result in results if result.rtf is not None]
+        if not measured:
+            raise RuntimeError("Calibration failed: no candidate model could be loaded")
+        chosen = min(measured, key=lambda result: result.rtf)
+        logger.warning(
+            f"No configuration meets RTF {target_rtf}; using the fastest, "
+            f"{chosen.model_size}/{chosen.compute_type} (RTF {chosen.rtf:.3f})"
+        )
+    
+    return {
+        'model_size': chosen.model_size,
+        'compute_type': chosen.compute_type,
+        'rtf': chosen.rtf,
+        'meets_target': chosen.meets_target,
+        'target_rtf': target_rtf,
+        'device': device,
+        'clip_seconds': clip_seconds,
+        'calibrated_at': time.time(),
+        'results': [asdict(result) for result in results],
+    }
+
+
+def _measure(
+    load_model: Callable[[str, str], Any],
+    transcribe: Callable[[Any, np.ndarray], Any],
+    audio: np.ndarray,
+    model_size: str,
+    compute_type: str,
+    target_rtf: float,
+    unload: Optional[Callable[[], None]]
+) -> CalibrationResult:
+    """Load one candidate, time it on the clip and free it again"""
+    clip_seconds = len(audio) / SAMPLE_RATE
+    result = CalibrationResult(model_size, compute_type)
+    model = None
+    try:
+        start = time.perf_counter()
+        model = load_model(model_size, compute_type)
+        result.load_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        transcribe(model, audio)
+        rtf = (time.perf_counter() - start) / clip_seconds
+        if rtf <= 2 * target_rtf:
+            start = time.perf_counter()
+            transcribe(model, audio)
+            rtf = (time.perf_counter() - start) / clip_seconds
+        result.rtf = rtf
+        result.meets_target = rtf <= target_rtf
+    except Exception as e:
+        # Unsupported compute type, missing weights, out of memory, ...
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        del model
+        gc.collect()
+        if unload:
+            unload()
+    return result
+
+
+def auto_configure(
+    device: str,
+    load_model: Callable[[str, str], Any],
+    transcribe: Callable[[Any, np.ndarray], Any],
+    unload: Optional[Callable[[], None]] = None,
+    force: bool = False,
+    language: Optional[str] = 'ja'
+) -> Dict[str, Any]:
+    """
+    Calibrated configuration for this host, calibrating first if there is none
+    
+    Reads CALIBRATION_RTF_TARGET, CALIBRATION_PROFILE_PATH, CALIBRATION_CLIP,
+    CALIBRATION_CLIP_SECONDS and CALIBRATION_FORCE (see the worker docstring).
+    
+    Args:
+        device: cuda or cpu
+        load_model: Loads (model_size, compute_type) on the device
+        transcribe: Transcribes audio with a loaded model
+        unload: Frees device memory between candidates
+        force: Recalibrate even if the profile has an entry for this host
+        language: Transcription language (filters language-specific models)
+    
+    Returns:
+        Profile entry with model_size and compute_type
+    """
+    target_rtf = float(os.getenv('CALIBRATION_RTF_TARGET', '1.0'))
+    profile = CalibrationProfile(os.getenv('CALIBRATION_PROFILE_PATH', data_path('calibration_profile.json')))
+    key = host_key(device)
+    force = force or os.getenv('CALIBRATION_FORCE', '0') == '1'
+    
+    entry = profile.get(key)
+    if entry and not force and entry.get('target_rtf') == target_rtf:
+        logger.info(
+            f"Calibrated configuration for {key}: {entry['model_size']}/{entry['compute_type']} "
+            f"(RTF {entry['rtf']:.3f}, target {target_rtf})"
+        )
+        return entry
+    
+    audio, clip = load_reference_clip(
+        os.getenv('CALIBRATION_CLIP'), float(os.getenv('CALIBRATION_CLIP_SECONDS', '60'))
+    )
+    logger.info(f"Calibrating {key} on {clip} ({len(audio) / SAMPLE_RATE:.0f}s), target RTF {target_rtf}...")
+    start = time.time()
+    entry = calibrate(
+        load_model, transcribe, audio, device, target_rtf,
+        models=candidate_models(language), unload=unload
+    )
+    entry['clip'] = clip
+    entry['calibration_seconds'] = time.time() - start
+    profile.store(key, entry)
+    logger.info(
+        f"Calibration chose {entry['model_size']}/{entry['compute_type']} "
+        f"(RTF {entry['rtf']:.3f}) in {entry['calibration_seconds']:.0f}s"
+    )
+    return entry
+
+
+def calibrated_compute_type(device: str, model_size: str) -> Optional[str]:
+    """Most accurate measured compute type meeting the target for a fixed model, if calibrated"""
+    profile = CalibrationProfile(os.getenv('CALIBRATION_PROFILE_PATH', data_path('calibration_profile.json')))
+    entry = profile.get(host_key(device))
+    if not entry:
+        return None
+    for result in entry.get('results', []):
+        if result['model_size'] == model_size and result['meets_target']:
+            return result['compute_type']
+    return None
+
+
+def _simulated_load_model(device: str) -> Callable[[str, str], float]:
+    """Loader for --simulate: the "model" is its simulated RTF; large float32 models do not fit on the GPU"""
+    model_cost = {'large-v3': 1.6, 'large-v2': 1.6, 'kotoba-tech/kotoba-whisper-v2.0-faster': 0.5,
+                  'medium': 0.8, 'small': 0.3, 'base': 0.12, 'tiny': 0.06}
+    type_cost = {'float32': 2.0, 'float16': 1.0, 'int8_float16': 0.8, 'int8': 0.6}
+    speed = 0.1 if device == 'cuda' else 1.0
+    
+    def load_model(model_size: str, compute_type: str) -> float:
+        if device == 'cuda' and model_size.startswith('large') and compute_type == 'float32':
+            raise RuntimeError("CUDA failed with error out of memory")
+        return model_cost[model_size] * type_cost[compute_type] * speed
+    
+    return load_model
+
+
+def main():
+    """
+    Calibrate this host with faster-whisper, or simulate the search
+    
+    Usage:
+        python calibration.py [--recalibrate] [--device cpu|cuda] [--exhaustive]
+        python calibration.py --simulate    # fake timings, no models needed
+    """
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    
+    if '--simulate' in args:
+        # Each candidate "transcribes" by sleeping its simulated RTF x clip length
+        audio = np.zeros(SAMPLE_RATE // 10, dtype=np.float32)
+        for device in ('cuda', 'cpu'):
+            entry = calibrate(
+                _simulated_load_model(device), lambda rtf, clip: time.sleep(rtf * len(clip) / SAMPLE_RATE),
+                audio, device, models=candidate_models('ja'), compute_types=COMPUTE_TYPE_ORDER[device],
+                exhaustive='--exhaustive' in args
+            )
+            print(f"\n{device}: candidates tried")
+            for result in entry['results']:
+                print(f"  {result['model_size']:40s} {result['compute_type']:13s} "
+                      f"{'RTF %.3f' % result['rtf'] if result['rtf'] is not None else result['error']}")
+            print(f"  → {entry['model_size']}/{entry['compute_type']} (RTF {entry['rtf']:.3f})")
+        return
+    
+    from faster_whisper import WhisperModel
+    
+    if '--device' in args:
+        device = args[args.index('--device') + 1]
+    else:
+        try:
+            import torch
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        except ImportError:
+            device = 'cpu'
+    
+    def load_model(model_size: str, compute_type: str):
+        return WhisperModel(model_size, device=device, compute_type=compute_type)
+    
+    def transcribe(model, audio: np.ndarray):
+        segments, _ = model.transcribe(audio, language='ja', beam_size=5)
+        return list(segments)
+    
+    if '--exhaustive' in args:
+        audio, clip = load_reference_clip(
+            os.getenv('CALIBRATION_CLIP'), float(os.getenv('CALIBRATION_CLIP_SECONDS', '60'))
+        )
+        entry = calibrate(load_model, transcribe, audio, device,
+                          float(os.getenv('CALIBRATION_RTF_TARGET', '1.0')), exhaustive=True)
+    else:
+        entry = auto_configure(device, load_model, transcribe, force='--recalibrate' in args)
+    print(json.dumps(entry, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Chunked Jobs - map-reduce transcription of one long recording across workers
+The worker that receives a long file cuts it at silences into overlapping
+chunks and queues one chunk task per chunk; the worker that finishes the last
+chunk queues a reduce task, which merges the chunk transcripts: timestamps are
+already absolute, each chunk owns the audio between the midpoints of its
+overlaps (word by word: a segment crossing a cut is split between the chunks),
+and chunk-local speaker labels are mapped onto recording-wide speakers by
+embedding similarity (overlap voting without embeddings).
+
+Tasks travel over fire-and-forget pub/sub, so every worker's heartbeat loop
+also sweeps the split jobs in flight (overdue_tasks): a task whose claiming
+worker stopped heartbeating or that runs past its deadline is re-published,
+and the recording fails after too many such attempts. A task nobody claimed
+within the deadline is simply published again.
+"""
+
+import io
+import sys
+import wave
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
+
+from audio_segmentation import frame_energy
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+@dataclass
+class ChunkPlan:
+    """One chunk of the recording (seconds): audio [start, end), transcript kept for [keep_start, keep_end)"""
+    index: int
+    start: float
+    end: float
+    keep_start: float
+    keep_end: Optional[float]           # None: to the end of the recording
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def plan_chunks(
+    audio: np.ndarray,
+    chunk_seconds: float = 600.0,
+    overlap_seconds: float = 5.0,
+    search_seconds: float = 30.0,
+    frame_ms: int = 30
+) -> List[ChunkPlan]:
+    """
+    Cut the recording at the quietest frame before every chunk_seconds and
+    widen each chunk by overlap_seconds on both sides
+    
+    Args:
+        audio: Mono float32 audio at 16kHz
+        chunk_seconds: Target chunk length (without overlap)
+        overlap_seconds: Audio shared with each neighbouring chunk
+        search_seconds: How far before the target cut to look for silence
+        frame_ms: Frame length used for the energy search
+    
+    Returns:
+        Chunks in chronological order; keep ranges tile the whole recording
+    """
+    duration = len(audio) / SAMPLE_RATE
+    energy = frame_energy(audio, frame_ms)
+    frame_seconds = frame_ms / 1000
+    
+    cuts = [0.0]
+    while duration - cuts[-1] > chunk_seconds * 1.25:
+        target = cuts[-1] + chunk_seconds
+        lo = int(max(cuts[-1] + chunk_seconds / 2, target - search_seconds) / frame_seconds)
+        hi = int(target / frame_seconds)
+        cuts.append((lo + int(np.argmin(energy[lo:hi]))) * frame_seconds if hi > lo else target)
+    cuts.append(duration)
+    
+    return [
+        ChunkPlan(
+            index=i,
+            start=max(0.0, cuts[i] - overlap_seconds),
+            end=min(duration, cuts[i + 1] + overlap_seconds),
+            keep_start=cuts[i],
+            keep_end=cuts[i + 1] if i + 2 < len(cuts) else None,
+        )
+        for i in range(len(cuts) - 1)
+    ]
+
+
+def encode_wav(audio: np.ndarray) -> bytes:
+    """16-bit PCM WAV at 16kHz (chunk upload format, decoded in-process by every worker)"""
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def shift_result(result: Dict[str, Any], offset: float) -> Dict[str, Any]:
+    """Move chunk-local segment and word timestamps to recording time (in place)"""
+    for segment in result.get("segments", []):
+        segment["start"] += offset
+        segment["end"] += offset
+        for word in segment.get("words", []):
+            if "start" in word:
+                word["start"] += offset
+            if "end" in word:
+                word["end"] += offset
+    result["word_segments"] = [word for segment in result.get("segments", []) for word in segment.get("words", [])]
+    return result
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norm) if norm else 0.0
+
+
+def _speaker_activity(chunk: Dict[str, Any], start: float, end: float) -> List[Tuple[float, float, str]]:
+    """(start, end, speaker) of the chunk's words (segments without words) inside [start, end)"""
+    activity = []
+    for segment in chunk.get("segments", []):
+        items = segment.get("words") or [segment]
+        for item in items:
+            speaker = item.get("speaker", segment.get("speaker"))
+            if speaker is None or "start" not in item or "end" not in item:
+                continue
+            if item["end"] > start and item["start"] < end:
+                activity.append((max(item["start"], start), min(item["end"], end), speaker))
+    return activity
+
+
+def reconcile_speakers(
+    chunks: List[Dict[str, Any]],
+    threshold: float = 0.5
+) -> Tuple[List[Dict[str, str]], str]:
+    """
+    Map every chunk's local speaker labels onto recording-wide speakers
+    
+    With embeddings, each local speaker is matched (greedily, best pair first,
+    one-to-one) to the running centroid of a global speaker when the cosine
+    similarity reaches threshold. Speakers left unmatched, or chunks without
+    embeddings, are voted on by how long they overlap in time with the
+    previous chunk's already mapped speakers in the shared audio. Speakers
+    without embeddings that are still unmatched take the remaining global
+    speakers in order of talk time; anything else becomes a new speaker.
+    
+    Args:
+        chunks: Chunk results in order, each with "segments" (absolute times),
+            "start"/"end" and optionally "speaker_embeddings" {label: vector}
+        threshold: Minimum cosine similarity for an embedding match
+    
+    Returns:
+        (per-chunk {local label: global label}, method: embedding|overlap|talk_time|mixed)
+    """
+    centroids: List[np.ndarray] = []     # running sum of embeddings per global speaker
+    counts: List[int] = []
+    names: List[str] = []
+    mappings: List[Dict[str, str]] = []
+    methods = set()
+    talk_time: Dict[str, float] = {}
+    
+    def new_speaker(embedding: Optional[np.ndarray]) -> str:
+        names.append(f"SPEAKER_{len(names):02d}")
+        centroids.append(embedding if embedding is not None else None)
+        counts.append(1 if embedding is not None else 0)
+        return names[-1]
+    
+    for i, chunk in enumerate(chunks):
+        labels = sorted({
+            speaker for _, _, speaker in _speaker_activity(chunk, float('-inf'), float('inf'))
+        } | set(chunk.get("speaker_embeddings") or {}))
+        embeddings = {
+            label: np.asarray(vector, dtype=np.float64)
+            for label, vector in (chunk.get("speaker_embeddings") or {}).items()
+        }
+        mapping: Dict[str, str] = {}
+        
+        # 1. Embedding similarity against the global centroids
+        pairs = []
+        for label in labels:
+            if label not in embeddings:
+                continue
+            for g, centroid in enumerate(centroids):
+                if centroid is not None:
+                    pairs.append((_cosine(embeddings[label], centroid / counts[g]), label, g))
+        taken = set()
+        for similarity, label, g in sorted(pairs, reverse=True):
+            if similarity < threshold or label in mapping or g in taken:
+                continue
+            mapping[label] = names[g]
+            taken.add(g)
+            methods.add('embedding')
+        
+        # 2. Overlap vote against the previous chunk in the shared audio
+        if i > 0 and len(mapping) < len(labels):
+            previous = chunks[i - 1]
+            shared_start, shared_end = chunk["start"], previous["end"]
+            previous_activity = [
+                (start, end, mappings[i - 1].get(speaker))
+                for start, end, speaker in _speaker_activity(previous, shared_start, shared_end)
+            ]
+            votes: Dict[str, Dict[str, float]] = {}
+            for start, end, speaker in _speaker_activity(chunk, shared_start, shared_end):
+                if speaker in mapping:
+                    continue
+                for other_start, other_end, other in previous_activity:
+                    common = min(end, other_end) - max(start, other_start)
+                    if other is not None and common > 0:
+                        votes.setdefault(speaker, {}).setdefault(other, 0.0)
+                        votes[speaker][other] += common
+            ranked = sorted(
+                ((seconds, label, other) for label, tally in votes.items() for other, seconds in tally.items()),
+                reverse=True
+            )
+            for seconds, label, other in ranked:
+                if label in mapping or other in mapping.values():
+                    continue
+                mapping[label] = other
+                methods.add('overlap')
+        
+        # 3. Speakers without embeddings take the unused global speakers by talk time
+        #    (a consultation keeps its cast); the rest are new speakers
+        talk = {label: 0.0 for label in labels}
+        for start, end, speaker in _speaker_activity(chunk, float('-inf'), float('inf')):
+            talk[speaker] += end - start
+        leftovers = sorted(
+            (label for label in labels if label not in mapping and label not in embeddings),
+            key=lambda label: -talk[label]
+        )
+        free = sorted(
+            (name for name in names if name not in mapping.values()),
+            key=lambda name: -talk_time[name]
+        )
+        for label, name in zip(leftovers, free):
+            mapping[label] = name
+            methods.add('talk_time')
+        
+        # 4. New speakers; fold matched embeddings into their centroids
+        for label in labels:
+            if label not in mapping:
+                mapping[label] = new_speaker(embeddings.get(label))
+            elif label in embeddings:
+                g = names.index(mapping[label])
+                centroids[g] = embeddings[label] if centroids[g] is None else centroids[g] + embeddings[label]
+                counts[g] += 1
+        for label, seconds in talk.items():
+            talk_time[mapping[label]] = talk_time.get(mapping[label], 0.0) + seconds
+        mappings.append(mapping)
+    
+    method = 'mixed' if len(methods) > 1 else (methods.pop() if methods else 'none')
+    return mappings, method
+
+
+def merge_chunk_results(chunks: List[Dict[str, Any]], speaker_threshold: float = 0.5) -> Dict[str, Any]:
+    """
+    Merge chunk transcripts into one recording-wide result
+    
+    Args:
+        chunks: Chunk results ({"index", "start", "end", "keep_start", "keep_end",
+            "language", "segments", "speaker_embeddings"?}), absolute timestamps
+        speaker_threshold: Minimum cosine similarity for an embedding speaker match
+    
+    Returns:
+        {"segments", "word_segments", "language", "chunks"} like a single-job
+        alignment + diarization result, plus merge statistics
+    """
+    chunks = sorted(chunks, key=lambda chunk: chunk["index"])
+    mappings, method = reconcile_speakers(chunks, speaker_threshold)
+    
+    segments = []
+    for chunk, mapping in zip(chunks, mappings):
+        keep_end = chunk["keep_end"] if chunk["keep_end"] is not None else float('inf')
+        for segment in chunk.get("segments", []):
+            # Each chunk owns the words (segments without words: the segments) whose midpoint it keeps
+            segment = _trim_to_keep(segment, chunk["keep_start"], keep_end, chunk.get("language"))
+            if segment is None:
+                continue
+            if "speaker" in segment:
+                segment["speaker"] = mapping.get(segment["speaker"], segment["speaker"])
+            for word in segment.get("words", []):
+                if "speaker" in word:
+                    word["speaker"] = mapping.get(word["speaker"], word["speaker"])
+            segments.append(segment)
+    segments.sort(key=lambda segment: segment["start"])
+    
+    languages = [chunk.get("language") for chunk in chunks if chunk.get("language")]
+    return {
+        "segments": segments,
+        "word_segments": [word for segment in segments for word in segment.get("words", [])],
+        "language": max(set(languages), key=languages.count) if languages else "ja",
+        "chunks": {
+            "count": len(chunks),
+            "speaker_reconciliation": method,
+            "speakers": len({label for mapping in mappings for label in mapping.values()}),
+            "mapping": mappings,
+        },
+    }
+
+
+def _trim_to_keep(
+    segment: Dict[str, Any],
+    keep_start: float,
+    keep_end: float,
+    language: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """
+    Cut a chunk segment down to the words whose midpoint lies in the chunk's
+    keep range, so a segment straddling the cut is split between the chunks
+    and every word is kept exactly once
+    
+    Words without timestamps (alignment leaves e.g. numerals unaligned) follow
+    the word before them. Returns None when nothing of the segment is kept.
+    """
+    words = segment.get("words", [])
+    if not words:
+        midpoint = (segment["start"] + segment["end"]) / 2
+        return segment if keep_start <= midpoint < keep_end else None
+    
+    kept = []
+    keep = keep_start <= (segment["start"] + segment["end"]) / 2 < keep_end
+    for word in words:
+        if "start" in word and "end" in word:
+            keep = keep_start <= (word["start"] + word["end"]) / 2 < keep_end
+        if keep:
+            kept.append(word)
+    if len(kept) == len(words):
+        return segment
+    timed = [word for word in kept if "start" in word and "end" in word]
+    if not timed:
+        return None
+    separator = "" if language in ("ja", "zh") else " "
+    return dict(
+        segment,
+        start=timed[0]["start"],
+        end=timed[-1]["end"],
+        text=separator.join(word["word"].strip() for word in kept),
+        words=kept,
+    )
+
+
+def overdue_tasks(
+    started: Dict[str, float],
+    claims: Dict[str, Optional[str]],
+    alive_workers: Set[str],
+    now: float,
+    deadline_seconds: float
+) -> Dict[str, str]:
+    """
+    Unfinished tasks of a split job that have to be published again
+    
+    Args:
+        started: Task → time it was last published, or started by a worker
+        claims: Task → worker that claimed it (None: not claimed)
+        alive_workers: Workers still sending heartbeats
+        now: Current time
+        deadline_seconds: Time a task may wait or run before it is re-published
+    
+    Returns:
+        Task → reason: "worker_lost" (its worker stopped heartbeating),
+        "deadline" (claimed but running too long) or "unclaimed" (nobody took
+        it, e.g. the message reached no free worker)
+    """
+    overdue = {}
+    for task, since in started.items():
+        worker = claims.get(task)
+        if worker is not None and worker not in alive_workers:
+            overdue[task] = "worker_lost"
+        elif now - since > deadline_seconds:
+            overdue[task] = "deadline" if worker is not None else "unclaimed"
+    return overdue
+
+
+def _demo_chunk(
+    plan: ChunkPlan,
+    turns: List[Tuple[float, float, str]],
+    voices: Dict[str, np.ndarray],
+    local_order: List[str],
+    rng: np.random.Generator,
+    with_embeddings: bool
+) -> Dict[str, Any]:
+    """Chunk result whose diarization labels speakers in its own (shuffled) order"""
+    labels = {speaker: f"SPEAKER_{local_order.index(speaker):02d}" for speaker in local_order}
+    segments = []
+    for start, end, speaker in turns:
+        if end <= plan.start or start >= plan.end:
+            continue
+        start, end = max(start, plan.start), min(end, plan.end)
+        segments.append({
+            "start": start, "end": end, "text": f"{speaker}", "speaker": labels[speaker],
+            "words": [{"word": speaker, "start": start, "end": end, "speaker": labels[speaker]}],
+        })
+    present = {segment["text"] for segment in segments}
+    result = dict(plan.to_dict(), segments=segments, language="ja")
+    if with_embeddings:
+        result["speaker_embeddings"] = {
+            labels[speaker]: (voices[speaker] + 0.3 * rng.standard_normal(len(voices[speaker]))).tolist()
+            for speaker in present
+        }
+    return result
+
+
+def main():
+    """Plan chunks for a synthetic 3-hour consultation and check speaker reconciliation"""
+    logging.basicConfig(level=logging.INFO)
+    rng = np.random.default_rng(0)
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    duration = hours * 3600
+    
+    # Speech with a short pause every ~8 s, at low resolution (energy search only needs frames)
+    t = np.arange(int(duration * 100)) / 100
+    envelope = (np.sin(2 * np.pi * t / 8) > -0.95).astype(np.float32)
+    audio = np.repeat(0.1 * envelope, SAMPLE_RATE // 100) * rng.standard_normal(len(envelope) * 160).astype(np.float32)
+    plans = plan_chunks(audio, chunk_seconds=600, overlap_seconds=5)
+    print(f"{duration / 3600:.1f} h → {len(plans)} chunks; first cuts at "
+          + ", ".join(f"{plan.keep_start:.1f}s" for plan in plans[1:4]))
+    
+    # Three speakers taking turns; each chunk numbers them in its own order
+    speakers = ['doctor', 'patient', 'nurse']
+    voices = {speaker: rng.standard_normal(192) for speaker in speakers}
+    turns, start = [], 0.0
+    while start < duration:
+        length = float(rng.uniform(2, 20))
+        speaker = str(rng.choice(speakers, p=[0.5, 0.35, 0.15]))
+        turns.append((start, min(duration, start + length), speaker))
+        start += length
+    
+    for with_embeddings in (True, False):
+        chunks = [
+            _demo_chunk(plan, turns, voices, list(rng.permutation(speakers)), rng, with_embeddings)
+            for plan in plans
+        ]
+        merged = merge_chunk_results(chunks)
+        # Consistent if every true speaker ends up under exactly one global label
+        labels: Dict[str, set] = {}
+        for segment in merged["segments"]:
+            labels.setdefault(segment["text"], set()).add(segment["speaker"])
+        consistent = all(len(found) == 1 for found in labels.values())
+        covered = sum(segment["end"] - segment["start"] for segment in merged["segments"])
+        print(f"  {'embeddings' if with_embeddings else 'overlap vote'}: "
+              f"{merged['chunks']['speakers']} speakers via {merged['chunks']['speaker_reconciliation']}, "
+              f"consistent across chunks: {consistent}, {len(merged['segments'])} segments, "
+              f"{covered:.0f}s covered ({covered - sum(e - s for s, e, _ in turns):+.0f}s vs source)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Worker Data Directory - where the worker keeps its local state
+The search, term and fingerprint indexes, the segment store and the batch
+size and calibration profiles all default to files in one directory:
+WORKER_DATA_DIR if set, else medical-transcription/data of a source checkout
+if it is writable, else ~/.local/share/whisperplaud (e.g. a container whose
+code sits in a read-only or root-owned tree).
+"""
+
+import os
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_DATA_DIR = Path(__file__).resolve().parent.parent.parent / 'data'
+FALLBACK_DATA_DIR = Path.home() / '.local' / 'share' / 'whisperplaud'
+
+_fallback_logged = False
+
+
+def _writable(path: Path) -> bool:
+    """True if path is, or can be created as, a writable directory"""
+    for candidate in [path, *path.parents]:
+        if candidate.exists():
+            return candidate.is_dir() and os.access(candidate, os.W_OK | os.X_OK)
+    return False
+
+
+def data_dir() -> Path:
+    """Directory for the worker's local databases and profiles"""
+    configured = os.getenv('WORKER_DATA_DIR')
+    if configured:
+        return Path(configured)
+    if _writable(CHECKOUT_DATA_DIR):
+        return CHECKOUT_DATA_DIR
+    global _fallback_logged
+    if not _fallback_logged:
+        logger.warning(f"{CHECKOUT_DATA_DIR} is not writable, using {FALLBACK_DATA_DIR} (set WORKER_DATA_DIR)")
+        _fallback_logged = True
+    return FALLBACK_DATA_DIR
+
+
+def data_path(name: str) -> str:
+    """
+    Default path of a file in the data directory
+    
+    Args:
+        name: File name (e.g. transcript_search.db)
+    
+    Returns:
+        Path as a string
+    """
+    return str(data_dir() / name)
+
+
+if __name__ == "__main__":
+    print(data_dir())
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Diarization Runner - speaker diarization concurrently with ASR
+Diarization needs only the decoded audio, so it is submitted as soon as the
+audio is loaded and runs on its own executor while Whisper and alignment
+work; the job joins it at word-speaker assignment.
+
+Executors (DIARIZATION_EXECUTOR):
+- thread: one background thread in the worker process (pyannote and
+  CTranslate2 release the GIL during inference)
+- process: a spawned process with its own pipeline and thread pool, so the
+  two stages cannot contend for torch's intra-op threads
+- off: run inline at the join point (sequential, as before)
+
+With the process executor on CPU hosts, DIARIZATION_CPU_SHARE of the cores
+goes to diarization and the rest to ASR, so neither stage oversubscribes the
+machine. torch's thread pool is process-wide, so the thread executor leaves
+it alone rather than throttling the alignment running next to it.
+
+Cancelling a submitted diarization stops it: the thread executor checks for
+it between pipeline steps, the process executor terminates its child and
+starts a fresh one.
+"""
+
+import os
+import sys
+import time
+import inspect
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, InvalidStateError
+from typing import Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = ('thread', 'process', 'off')
+
+
+class DiarizationCancelledError(Exception):
+    """Raised inside the pipeline when its diarization has been cancelled"""
+    pass
+
+
+def split_cpu_threads(share: float, cpus: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Split the CPU cores between ASR and diarization
+    
+    Args:
+        share: Fraction of the cores for diarization
+        cpus: Core count (default: os.cpu_count())
+    
+    Returns:
+        Tuple of (ASR threads, diarization threads), each at least 1
+    """
+    cpus = cpus or os.cpu_count() or 1
+    diarize_threads = min(max(1, round(cpus * share)), max(1, cpus - 1))
+    return max(1, cpus - diarize_threads), diarize_threads
+
+
+def set_torch_threads(threads: int):
+    """Limit torch's intra-op thread pool in this process (no-op without torch)"""
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def accepts_return_embeddings(pipeline) -> bool:
+    """True if the pipeline takes return_embeddings (whisperx 3.3 and later)"""
+    try:
+        return 'return_embeddings' in inspect.signature(pipeline).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+class _CancellableModel:
+    """
+    Wraps the pyannote pipeline of a whisperx DiarizationPipeline so every
+    step hook (segmentation, each embedding batch, clustering) checks the
+    cancel event
+    """
+    
+    def __init__(self, model, cancel_event: threading.Event):
+        self._model = model
+        self._cancel_event = cancel_event
+    
+    def __call__(self, *args, **kwargs):
+        return self._model(*args, hook=self._hook, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+    
+    def _hook(self, *args, **kwargs):
+        if self._cancel_event.is_set():
+            raise DiarizationCancelledError("Diarization cancelled")
+
+
+def run_pipeline(
+    pipeline,
+    audio,
+    return_embeddings: bool = False,
+    cancel_event: Optional[threading.Event] = None
+) -> Tuple[Any, Optional[Dict[str, list]]]:
+    """
+    Run a whisperx DiarizationPipeline
+    
+    Args:
+        pipeline: whisperx.DiarizationPipeline
+        audio: Decoded audio (16kHz)
+        return_embeddings: Also return one embedding per speaker
+        cancel_event: Stops the pipeline at its next step once set
+            (the pipeline must not run in another thread meanwhile)
+    
+    Returns:
+        Tuple of (speaker turns, {speaker: embedding} or None)
+    
+    Raises:
+        DiarizationCancelledError: cancel_event was set
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise DiarizationCancelledError("Diarization cancelled")
+    # whisperx before 3.3 has no return_embeddings
+    return_embeddings = return_embeddings and accepts_return_embeddings(pipeline)
+    
+    model = getattr(pipeline, 'model', None)
+    if cancel_event is not None and model is not None:
+        pipeline.model = _CancellableModel(model, cancel_event)
+    try:
+        if not return_embeddings:
+            return pipeline(audio), None
+        turns, embeddings = pipeline(audio, return_embeddings=True)
+    finally:
+        if cancel_event is not None and model is not None:
+            pipeline.model = model
+    if not embeddings:
+        return turns, None
+    return turns, {speaker: [float(value) for value in vector] for speaker, vector in embeddings.items()}
+
+
+# Diarization pipeline of a process-executor child
+_process_pipeline = None
+
+
+def _init_process(hf_token: Optional[str], device: str, threads: Optional[int]):
+    """Load the pipeline once per executor process"""
+    global _process_pipeline
+    if threads:
+        set_torch_threads(threads)
+    import whisperx
+    _process_pipeline = whisperx.DiarizationPipeline(use_auth_token=hf_token, device=device)
+
+
+def _diarize_file(audio_path: str, return_embeddings: bool):
+    """Process-executor task: diarize audio saved by DiarizationRunner.submit"""
+    audio = np.load(audio_path, mmap_mode='r')
+    start = time.time()
+    turns, embeddings = run_pipeline(_process_pipeline, np.asarray(audio), return_embeddings)
+    return turns, embeddings, time.time() - start
+
+
+class DiarizationRunner:
+    """Runs diarization on its own executor; submit() returns a Future of (turns, embeddings)"""
+    
+    def __init__(
+        self,
+        load_pipeline: Callable[[], Any],
+        device: str = 'cuda',
+        mode: Optional[str] = None,
+        cpu_share: Optional[float] = None
+    ):
+        """
+        Args:
+            load_pipeline: Returns the worker's (lazily loaded) diarization pipeline
+            device: cuda or cpu
+            mode: thread, process or off (default: DIARIZATION_EXECUTOR or thread)
+            cpu_share: Fraction of the cores for diarization on CPU (default: DIARIZATION_CPU_SHARE or 0.5)
+        """
+        self.load_pipeline = load_pipeline
+        self.device = device
+        self.mode = (mode or os.getenv('DIARIZATION_EXECUTOR', 'thread')).lower()
+        if self.mode not in EXECUTORS:
+            raise ValueError(f"DIARIZATION_EXECUTOR must be one of {', '.join(EXECUTORS)}: {self.mode}")
+        share = cpu_share if cpu_share is not None else float(os.getenv('DIARIZATION_CPU_SHARE', '0.5'))
+        
+        # Thread counts only matter where both stages share the CPU cores; torch's
+        # pool is process-wide, so only a separate process can have its own
+        self.asr_threads: Optional[int] = None
+        self.diarize_threads: Optional[int] = None
+        if device == 'cpu' and self.mode == 'process':
+            self.asr_threads, self.diarize_threads = split_cpu_threads(share)
+            logger.info(
+                f"Concurrent diarization on CPU: {self.asr_threads} ASR threads, "
+                f"{self.diarize_threads} diarization threads ({self.mode} executor)"
+            )
+        
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        if self.mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='diarize')
+        elif self.mode == 'process':
+            self._executor = self._process_executor()
+    
+    def _process_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_process,
+            initargs=(os.getenv('HF_TOKEN'), self.device, self.diarize_threads)
+        )
+    
+    @property
+    def concurrent(self) -> bool:
+        """True if diarization overlaps ASR"""
+        return self.mode != 'off'
+    
+    def warmup(self):
+        """Load the pipeline where it will run (the child process in process mode)"""
+        if self.mode == 'process':
+            self._executor.submit(time.sleep, 0).result()
+        else:
+            self.load_pipeline()
+    
+    def submit(self, audio, return_embeddings: bool = False) -> Future:
+        """
+        Start diarizing decoded audio
+        
+        Args:
+            audio: Decoded audio (16kHz)
+            return_embeddings: Also return one embedding per speaker
+        
+        Returns:
+            Future of (speaker turns, {speaker: embedding} or None); in off mode
+            the pipeline runs when the result is first requested
+        """
+        if self.mode == 'thread':
+            cancel_event = threading.Event()
+            future = self._executor.submit(self._run_local, audio, return_embeddings, cancel_event)
+            return _chain(future, on_cancel=cancel_event.set)
+        if self.mode == 'process':
+            # Hand the audio over as a file: pickling hours of float32 through a pipe is slower
+            with tempfile.NamedTemporaryFile(suffix='.npy', delete=False) as tmp_file:
+                np.save(tmp_file, np.ascontiguousarray(audio, dtype=np.float32))
+                audio_path = tmp_file.name
+            with self._executor_lock:
+                future = self._executor.submit(_diarize_file, audio_path, return_embeddings)
+            future.add_done_callback(lambda _: os.unlink(audio_path))
+            
+            def result(value):
+                turns, embeddings, elapsed = value
+                logger.info(f"Diarized in {elapsed:.1f}s (process)")
+                return turns, embeddings
+            
+            return _chain(future, on_cancel=lambda: self._stop_process(future), map_result=result)
+        return _DeferredFuture(lambda: self._run_local(audio, return_embeddings))
+    
+    def _run_local(self, audio, return_embeddings: bool, cancel_event: Optional[threading.Event] = None):
+        start = time.time()
+        result = run_pipeline(self.load_pipeline(), audio, return_embeddings, cancel_event)
+        logger.info(f"Diarized {len(audio) / 16000:.0f}s of audio in {time.time() - start:.1f}s ({self.mode})")
+        return result
+    
+    def _stop_process(self, future: Future):
+        """Cancel a process-executor task; a running one is stopped by replacing the child"""
+        if future.cancel():
+            return
+        with self._executor_lock:
+            if future.done():
+                return
+            executor = self._executor
+            self._executor = self._process_executor()
+            # ProcessPoolExecutor cannot terminate one task: end its (single) child
+            for process in list((getattr(executor, '_processes', None) or {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("Terminated diarization process of a cancelled job")
+        # Load the pipeline in the new child before the next job needs it
+        self._executor.submit(time.sleep, 0)
+    
+    def shutdown(self):
+        """Stop the executor (a running diarization is abandoned)"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _chain(
+    inner: Future,
+    on_cancel: Callable[[], None],
+    map_result: Optional[Callable[[Any], Any]] = None
+) -> Future:
+    """
+    Future following an executor Future; cancelling it calls on_cancel, which
+    stops the task even after it has started
+    """
+    outer: Future = Future()
+    
+    def done(future: Future):
+        try:
+            if future.cancelled():
+                outer.cancel()
+            elif future.exception() is not None:
+                outer.set_exception(future.exception())
+            else:
+                outer.set_result(map_result(future.result()) if map_result else future.result())
+        except InvalidStateError:
+            pass  # the job cancelled it meanwhile
+    
+    inner.add_done_callback(done)
+    outer.add_done_callback(lambda _: outer.cancelled() and on_cancel())
+    return outer
+
+
+class _DeferredFuture(Future):
+    """Future that runs its function on the first result() call (DIARIZATION_EXECUTOR=off)"""
+    
+    def __init__(self, fn: Callable[[], Any]):
+        super().__init__()
+        self._fn = fn
+    
+    def result(self, timeout=None):
+        if not self.done():
+            try:
+                self.set_result(self._fn())
+            except BaseException as e:
+                self.set_exception(e)
+        return super().result(timeout)
+
+
+def main():
+    """
+    Overlap benchmark: stand-in ASR and diarization costs, sequential vs concurrent
+    
+    Usage:
+        python diarization_runner.py [audio_seconds] [asr_rtf] [diarize_rtf]
+    """
+    logging.basicConfig(level=logging.WARNING)
+    args = sys.argv[1:]
+    audio_seconds = float(args[0]) if args else 600.0
+    asr_rtf = float(args[1]) if len(args) > 1 else 0.004
+    diarize_rtf = float(args[2]) if len(args) > 2 else 0.002
+    audio = np.zeros(int(audio_seconds * 16000), dtype=np.float32)
+    
+    class StandInPipeline:
+        def __call__(self, audio, return_embeddings: bool = False):
+            time.sleep(len(audio) / 16000 * diarize_rtf)
+            turns = [{'start': 0.0, 'end': len(audio) / 16000, 'speaker': 'SPEAKER_00'}]
+            return (turns, {'SPEAKER_00': [1.0]}) if return_embeddings else turns
+    
+    pipeline = StandInPipeline()
+    print(f"{audio_seconds:.0f}s audio, ASR {audio_seconds * asr_rtf:.2f}s, "
+          f"diarization {audio_seconds * diarize_rtf:.2f}s (stand-ins), {os.cpu_count()} CPUs")
+    for mode in ('off', 'thread'):
+        runner = DiarizationRunner(lambda: pipeline, device='cuda', mode=mode)
+        start = time.time()
+        future = runner.submit(audio, return_embeddings=True)
+        time.sleep(audio_seconds * asr_rtf)  # ASR and alignment
+        turns, embeddings = future.result()
+        elapsed = time.time() - start
+        runner.shutdown()
+        print(f"  {mode:6s}  {elapsed:6.2f}s  ({len(turns)} turns, embeddings: {embeddings is not None})")
+
+
+if __name__ == "__main__":
+    main()
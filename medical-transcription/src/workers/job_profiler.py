@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Job Profiler - on-demand sampling CPU profiler and tracemalloc for one job
+The job thread marks stages (download, asr, align, ...); a background thread
+samples that thread's stack, and a tracemalloc snapshot is diffed at every
+stage boundary. NullProfiler keeps the hooks free when profiling is off.
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NullProfiler:
+    """Profiler interface that does nothing (profiling off)"""
+    
+    enabled = False
+    
+    def start(self):
+        pass
+    
+    def mark(self, stage: str):
+        pass
+    
+    def stop(self) -> Optional[Dict[str, Any]]:
+        return None
+
+
+class JobProfiler:
+    """Sampling CPU profiler plus per-stage tracemalloc diffs for the calling thread"""
+    
+    enabled = True
+    
+    def __init__(
+        self,
+        interval: float = 0.005,
+        top: int = 25,
+        traceback_frames: int = 8
+    ):
+        """
+        Args:
+            interval: Seconds between stack samples
+            top: Number of functions / allocation sites kept per stage
+            traceback_frames: Frames tracemalloc records per allocation
+        """
+        self.interval = interval
+        self.top = top
+        self.traceback_frames = traceback_frames
+        self.thread_id: Optional[int] = None
+        self.stages: List[Dict[str, Any]] = []
+        self._stage: Optional[Dict[str, Any]] = None
+        self._self_counts: Dict[str, Counter] = {}
+        self._cumulative_counts: Dict[str, Counter] = {}
+        self._snapshot = None
+        self._started_tracemalloc = False
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._start_time = 0.0
+        self._sampling_seconds = 0.0
+    
+    def start(self):
+        """Start profiling the calling thread"""
+        self.thread_id = threading.get_ident()
+        self._start_time = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+            self._started_tracemalloc = True
+        self.mark('setup')
+        self._sampler = threading.Thread(target=self._sample_loop, name='job-profiler', daemon=True)
+        self._sampler.start()
+    
+    def mark(self, stage: str):
+        """Close the current stage and start a new one"""
+        self._close_stage()
+        tracemalloc.reset_peak()
+        self._snapshot = self._take_snapshot()
+        with self._lock:
+            self._stage = {'name': stage, 'start': time.perf_counter(), 'samples': 0}
+            self._self_counts.setdefault(stage, Counter())
+            self._cumulative_counts.setdefault(stage, Counter())
+    
+    def stop(self) -> Dict[str, Any]:
+        """
+        Stop profiling
+        
+        Returns:
+            Profile report: per-stage wall time, top functions by sample
+            count and top allocation sites
+        """
+        self._close_stage()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        
+        total_seconds = time.perf_counter() - self._start_time
+        return {
+            'interval': self.interval,
+            'total_seconds': total_seconds,
+            'samples': sum(stage['samples'] for stage in self.stages),
+            'sampler_overhead': self._sampling_seconds / total_seconds if total_seconds else 0.0,
+            'stages': self.stages,
+        }
+    
+    def _close_stage(self):
+        """Record timings, top functions and allocation diff of the running stage"""
+        with self._lock:
+            stage, self._stage = self._stage, None
+        if stage is None:
+            return
+        name = stage['name']
+        _, peak = tracemalloc.get_traced_memory()
+        allocations = self._take_snapshot().compare_to(self._snapshot, 'lineno')
+        self.stages.append({
+            'name': name,
+            'seconds': time.perf_counter() - stage['start'],
+            'samples': stage['samples'],
+            'top_self': self._top(self._self_counts[name], stage['samples']),
+            'top_cumulative': self._top(self._cumulative_counts[name], stage['samples']),
+            'peak_traced_mb': peak / 2**20,
+            'allocations': [
+                {
+                    'site': str(stat.traceback[0]),
+                    'size_diff_kb': stat.size_diff / 1024,
+                    'size_kb': stat.size / 1024,
+                    'count_diff': stat.count_diff,
+                }
+                for stat in allocations[:self.top]
+                if stat.size_diff > 0
+            ],
+        })
+    
+    @staticmethod
+    def _take_snapshot():
+        """tracemalloc snapshot without tracemalloc's own allocations"""
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+    
+    def _top(self, counts: Counter, samples: int) -> List[Dict[str, Any]]:
+        return [
+            {'function': function, 'samples': count, 'fraction': count / samples if samples else 0.0}
+            for function, count in counts.most_common(self.top)
+        ]
+    
+    def _sample_loop(self):
+        """Sample the job thread's stack every interval"""
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter()
+            frame = sys._current_frames().get(self.thread_id)
+            with self._lock:
+                stage = self._stage
+                if frame is None or stage is None:
+                    continue
+                stage['samples'] += 1
+                leaf = True
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    function = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    if leaf:
+                        self._self_counts[stage['name']][function] += 1
+                        leaf = False
+                    if function not in seen:
+                        seen.add(function)
+                        self._cumulative_counts[stage['name']][function] += 1
+                    frame = frame.f_back
+            self._sampling_seconds += time.perf_counter() - start
+
+
+def profiler_for_job(job_data: Dict[str, Any]) -> Any:
+    """
+    Choose the profiler for a job: the payload's "profile" flag, otherwise
+    a PROFILE_SAMPLE_RATE share of jobs (default: 0)
+    
+    Args:
+        job_data: Job payload
+    
+    Returns:
+        JobProfiler or NullProfiler
+    """
+    requested = job_data.get('profile')
+    if requested is None:
+        requested = random.random() < float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    if not requested:
+        return NullProfiler()
+    return JobProfiler(interval=float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000)
+
+
+def format_profile(profile: Dict[str, Any], top: int = 5) -> str:
+    """Readable summary of a profile report"""
+    lines = [
+        f"{profile['total_seconds']:.1f}s, {profile['samples']} samples "
+        f"(sampler overhead {profile['sampler_overhead']:.1%})"
+    ]
+    for stage in profile['stages']:
+        lines.append(
+            f"[{stage['name']}] {stage['seconds']:.2f}s, peak traced {stage['peak_traced_mb']:.1f} MB"
+        )
+        for entry in stage['top_self'][:top]:
+            lines.append(f"    {entry['fraction']:6.1%}  {entry['function']}")
+        for entry in stage['allocations'][:top]:
+            lines.append(f"    +{entry['size_diff_kb']:9.1f} KB  {entry['site']}")
+    return '\n'.join(lines)
+
+
+def main():
+    """Profile a small synthetic workload, or print a stored profile JSON"""
+    import json
+    
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            print(format_profile(json.load(f)))
+        return
+    
+    profiler = JobProfiler()
+    profiler.start()
+    profiler.mark('compute')
+    total = sum(i * i for i in range(300_000))
+    profiler.mark('allocate')
+    blocks = [bytes(1000) for _ in range(20_000)]
+    profiler.mark('idle')
+    time.sleep(0.2)
+    report = profiler.stop()
+    print(format_profile(report))
+    print(f"(checksum {total}, {len(blocks)} blocks)")
+
+
+if __name__ == "__main__":
+    main()
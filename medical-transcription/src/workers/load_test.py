@@ -0,0 +1,966 @@
+#!/usr/bin/env python3
+"""
+Load Test Harness - queue → worker → S3 end to end without GPUs
+
+Drives WhisperXTranscriptionWorker (or WhisperProcessor) against an in-process
+Redis (fakeredis) and a directory-backed S3 stand-in, with stub models whose
+latency and memory use scale with the audio length. Replays arrival patterns
+and file-length distributions on a compressed clock and reports queue wait,
+end-to-end latency percentiles, throughput and worker utilisation.
+
+Arrival patterns:
+- poisson: constant rate (--rate jobs per hour)
+- clinic: clinic-day profile, quiet mornings and upload bursts at the end of
+  the morning and afternoon sessions (--rate is the in-session base rate)
+- backlog: every job queued at t=0
+
+File lengths (--length):
+- lognormal:<median_seconds>:<sigma>, uniform:<min>:<max>, fixed:<seconds>
+
+With --processes every worker runs in its own process against a TCP fakeredis
+server (the real redis client) and a shared S3 directory, as a local fleet;
+memory is then reported per worker process. Uploads are decoded by the real
+decode path (placeholder WAVs at a low sample rate, resampled to 16 kHz).
+--chunk-min-seconds splits long recordings into chunk tasks across the workers.
+
+Requires: pip install fakeredis
+
+Usage:
+    python load_test.py --workers 2 --jobs 40 --arrival clinic --rate 12 --speedup 120
+    python load_test.py --arrival backlog --jobs 100 --length uniform:300:3600 --json report.json
+    python load_test.py --target processor --workers 4 --jobs 20
+    python load_test.py --processes --workers 4 --jobs 1 --arrival backlog --length fixed:10800 \
+        --chunk-min-seconds 1800
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import wave
+import queue
+import random
+import shutil
+import logging
+import argparse
+import resource
+import multiprocessing
+import tempfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+STUB_FILE_RATE = 100                # sample rate of the placeholder audio objects
+
+PHRASES = [
+    "血糖値は安定しています",
+    "お薬はこのまま続けましょう",
+    "次回は三か月後に採血します",
+    "食事の量は減らせていますか",
+    "足のしびれはありませんか",
+    "血圧も問題ありません",
+]
+
+
+# ============================================================
+# Backends
+# ============================================================
+
+class LocalS3Client:
+    """Directory-backed stand-in for the boto3 S3 client calls the worker makes"""
+    
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+    
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+    
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+    
+    def download_file(self, bucket: str, key: str, filename: str):
+        path = self._path(bucket, key)
+        if not path.exists():
+            raise self.exceptions.NoSuchKey(key)
+        shutil.copyfile(path, filename)
+        with self._lock:
+            self.bytes_read += path.stat().st_size
+    
+    def upload_file(self, filename: str, bucket: str, key: str, **kwargs):
+        with open(filename, 'rb') as f:
+            self.put_object(Bucket=bucket, Key=key, Body=f.read())
+    
+    def _metadata_path(self, bucket: str, key: str) -> Path:
+        path = self._path(bucket, key)
+        return path.with_name(path.name + '.metadata')
+    
+    def put_object(self, Bucket: str, Key: str, Body, Metadata: Optional[Dict[str, str]] = None, **kwargs):
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        if Metadata:
+            self._metadata_path(Bucket, Key).write_text(json.dumps(Metadata))
+        with self._lock:
+            self.bytes_written += len(data)
+        return {}
+    
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise self.exceptions.NoSuchKey(Key)
+        data = path.read_bytes()
+        with self._lock:
+            self.bytes_read += len(data)
+        metadata_path = self._metadata_path(Bucket, Key)
+        metadata = json.loads(metadata_path.read_text()) if metadata_path.exists() else {}
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data), 'Metadata': metadata}
+    
+    def head_object(self, Bucket: str, Key: str, **kwargs):
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise self.exceptions.NoSuchKey(Key)
+        return {'ContentLength': path.stat().st_size}
+    
+    def delete_object(self, Bucket: str, Key: str, **kwargs):
+        self._path(Bucket, Key).unlink(missing_ok=True)
+        self._metadata_path(Bucket, Key).unlink(missing_ok=True)
+        return {}
+
+
+def write_stub_audio(duration: float) -> bytes:
+    """Placeholder WAV whose header carries the duration (a few hundred bytes per minute)"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(1)
+        wav.setframerate(STUB_FILE_RATE)
+        wav.writeframes(b'\x80' * int(duration * STUB_FILE_RATE))
+    return buffer.getvalue()
+
+
+def stub_audio_duration(path: str) -> float:
+    """Duration of a placeholder WAV written by write_stub_audio (or of a canonical copy)"""
+    try:
+        with wave.open(path, 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        import soundfile
+        return soundfile.info(path).duration
+
+
+# ============================================================
+# Stub models
+# ============================================================
+
+class MemoryMeter:
+    """Tracks memory the stub models hold (MB), and really allocates it"""
+    
+    def __init__(self, limit_mb: Optional[float] = None):
+        self.limit_mb = limit_mb
+        self.current_mb = 0.0
+        self.peak_mb = 0.0
+        self.out_of_memory = 0
+        self._lock = threading.Lock()
+    
+    def allocate(self, mb: float) -> bytearray:
+        with self._lock:
+            if self.limit_mb is not None and self.current_mb + mb > self.limit_mb:
+                self.out_of_memory += 1
+                raise MemoryError(f"stub out of memory: {self.current_mb + mb:.0f} MB > {self.limit_mb:.0f} MB")
+            self.current_mb += mb
+            self.peak_mb = max(self.peak_mb, self.current_mb)
+        buffer = bytearray(int(mb * 2**20))
+        buffer[::4096] = b'\x01' * len(range(0, len(buffer), 4096))  # touch every page
+        return buffer
+    
+    def release(self, mb: float):
+        with self._lock:
+            self.current_mb -= mb
+    
+    @contextmanager
+    def hold(self, mb: float):
+        buffer = self.allocate(mb)
+        try:
+            yield buffer
+        finally:
+            del buffer
+            self.release(mb)
+
+
+@dataclass
+class StubModelConfig:
+    """Latency (seconds per audio second) and memory of the stub models"""
+    asr_rtf: float = 0.08
+    align_rtf: float = 0.01
+    diarize_rtf: float = 0.03
+    model_memory_mb: float = 64.0
+    batch_memory_mb: float = 32.0
+    memory_limit_mb: Optional[float] = None
+    segment_seconds: float = 6.0
+    speedup: float = 1.0
+    vocabulary: List[str] = field(default_factory=list)
+    
+    def sleep(self, audio_seconds: float, rtf: float):
+        time.sleep(audio_seconds * rtf / self.speedup)
+    
+    def text(self, rng: random.Random) -> str:
+        text = rng.choice(PHRASES)
+        if self.vocabulary and rng.random() < 0.3:
+            text += f" {rng.choice(self.vocabulary)}"
+        return text
+
+
+class StubWhisperModel:
+    """WhisperX pipeline stand-in: transcribe() sleeps and emits fixed-length segments"""
+    
+    def __init__(self, config: StubModelConfig, meter: MemoryMeter, name: str):
+        self.config = config
+        self.meter = meter
+        self.name = name
+        self.weights = meter.allocate(config.model_memory_mb)
+        self.rng = random.Random(name)
+    
+    def transcribe(self, audio, batch_size: int = 16, language: str = "ja", **kwargs) -> Dict[str, Any]:
+        duration = len(audio) / SAMPLE_RATE
+        with self.meter.hold(self.config.batch_memory_mb * batch_size / 16):
+            self.config.sleep(duration, self.config.asr_rtf)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + self.config.segment_seconds)
+            segments.append({"text": self.config.text(self.rng), "start": start, "end": end})
+            start = end
+        return {"segments": segments, "language": language}
+
+
+class StubDiarizationPipeline:
+    """pyannote stand-in: two speakers alternating every few segments"""
+    
+    def __init__(self, config: StubModelConfig, meter: MemoryMeter):
+        self.config = config
+        self.weights = meter.allocate(config.model_memory_mb / 2)
+    
+    def __call__(self, audio, return_embeddings: bool = False):
+        duration = len(audio) / SAMPLE_RATE
+        self.config.sleep(duration, self.config.diarize_rtf)
+        turn = self.config.segment_seconds * 3
+        turns = [
+            {"start": start, "end": min(duration, start + turn), "speaker": f"SPEAKER_{i % 2:02d}"}
+            for i, start in enumerate(np.arange(0.0, duration, turn))
+        ]
+        if not return_embeddings:
+            return turns
+        # One fixed voice vector per stub speaker
+        speakers = sorted({t["speaker"] for t in turns})
+        return turns, {
+            speaker: np.random.default_rng(i).standard_normal(16).tolist()
+            for i, speaker in enumerate(speakers)
+        }
+
+
+class StubWhisperX:
+    """Module stand-in providing the whisperx functions the worker calls"""
+    
+    def __init__(self, config: StubModelConfig, meter: MemoryMeter):
+        self.config = config
+        self.meter = meter
+    
+    def load_audio(self, path: str) -> np.ndarray:
+        # Constant non-silent signal as a zero-stride view: no memory per audio second
+        samples = int(stub_audio_duration(path) * SAMPLE_RATE)
+        return np.broadcast_to(np.float32(0.1), (samples,))
+    
+    def load_model(self, name: str, device: str = "cpu", compute_type: str = "float16", **kwargs):
+        if device == "cpu" and compute_type == "float16":
+            # As CTranslate2 does
+            raise ValueError("Requested float16 compute type, but the target device or backend "
+                             "do not support efficient float16 computation.")
+        return StubWhisperModel(self.config, self.meter, name)
+    
+    def load_align_model(self, language_code: str, device: str = "cpu"):
+        return SimpleNamespace(weights=self.meter.allocate(self.config.model_memory_mb / 4)), {
+            "language": language_code
+        }
+    
+    def align(self, segments, model, metadata, audio, device: str = "cpu", **kwargs) -> Dict[str, Any]:
+        self.config.sleep(sum(seg["end"] - seg["start"] for seg in segments), self.config.align_rtf)
+        aligned, word_segments = [], []
+        for segment in segments:
+            words = segment["text"].split() or [segment["text"]]
+            step = (segment["end"] - segment["start"]) / len(words)
+            segment = dict(segment, words=[
+                {"word": word, "start": segment["start"] + i * step,
+                 "end": segment["start"] + (i + 1) * step, "score": 0.9}
+                for i, word in enumerate(words)
+            ])
+            aligned.append(segment)
+            word_segments.extend(segment["words"])
+        return {"segments": aligned, "word_segments": word_segments}
+    
+    def DiarizationPipeline(self, use_auth_token: Optional[str] = None, device: str = "cpu"):
+        return StubDiarizationPipeline(self.config, self.meter)
+    
+    def assign_word_speakers(self, diarize_segments, result: Dict[str, Any]) -> Dict[str, Any]:
+        def speaker_at(t: float) -> str:
+            for turn in diarize_segments:
+                if turn["start"] <= t < turn["end"]:
+                    return turn["speaker"]
+            return diarize_segments[-1]["speaker"] if diarize_segments else "SPEAKER_00"
+        
+        for segment in result.get("segments", []):
+            segment["speaker"] = speaker_at(segment["start"])
+            for word in segment.get("words", []):
+                word["speaker"] = speaker_at(word["start"])
+        return result
+
+
+class StubFasterWhisperModel:
+    """faster-whisper WhisperModel stand-in for WhisperProcessor (segments are yielded lazily)"""
+    
+    def __init__(self, config: StubModelConfig, meter: MemoryMeter):
+        self.config = config
+        self.meter = meter
+        self.weights = meter.allocate(config.model_memory_mb)
+        self.rng = random.Random(0)
+    
+    def transcribe(self, audio, language: str = "ja", **kwargs):
+        duration = stub_audio_duration(audio) if isinstance(audio, str) else len(audio) / SAMPLE_RATE
+        info = SimpleNamespace(language=language, language_probability=1.0, duration=duration)
+        
+        def segments():
+            with self.meter.hold(self.config.batch_memory_mb):
+                start, index = 0.0, 0
+                while start < duration:
+                    end = min(duration, start + self.config.segment_seconds)
+                    self.config.sleep(end - start, self.config.asr_rtf)
+                    yield SimpleNamespace(
+                        id=index, start=start, end=end, text=self.config.text(self.rng),
+                        avg_logprob=-0.3, no_speech_prob=0.01, compression_ratio=1.2, words=[]
+                    )
+                    start, index = end, index + 1
+        
+        return segments(), info
+
+
+# ============================================================
+# Workload
+# ============================================================
+
+# Clinic day (hour → rate multiplier): sessions 9-12 and 14-17, uploads
+# pile up when each session ends
+CLINIC_PROFILE = {
+    8: 0.1, 9: 0.6, 10: 1.0, 11: 1.0, 12: 2.5, 13: 0.3,
+    14: 0.6, 15: 1.0, 16: 1.0, 17: 3.0, 18: 1.0, 19: 0.2,
+}
+
+
+def generate_arrivals(pattern: str, jobs: int, rate_per_hour: float, rng: random.Random) -> List[float]:
+    """
+    Arrival times in simulated seconds from the start of the test
+    
+    Args:
+        pattern: poisson, clinic or backlog
+        jobs: Number of jobs
+        rate_per_hour: Mean arrival rate (clinic: in-session base rate)
+        rng: Random source
+    
+    Returns:
+        Sorted arrival times
+    """
+    if pattern == 'backlog':
+        return [0.0] * jobs
+    if pattern == 'poisson':
+        arrivals, t = [], 0.0
+        for _ in range(jobs):
+            t += rng.expovariate(rate_per_hour / 3600.0)
+            arrivals.append(t)
+        return arrivals
+    if pattern == 'clinic':
+        # Non-homogeneous Poisson process by thinning, starting at 08:00
+        peak = rate_per_hour * max(CLINIC_PROFILE.values()) / 3600.0
+        arrivals, t = [], 0.0
+        while len(arrivals) < jobs:
+            t += rng.expovariate(peak)
+            hour = (8 + int(t // 3600)) % 24
+            if rng.random() < rate_per_hour * CLINIC_PROFILE.get(hour, 0.0) / 3600.0 / peak:
+                arrivals.append(t)
+        return arrivals
+    raise ValueError(f"Unknown arrival pattern: {pattern}")
+
+
+def length_sampler(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a file-length distribution spec into a sampler
+    
+    Args:
+        spec: lognormal:<median>:<sigma>, uniform:<min>:<max> or fixed:<seconds>
+    
+    Returns:
+        Function drawing a duration in seconds
+    """
+    kind, *params = spec.split(':')
+    values = [float(p) for p in params]
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda rng: min(4 * 3600.0, max(10.0, rng.lognormvariate(np.log(median), sigma)))
+    if kind == 'uniform':
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    raise ValueError(f"Unknown length distribution: {spec}")
+
+
+@dataclass
+class LoadTestConfig:
+    """Load test parameters (times in simulated seconds unless noted)"""
+    target: str = 'worker'
+    workers: int = 2
+    jobs: int = 20
+    arrival: str = 'poisson'
+    rate: float = 12.0
+    length: str = 'lognormal:900:0.6'
+    priority_fraction: float = 0.0
+    speedup: float = 60.0
+    timeout: float = 600.0               # wall seconds
+    seed: int = 0
+    processes: bool = False              # one OS process per worker (TCP fakeredis)
+    models: StubModelConfig = field(default_factory=StubModelConfig)
+
+
+@dataclass
+class JobRecord:
+    """Timeline of one job (wall clock, time.monotonic)"""
+    job_id: str
+    duration: float
+    priority: int
+    submitted: float
+    started: Optional[float] = None
+    completed: Optional[float] = None
+    status: str = 'queued'
+    worker: Optional[str] = None
+
+
+@dataclass
+class TaskRecord:
+    """One task a worker ran (a whole job, or one chunk/reduce task of a split job), wall seconds"""
+    job_id: str
+    worker: str
+    seconds: float
+
+
+@dataclass
+class WorkerMemory:
+    """Memory of one --processes worker (its own process), MB"""
+    worker: str
+    max_rss_mb: float
+    stub_peak_mb: float
+    stub_out_of_memory: int
+
+
+# ============================================================
+# Worker target
+# ============================================================
+
+def _make_worker_class():
+    """Subclass the real worker with the in-process backends (imported lazily)"""
+    import transcription_worker
+    
+    class LoadTestWorker(transcription_worker.WhisperXTranscriptionWorker):
+        """Worker wired to fakeredis, LocalS3Client and the stub models (redis_server=None: REDIS_URL)"""
+        
+        def __init__(self, redis_server, s3_client: LocalS3Client):
+            self._redis_server = redis_server
+            self._local_s3 = s3_client
+            super().__init__()
+        
+        def _init_device(self):
+            self.device = "cpu"
+            self._configure_cpu()
+            logger.info("Using stub models on CPU")
+        
+        def _init_redis(self):
+            if self._redis_server is None:
+                return super()._init_redis()
+            import fakeredis
+            self.redis_client = fakeredis.FakeRedis(server=self._redis_server, decode_responses=True)
+        
+        def _init_s3(self):
+            self.s3_client = self._local_s3
+            self.s3_bucket = os.getenv('S3_BUCKET', 'medical-transcription')
+        
+        def _create_async_redis(self):
+            if self._redis_server is None:
+                return super()._create_async_redis()
+            import fakeredis
+            return fakeredis.aioredis.FakeRedis(server=self._redis_server, decode_responses=True)
+        
+        def process_job(self, job_data: Dict[str, Any]):
+            # Busy time per task: a split job's chunks run on many workers
+            start = time.monotonic()
+            try:
+                return super().process_job(job_data)
+            finally:
+                self.redis_client.rpush('load_test:tasks', json.dumps(asdict(TaskRecord(
+                    job_data.get('jobId'), self.worker_id, time.monotonic() - start
+                ))))
+    
+    return transcription_worker, LoadTestWorker
+
+
+def _run_worker_process(models: StubModelConfig, workdir: str, worker_id: str, verbose: bool):
+    """Entry point of a --processes worker: stub models in this process, Redis over TCP"""
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARNING)
+    os.environ['WORKER_ID'] = worker_id
+    worker_module, worker_class = _make_worker_class()
+    meter = MemoryMeter(models.memory_limit_mb)
+    worker_module.whisperx = StubWhisperX(models, meter)
+    worker = worker_class(None, LocalS3Client(f'{workdir}/s3'))
+    models.vocabulary = list(worker.medical_dict)
+    worker.run()
+    # The parent's meter and RSS do not see this process: report both once drained
+    worker.redis_client.rpush('load_test:memory', json.dumps(asdict(WorkerMemory(
+        worker_id,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        meter.peak_mb,
+        meter.out_of_memory
+    ))))
+
+
+def run_worker_load_test(
+    config: LoadTestConfig,
+    workdir: str
+) -> Tuple[List[JobRecord], List[TaskRecord], MemoryMeter, List[WorkerMemory]]:
+    """
+    Replay the workload through WhisperXTranscriptionWorker instances
+    
+    Args:
+        config: Load test parameters
+        workdir: Scratch directory for S3 objects and indexes
+    
+    Returns:
+        Tuple of (per-job records, per-task records, stub model memory meter
+        of this process, memory of each --processes worker)
+    """
+    try:
+        import fakeredis
+    except ImportError as e:
+        raise ImportError("The load test needs fakeredis: pip install fakeredis") from e
+    
+    for key, value in {
+        'HF_TOKEN': 'load-test', 'REDIS_URL': 'redis://fakeredis', 'S3_ENDPOINT': f'file://{workdir}',
+        'S3_ACCESS_KEY': 'load-test', 'S3_SECRET_KEY': 'load-test', 'S3_BUCKET': 'medical-transcription',
+        'WORKER_DATA_DIR': workdir, 'DEDUP_ENABLED': '0',
+        'WORKER_HEARTBEAT_SECONDS': '1', 'CANONICAL_AUDIO_CODEC': 'off',
+    }.items():
+        os.environ.setdefault(key, value)
+    
+    worker_module, worker_class = _make_worker_class()
+    meter = MemoryMeter(config.models.memory_limit_mb)
+    stub = StubWhisperX(config.models, meter)
+    s3 = LocalS3Client(f'{workdir}/s3')
+    rng = random.Random(config.seed)
+    worker_ids = [f'load-test-{i}' for i in range(config.workers)]
+    tcp_server = None
+    if config.processes:
+        import redis
+        tcp_server = fakeredis.TcpFakeServer(('127.0.0.1', 0))
+        threading.Thread(target=tcp_server.serve_forever, daemon=True).start()
+        os.environ['REDIS_URL'] = 'redis://127.0.0.1:%d' % tcp_server.server_address[1]
+        client = redis.Redis.from_url(os.environ['REDIS_URL'], decode_responses=True)
+    else:
+        server = fakeredis.FakeServer()
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    
+    original_whisperx = worker_module.whisperx
+    worker_module.whisperx = stub
+    try:
+        workers = []
+        processes = []
+        if config.processes:
+            context = multiprocessing.get_context('spawn')
+            processes = [
+                context.Process(
+                    target=_run_worker_process,
+                    args=(config.models, workdir, worker_id, logger.isEnabledFor(logging.INFO)),
+                    daemon=True
+                )
+                for worker_id in worker_ids
+            ]
+        else:
+            for worker_id in worker_ids:
+                os.environ['WORKER_ID'] = worker_id
+                workers.append(worker_class(server, s3))
+            config.models.vocabulary = list(workers[0].medical_dict)
+        
+        # Upload placeholder audio for every job before the clock starts
+        sample_length = length_sampler(config.length)
+        arrivals = generate_arrivals(config.arrival, config.jobs, config.rate, rng)
+        records: Dict[str, JobRecord] = {}
+        jobs = []
+        for i, arrival in enumerate(arrivals):
+            duration = sample_length(rng)
+            job = {
+                'jobId': f'job-{i:05d}',
+                'fileId': f'file-{i:05d}',
+                's3Key': f'audio/file-{i:05d}.wav',
+                'priority': 1 if rng.random() < config.priority_fraction else 0,
+            }
+            s3.put_object(Bucket=os.environ['S3_BUCKET'], Key=job['s3Key'], Body=write_stub_audio(duration))
+            jobs.append((arrival, duration, job))
+        
+        # Collect progress and stored-transcript events
+        pubsub = client.pubsub()
+        pubsub.subscribe('job:progress', 'job:transcript')
+        done = threading.Event()
+        
+        def collect():
+            while not done.is_set():
+                message = pubsub.get_message(timeout=0.1)
+                if not message or message['type'] != 'message':
+                    continue
+                now = time.monotonic()
+                data = json.loads(message['data'])
+                record = records.get(data.get('jobId'))
+                if record is None:
+                    continue
+                if message['channel'] == 'job:progress':
+                    if data.get('status') == 'processing' and record.started is None:
+                        record.started, record.status = now, 'running'
+                    elif data.get('status') in ('failed', 'cancelled'):
+                        record.completed, record.status = now, data['status']
+                elif not data.get('draft'):
+                    record.completed, record.status = now, 'completed'
+        
+        threads = [threading.Thread(target=collect, daemon=True)]
+        threads += [threading.Thread(target=worker.run, daemon=True) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for process in processes:
+            process.start()
+        _wait_for(lambda: all(
+            json.loads(client.get(f'worker:{worker_id}:ready') or '{}').get('state') == 'ready'
+            for worker_id in worker_ids
+        ), 60)
+        
+        # Replay arrivals on the compressed clock
+        clock_start = time.monotonic()
+        for arrival, duration, job in jobs:
+            delay = clock_start + arrival / config.speedup - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            records[job['jobId']] = JobRecord(job['jobId'], duration, job['priority'], time.monotonic())
+            client.publish('job:new', json.dumps(job))
+        
+        finished = _wait_for(lambda: all(r.completed is not None for r in records.values()), config.timeout)
+        if not finished:
+            logger.warning("Timed out waiting for jobs to finish")
+        
+        for record in records.values():
+            record.worker = client.get(f"job:{record.job_id}:claim")
+        client.publish('worker:control', json.dumps({'command': 'drain'}))
+        done.set()
+        for thread in threads:
+            thread.join(timeout=10)
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                logger.warning(f"Worker process {process.pid} did not drain; its memory is not reported")
+                process.terminate()
+        tasks = [TaskRecord(**json.loads(task)) for task in client.lrange('load_test:tasks', 0, -1)]
+        worker_memory = [WorkerMemory(**json.loads(m)) for m in client.lrange('load_test:memory', 0, -1)]
+        return list(records.values()), tasks, meter, worker_memory
+    finally:
+        worker_module.whisperx = original_whisperx
+        if tcp_server is not None:
+            tcp_server.shutdown()
+            tcp_server.server_close()
+
+
+# ============================================================
+# Processor target
+# ============================================================
+
+def run_processor_load_test(
+    config: LoadTestConfig,
+    workdir: str
+) -> Tuple[List[JobRecord], List[TaskRecord], MemoryMeter, List[WorkerMemory]]:
+    """
+    Replay the workload through WhisperProcessor, one processor per worker thread
+    
+    Args:
+        config: Load test parameters
+        workdir: Scratch directory (unused; kept for symmetry with the worker target)
+    
+    Returns:
+        Tuple of (per-job records, per-task records, stub model memory meter,
+        no per-process memory: the processors share this process)
+    """
+    from whisper_processor import WhisperProcessor
+    
+    meter = MemoryMeter(config.models.memory_limit_mb)
+    rng = random.Random(config.seed)
+    sample_length = length_sampler(config.length)
+    arrivals = generate_arrivals(config.arrival, config.jobs, config.rate, rng)
+    jobs = [(arrival, sample_length(rng), f'job-{i:05d}') for i, arrival in enumerate(arrivals)]
+    
+    # Higher priority first, then arrival order
+    pending: "queue.PriorityQueue" = queue.PriorityQueue()
+    records: List[JobRecord] = []
+    
+    def serve(index: int):
+        processor = WhisperProcessor(
+            model_size='stub', device='cpu', compute_type='int8',
+            model=StubFasterWhisperModel(config.models, meter)
+        )
+        while True:
+            _, _, record, audio_data = pending.get()
+            if record is None:
+                return
+            record.started, record.status, record.worker = time.monotonic(), 'running', f'processor-{index}'
+            try:
+                processor.transcribe_audio(audio_data, language='ja')
+                record.status = 'completed'
+            except Exception as e:
+                logger.error(f"Job {record.job_id} failed: {e}")
+                record.status = 'failed'
+            record.completed = time.monotonic()
+    
+    threads = [threading.Thread(target=serve, args=(i,), daemon=True) for i in range(config.workers)]
+    for thread in threads:
+        thread.start()
+    
+    clock_start = time.monotonic()
+    for sequence, (arrival, duration, job_id) in enumerate(jobs):
+        delay = clock_start + arrival / config.speedup - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        priority = 1 if rng.random() < config.priority_fraction else 0
+        record = JobRecord(job_id, duration, priority, time.monotonic())
+        records.append(record)
+        pending.put((-priority, sequence, record, write_stub_audio(duration)))
+    
+    for i in range(config.workers):
+        pending.put((1, len(jobs) + i, None, None))
+    for thread in threads:
+        thread.join(timeout=config.timeout)
+    tasks = [
+        TaskRecord(r.job_id, r.worker, r.completed - r.started)
+        for r in records if r.started is not None and r.completed is not None
+    ]
+    return records, tasks, meter, []
+
+
+# ============================================================
+# Report
+# ============================================================
+
+def _wait_for(condition: Callable[[], bool], timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(max(values))}
+
+
+def build_report(
+    records: List[JobRecord],
+    config: LoadTestConfig,
+    meter: MemoryMeter,
+    tasks: Optional[List[TaskRecord]] = None,
+    worker_memory: Optional[List[WorkerMemory]] = None
+) -> Dict[str, Any]:
+    """
+    Summarize job records in simulated seconds (wall seconds × speedup)
+    
+    Args:
+        records: Per-job records
+        config: Load test parameters
+        meter: Stub model memory meter
+        tasks: Per-task records; utilisation is credited to the worker of each
+            task (a split job's chunks), else to the worker that claimed the job
+        worker_memory: Memory of each --processes worker; replaces the meter
+            and RSS of this process, which hold no models then
+    
+    Returns:
+        Report dictionary
+    """
+    scale = config.speedup
+    finished = [r for r in records if r.status == 'completed']
+    started = [r for r in records if r.started is not None]
+    if records:
+        begin = min(r.submitted for r in records)
+        end = max((r.completed or r.started or r.submitted) for r in records)
+    else:
+        begin = end = 0.0
+    makespan = max(1e-9, end - begin) * scale
+    
+    busy: Dict[str, float] = {}
+    if tasks:
+        for task in tasks:
+            busy[task.worker] = busy.get(task.worker, 0.0) + task.seconds * scale
+    else:
+        for r in started:
+            busy[r.worker or '?'] = busy.get(r.worker or '?', 0.0) + ((r.completed or end) - r.started) * scale
+    
+    report = {
+        'config': asdict(config),
+        'jobs': {
+            'submitted': len(records),
+            'completed': len(finished),
+            'failed': sum(r.status == 'failed' for r in records),
+            'unfinished': sum(r.completed is None for r in records),
+        },
+        'queue_wait_seconds': _percentiles([(r.started - r.submitted) * scale for r in started]),
+        'end_to_end_seconds': _percentiles([(r.completed - r.submitted) * scale for r in finished]),
+        'realtime_factor': _percentiles([(r.completed - r.started) * scale / r.duration for r in finished]),
+        'throughput': {
+            'makespan_seconds': makespan,
+            'jobs_per_hour': len(finished) / makespan * 3600,
+            'audio_hours_per_hour': sum(r.duration for r in finished) / makespan,
+        },
+        'utilisation': {worker: seconds / makespan for worker, seconds in sorted(busy.items())},
+        'memory': {
+            'stub_peak_mb': meter.peak_mb,
+            'stub_out_of_memory': meter.out_of_memory,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+    }
+    if worker_memory:
+        # Per-process peaks need not coincide: their sum bounds the fleet's peak
+        report['memory'] = {
+            'stub_peak_mb': sum(m.stub_peak_mb for m in worker_memory),
+            'stub_out_of_memory': sum(m.stub_out_of_memory for m in worker_memory),
+            'max_rss_mb': max(m.max_rss_mb for m in worker_memory),
+            'workers': {m.worker: asdict(m) for m in sorted(worker_memory, key=lambda m: m.worker)},
+        }
+    if config.priority_fraction > 0:
+        report['queue_wait_by_priority'] = {
+            str(priority): _percentiles([
+                (r.started - r.submitted) * scale for r in started if r.priority == priority
+            ])
+            for priority in sorted({r.priority for r in records})
+        }
+    report['config']['models'].pop('vocabulary', None)
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    """Print a human-readable summary"""
+    config, jobs = report['config'], report['jobs']
+    print("=" * 60)
+    print(f"Load test: target={config['target']} workers={config['workers']}"
+          f"{' (processes)' if config.get('processes') else ''} arrival={config['arrival']} "
+          f"rate={config['rate']}/h length={config['length']} speedup={config['speedup']}x")
+    print("=" * 60)
+    print(f"Jobs: {jobs['completed']}/{jobs['submitted']} completed, {jobs['failed']} failed, "
+          f"{jobs['unfinished']} unfinished")
+    for name in ('queue_wait_seconds', 'end_to_end_seconds', 'realtime_factor'):
+        stats = report[name]
+        if stats:
+            print(f"{name:20s} " + "  ".join(f"{k}={v:8.1f}" if name != 'realtime_factor' else f"{k}={v:6.3f}"
+                                          for k, v in stats.items()))
+    for priority, stats in report.get('queue_wait_by_priority', {}).items():
+        if stats:
+            print(f"  wait priority={priority:3s} " + "  ".join(f"{k}={v:8.1f}" for k, v in stats.items()))
+    throughput = report['throughput']
+    print(f"Throughput: {throughput['jobs_per_hour']:.1f} jobs/h, "
+          f"{throughput['audio_hours_per_hour']:.2f} audio h/h over {throughput['makespan_seconds'] / 3600:.2f} h")
+    utilisation = report['utilisation']
+    if utilisation:
+        print("Utilisation: " + ", ".join(f"{w}={u:.0%}" for w, u in utilisation.items())
+              + f" (mean {sum(utilisation.values()) / len(utilisation):.0%})")
+    memory = report['memory']
+    print(f"Memory: stub peak {memory['stub_peak_mb']:.0f} MB ({memory['stub_out_of_memory']} out-of-memory), "
+          f"process max RSS {memory['max_rss_mb']:.0f} MB")
+    for worker, usage in memory.get('workers', {}).items():
+        print(f"  {worker}: RSS {usage['max_rss_mb']:.0f} MB, stub peak {usage['stub_peak_mb']:.0f} MB")
+
+
+def main():
+    """Run a load test from the command line"""
+    parser = argparse.ArgumentParser(description="Transcription load test with stub models")
+    parser.add_argument('--target', choices=['worker', 'processor'], default='worker')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--processes', action='store_true', help="Run each worker in its own process")
+    parser.add_argument('--jobs', type=int, default=20)
+    parser.add_argument('--arrival', choices=['poisson', 'clinic', 'backlog'], default='poisson')
+    parser.add_argument('--rate', type=float, default=12.0, help="Jobs per hour")
+    parser.add_argument('--length', default='lognormal:900:0.6', help="File-length distribution")
+    parser.add_argument('--priority-fraction', type=float, default=0.0, help="Share of priority=1 jobs")
+    parser.add_argument('--speedup', type=float, default=60.0, help="Simulated seconds per wall second")
+    parser.add_argument('--asr-rtf', type=float, default=0.08, help="Stub ASR seconds per audio second")
+    parser.add_argument('--align-rtf', type=float, default=0.01)
+    parser.add_argument('--diarize-rtf', type=float, default=0.03)
+    parser.add_argument('--model-memory-mb', type=float, default=64.0)
+    parser.add_argument('--batch-memory-mb', type=float, default=32.0, help="Stub activations at batch_size=16")
+    parser.add_argument('--memory-limit-mb', type=float, help="Stub allocations beyond this raise MemoryError")
+    parser.add_argument('--timeout', type=float, default=600.0, help="Wall seconds to wait for completion")
+    parser.add_argument('--chunk-min-seconds', type=float, help="Split recordings at least this long (CHUNK_JOB_MIN_SECONDS)")
+    parser.add_argument('--chunk-seconds', type=float, help="Chunk length (CHUNK_SECONDS)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Write the report to this file")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if args.chunk_min_seconds is not None:
+        os.environ['CHUNK_JOB_MIN_SECONDS'] = str(args.chunk_min_seconds)
+    if args.chunk_seconds is not None:
+        os.environ['CHUNK_SECONDS'] = str(args.chunk_seconds)
+    
+    models = StubModelConfig(
+        asr_rtf=args.asr_rtf, align_rtf=args.align_rtf, diarize_rtf=args.diarize_rtf,
+        model_memory_mb=args.model_memory_mb, batch_memory_mb=args.batch_memory_mb,
+        memory_limit_mb=args.memory_limit_mb,
+        speedup=args.speedup,
+    )
+    config = LoadTestConfig(
+        target=args.target, workers=args.workers, jobs=args.jobs, arrival=args.arrival,
+        rate=args.rate, length=args.length, priority_fraction=args.priority_fraction,
+        speedup=args.speedup, timeout=args.timeout, seed=args.seed, models=models,
+        processes=args.processes,
+    )
+    
+    workdir = tempfile.mkdtemp(prefix='load-test-')
+    try:
+        run = run_worker_load_test if config.target == 'worker' else run_processor_load_test
+        records, tasks, meter, worker_memory = run(config, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    report = build_report(records, config, meter, tasks, worker_memory)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report['jobs']['unfinished'] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
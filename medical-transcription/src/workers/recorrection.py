@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Incremental Re-correction - re-applies the medical dictionary to stored transcripts
+Keeps an inverted index from dictionary terms/misrecognition variants to the
+segments containing them (matched against the original ASR text), so a
+dictionary change only re-corrects the affected segments. No ASR involved.
+
+Transcripts stored before the index existed are added with a backfill
+(python recorrection.py --backfill, or the worker's backfill command).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Set, Tuple, Callable, Iterable, Iterator, Pattern
+
+from data_dir import data_path
+from segment_store import SegmentStore
+from transcript_search import TranscriptSearchIndex, to_bigrams
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    segment_index INTEGER NOT NULL,
+    original_text TEXT NOT NULL,
+    UNIQUE (file_id, segment_index)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    bigrams,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 0'
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    segment_index INTEGER NOT NULL,
+    PRIMARY KEY (term, file_id, segment_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_file ON postings(file_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def compile_corrections(corrections: Dict[str, str]) -> Optional[Pattern]:
+    """Compile an alternation of all misrecognitions (longest first) used as a prefilter"""
+    keys = sorted(corrections, key=len, reverse=True)
+    return re.compile('|'.join(map(re.escape, keys))) if keys else None
+
+
+def apply_corrections(
+    text: str,
+    corrections: Dict[str, str],
+    pattern: Optional[Pattern] = None
+) -> Tuple[str, List[str]]:
+    """
+    Apply dictionary corrections in dictionary order
+    
+    Args:
+        text: Original ASR text
+        corrections: Misrecognition → correct term
+        pattern: Optional prefilter from compile_corrections
+    
+    Returns:
+        Tuple of (corrected_text, list_of_corrections)
+    """
+    if pattern is not None and not pattern.search(text):
+        return text, []
+    applied = []
+    for wrong, correct in corrections.items():
+        if wrong in text:
+            text = text.replace(wrong, correct)
+            applied.append(f"{wrong} → {correct}")
+    return text, applied
+
+
+def build_transcript_text(segments: List[Dict[str, Any]]) -> Tuple[str, List[str]]:
+    """Rebuild transcript-level text and corrections from corrected segments"""
+    text = " ".join(segment.get("text", "") for segment in segments).strip()
+    corrections = [c for segment in segments for c in segment.get("corrections", [])]
+    return text, corrections
+
+
+def changed_terms(old: Dict[str, str], new: Dict[str, str]) -> Set[str]:
+    """
+    Terms whose segments must be re-corrected after a dictionary change
+    
+    Includes added, removed and re-mapped misrecognitions, plus unchanged
+    terms whose replacement contains a changed term (chained replacements).
+    """
+    changed = {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+    chained = {
+        k for k in set(old) & set(new)
+        if any(term in old[k] or term in new[k] for term in changed)
+    }
+    return changed | chained
+
+
+def stored_transcript_ids(s3_client, bucket: str) -> Iterator[str]:
+    """
+    File IDs of every transcript stored in S3 (transcripts/{fileId}.json)
+    
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+    
+    Yields:
+        File IDs, skipping profiles and other transcripts/ objects
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix='transcripts/'):
+        for obj in page.get('Contents', []):
+            name = obj['Key'][len('transcripts/'):]
+            if name.endswith('.json') and '.' not in name[:-len('.json')] and '/' not in name:
+                yield name[:-len('.json')]
+
+
+def _recorrect_segments(
+    transcript: Dict[str, Any],
+    segment_indices: List[int],
+    corrections: Dict[str, str]
+) -> Tuple[Dict[str, Any], int]:
+    """
+    Re-correct selected segments of one transcript (runs in a worker process)
+    
+    Returns:
+        Tuple of (updated transcript, number of segments whose text changed)
+    """
+    pattern = compile_corrections(corrections)
+    segments = transcript.get("segments", [])
+    # Transcripts written before per-segment corrections were recorded need a full pass
+    if any("corrections" not in segment for segment in segments):
+        segment_indices = range(len(segments))
+    
+    updated = 0
+    for index in segment_indices:
+        if index >= len(segments):
+            continue
+        segment = segments[index]
+        original = segment.setdefault("original_text", segment.get("text", ""))
+        text, applied = apply_corrections(original, corrections, pattern)
+        if text != segment.get("text"):
+            updated += 1
+        segment["text"] = text
+        segment["corrections"] = applied
+    
+    transcript["text"], transcript["corrections"] = build_transcript_text(segments)
+    transcript["version"] = transcript.get("version", 1) + 1
+    return transcript, updated
+
+
+class TermIndex:
+    """Inverted index from dictionary terms to transcript segments (original ASR text)"""
+    
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the index database
+        
+        Args:
+            db_path: SQLite file path
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+    
+    def get_dictionary(self) -> Optional[Dict[str, str]]:
+        """Dictionary the postings were last made complete for"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'dictionary'").fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set_dictionary(self, corrections: Dict[str, str]):
+        """Record the dictionary the postings are complete for"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('dictionary', ?)",
+                (json.dumps(corrections, ensure_ascii=False),)
+            )
+    
+    def index_transcript(
+        self,
+        file_id: str,
+        transcript: Dict[str, Any],
+        corrections: Dict[str, str]
+    ) -> int:
+        """
+        Index (or re-index) the original text of every segment of a transcript
+        
+        Args:
+            file_id: File ID
+            transcript: Transcript with segments carrying "original_text"
+            corrections: Current dictionary (its terms get postings)
+        
+        Returns:
+            Number of postings written
+        """
+        terms = set(corrections) | set(self.get_dictionary() or {})
+        pattern = compile_corrections(dict.fromkeys(terms, ""))
+        
+        rows, postings = [], []
+        for index, segment in enumerate(transcript.get("segments", [])):
+            original = segment.get("original_text", segment.get("text", ""))
+            rows.append((file_id, index, original))
+            if pattern is not None and pattern.search(original):
+                postings.extend((term, file_id, index) for term in terms if term in original)
+        
+        with self._lock, self.conn:
+            self._delete_locked(file_id)
+            self.conn.executemany(
+                "INSERT INTO segments (file_id, segment_index, original_text) VALUES (?, ?, ?)",
+                rows
+            )
+            self.conn.executemany(
+                "INSERT INTO segments_fts (rowid, bigrams) VALUES (?, ?)",
+                self._fts_rows(file_id)
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO postings (term, file_id, segment_index) VALUES (?, ?, ?)",
+                postings
+            )
+        return len(postings)
+    
+    def indexed_files(self) -> Set[str]:
+        """File IDs with indexed segments"""
+        with self._lock:
+            return {row[0] for row in self.conn.execute("SELECT DISTINCT file_id FROM segments")}
+    
+    def delete_transcript(self, file_id: str):
+        """Remove a transcript from the index"""
+        with self._lock, self.conn:
+            self._delete_locked(file_id)
+    
+    def _fts_rows(self, file_id: str) -> List[Tuple[int, str]]:
+        return [
+            (row_id, ' '.join(to_bigrams(text)))
+            for row_id, text in self.conn.execute(
+                "SELECT id, original_text FROM segments WHERE file_id = ?", (file_id,)
+            )
+        ]
+    
+    def _delete_locked(self, file_id: str):
+        self.conn.executemany(
+            "INSERT INTO segments_fts (segments_fts, rowid, bigrams) VALUES ('delete', ?, ?)",
+            self._fts_rows(file_id)
+        )
+        self.conn.execute("DELETE FROM segments WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+    
+    def lookup(self, terms: Iterable[str]) -> Dict[str, Set[int]]:
+        """
+        Find the segments containing any of the terms
+        
+        Terms of the indexed dictionary are answered from the postings. Other
+        terms (new variants) are resolved through the bigram index over the
+        original text, verified, and added to the postings.
+        
+        Args:
+            terms: Dictionary terms / misrecognition variants
+        
+        Returns:
+            Mapping of file ID → affected segment indices
+        """
+        known = set(self.get_dictionary() or {})
+        affected: Dict[str, Set[int]] = {}
+        with self._lock, self.conn:
+            for term in terms:
+                if term in known:
+                    rows = self.conn.execute(
+                        "SELECT file_id, segment_index FROM postings WHERE term = ?", (term,)
+                    ).fetchall()
+                else:
+                    rows = self._resolve_locked(term)
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO postings (term, file_id, segment_index) VALUES (?, ?, ?)",
+                        [(term, file_id, index) for file_id, index in rows]
+                    )
+                for file_id, index in rows:
+                    affected.setdefault(file_id, set()).add(index)
+        return affected
+    
+    def _resolve_locked(self, term: str) -> List[Tuple[str, int]]:
+        """Substring search over original text via the bigram index"""
+        bigrams = to_bigrams(term)
+        if len(bigrams) > 1 or (bigrams and len(bigrams[0]) > 1):
+            phrase = ' '.join(bigrams).replace('"', '""')
+            candidates = self.conn.execute(
+                "SELECT s.file_id, s.segment_index, s.original_text FROM segments_fts "
+                "JOIN segments s ON s.id = segments_fts.rowid WHERE segments_fts MATCH ?",
+                (f'"{phrase}"',)
+            )
+        else:
+            candidates = self.conn.execute(
+                "SELECT file_id, segment_index, original_text FROM segments WHERE original_text LIKE ?",
+                (f"%{term}%",)
+            )
+        return [(file_id, index) for file_id, index, text in candidates if term in text]
+    
+    def remove_terms(self, terms: Iterable[str]):
+        """Drop postings of terms no longer in the dictionary"""
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM postings WHERE term = ?", [(t,) for t in terms])
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
+
+
+class RecorrectionEngine:
+    """Re-corrects only the segments affected by a dictionary change"""
+    
+    def __init__(
+        self,
+        index: TermIndex,
+        load_transcript: Callable[[str], Optional[Dict[str, Any]]],
+        store_transcript: Callable[[str, Dict[str, Any]], None],
+        max_workers: Optional[int] = None,
+        io_workers: int = 16
+    ):
+        """
+        Args:
+            index: Term index
+            load_transcript: Fetches a stored transcript by file ID (None if missing)
+            store_transcript: Writes an updated transcript back
+            max_workers: Size of the re-correction process pool (default: CPU count)
+            io_workers: Threads used to load and store transcripts
+        """
+        self.index = index
+        self.load_transcript = load_transcript
+        self.store_transcript = store_transcript
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.io_workers = io_workers
+    
+    def recorrect(self, corrections: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Bring stored transcripts up to date with a new dictionary
+        
+        Args:
+            corrections: New dictionary (misrecognition → correct term)
+        
+        Returns:
+            Statistics (changed terms, files/segments touched, timings)
+        """
+        start = time.time()
+        previous = self.index.get_dictionary()
+        if previous is None:
+            # Nothing recorded yet: postings were built with the current dictionary
+            self.index.set_dictionary(corrections)
+            return {'changed_terms': 0, 'files': 0, 'segments': 0, 'updated_segments': 0, 'seconds': 0.0}
+        
+        terms = changed_terms(previous, corrections)
+        affected = self.index.lookup(terms) if terms else {}
+        segment_count = sum(len(indices) for indices in affected.values())
+        logger.info(
+            f"Dictionary change touches {len(terms)} terms: "
+            f"{segment_count} segments in {len(affected)} transcripts"
+        )
+        
+        updated_segments = 0
+        with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool, self._cpu_pool() as cpu_pool:
+            loaded = io_pool.map(lambda file_id: (file_id, self.load_transcript(file_id)), affected)
+            recorrected = []
+            for file_id, transcript in loaded:
+                if transcript is None:
+                    logger.warning(f"Transcript for file {file_id} not found, dropping from index")
+                    self.index.delete_transcript(file_id)
+                    continue
+                future = cpu_pool.submit(
+                    _recorrect_segments, transcript, sorted(affected[file_id]), corrections
+                )
+                recorrected.append((file_id, future))
+            
+            stored = []
+            for file_id, future in recorrected:
+                transcript, updated = future.result()
+                updated_segments += updated
+                if updated:
+                    stored.append(io_pool.submit(self._store, file_id, transcript, corrections))
+            for future in stored:
+                future.result()
+        
+        self.index.remove_terms(set(previous) - set(corrections))
+        self.index.set_dictionary(corrections)
+        
+        stats = {
+            'changed_terms': len(terms),
+            'files': len(affected),
+            'segments': segment_count,
+            'updated_segments': updated_segments,
+            'seconds': time.time() - start,
+        }
+        logger.info(f"Re-correction complete: {stats}")
+        return stats
+    
+    def backfill(self, file_ids: Iterable[str], corrections: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Add stored transcripts that are not in the index yet
+        
+        Each one is first re-corrected in full with the dictionary the index
+        is complete for, so later dictionary changes only need its postings.
+        Already indexed files are skipped, so an interrupted backfill resumes.
+        
+        Args:
+            file_ids: File IDs of the stored transcripts
+            corrections: Current dictionary (recorded if the index has none yet)
+        
+        Returns:
+            Statistics (files indexed/updated/skipped/missing, timings)
+        """
+        start = time.time()
+        dictionary = self.index.get_dictionary()
+        if dictionary is None:
+            self.index.set_dictionary(corrections)
+            dictionary = corrections
+        indexed = self.index.indexed_files()
+        pending = [file_id for file_id in file_ids if file_id not in indexed]
+        logger.info(f"Backfilling term index: {len(pending)} transcripts ({len(indexed)} already indexed)")
+        
+        stats = {'files': 0, 'updated_files': 0, 'skipped': len(indexed), 'missing': 0}
+        with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool, self._cpu_pool() as cpu_pool:
+            loaded = io_pool.map(lambda file_id: (file_id, self.load_transcript(file_id)), pending)
+            recorrected = []
+            for file_id, transcript in loaded:
+                if transcript is None:
+                    stats['missing'] += 1
+                    continue
+                segment_indices = list(range(len(transcript.get("segments", []))))
+                future = cpu_pool.submit(_recorrect_segments, transcript, segment_indices, dictionary)
+                recorrected.append((file_id, transcript, future))
+            
+            stored = []
+            for file_id, original, future in recorrected:
+                transcript, updated = future.result()
+                stats['files'] += 1
+                if updated:
+                    stats['updated_files'] += 1
+                    stored.append(io_pool.submit(self._store, file_id, transcript, dictionary))
+                else:
+                    # Unchanged: index the stored transcript as it is, without a new version
+                    stored.append(io_pool.submit(self.index.index_transcript, file_id, original, dictionary))
+            for future in stored:
+                future.result()
+        
+        stats['seconds'] = time.time() - start
+        logger.info(f"Term index backfill complete: {stats}")
+        return stats
+    
+    def _cpu_pool(self) -> ProcessPoolExecutor:
+        # Spawned: forking a multi-threaded worker with CUDA initialized can deadlock the children
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    
+    def _store(self, file_id: str, transcript: Dict[str, Any], corrections: Dict[str, str]):
+        self.store_transcript(file_id, transcript)
+        self.index.index_transcript(file_id, transcript, corrections)
+
+
+def main():
+    """
+    Re-correct stored transcripts after editing medical_dictionary.json
+    
+    Usage:
+        python recorrection.py [--backfill] [medical_dictionary.json]
+    
+    --backfill first adds stored transcripts missing from the term index.
+    Stores like the worker's recorrect command (S3, search index, segment
+    store, job:transcript) and holds the same lease, so it never runs
+    alongside a worker's re-correction.
+    """
+    import boto3
+    import redis
+    from botocore.config import Config
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    args = sys.argv[1:]
+    backfill = '--backfill' in args
+    args = [arg for arg in args if arg != '--backfill']
+    project_dir = Path(__file__).parent.parent.parent
+    dict_path = Path(args[0]) if args else project_dir / 'medical_dictionary.json'
+    with open(dict_path, 'r', encoding='utf-8') as f:
+        corrections = json.load(f).get('corrections', {})
+    
+    s3 = boto3.client(
+        's3',
+        endpoint_url=os.getenv('S3_ENDPOINT'),
+        aws_access_key_id=os.getenv('S3_ACCESS_KEY'),
+        aws_secret_access_key=os.getenv('S3_SECRET_KEY'),
+        config=Config(signature_version='s3v4')
+    )
+    bucket = os.getenv('S3_BUCKET', 'medical-transcription')
+    
+    def load(file_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            obj = s3.get_object(Bucket=bucket, Key=f"transcripts/{file_id}.json")
+        except s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(obj['Body'].read())
+    
+    redis_client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'), decode_responses=True)
+    search_index = TranscriptSearchIndex(
+        os.getenv('SEARCH_INDEX_PATH', data_path('transcript_search.db'))
+    )
+    segment_store = SegmentStore(os.getenv('SEGMENT_STORE_PATH', data_path('segments.db')))
+    
+    def store(file_id: str, transcript: Dict[str, Any]):
+        version = transcript.get('version', 1)
+        s3.put_object(
+            Bucket=bucket,
+            Key=f"transcripts/{file_id}.json",
+            Body=json.dumps(transcript, ensure_ascii=False, indent=2),
+            ContentType='application/json',
+            Metadata={'version': str(version)}
+        )
+        redis_client.publish('job:transcript', json.dumps({
+            'jobId': None,
+            'fileId': file_id,
+            'version': version,
+            'draft': transcript.get('draft', False),
+            'timestamp': time.time()
+        }))
+        search_index.index_transcript(file_id, transcript)
+        segment_store.write_transcript(file_id, transcript)
+    
+    # Same lease as the worker's recorrect command (a day's TTL: no heartbeat renews it here)
+    lease = 'control:recorrect:lease'
+    owner = f"recorrection-cli-{os.getpid()}"
+    if not redis_client.set(lease, owner, nx=True, ex=86400):
+        sys.exit(f"Re-correction is already running on {redis_client.get(lease)}")
+    try:
+        index = TermIndex(os.getenv('TERM_INDEX_PATH', data_path('term_index.db')))
+        engine = RecorrectionEngine(index, load, store)
+        if backfill:
+            print(json.dumps(engine.backfill(stored_transcript_ids(s3, bucket), corrections), indent=2))
+        stats = engine.recorrect(corrections)
+        print(json.dumps(stats, indent=2))
+    finally:
+        if redis_client.get(lease) == owner:
+            redis_client.delete(lease)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Segment Store - normalized SQLite tables for transcript segments, words and speaker turns
+Time-window and speaker queries read only the matching rows through the
+(transcript, start) and (transcript, speaker, start) indexes and stream them
+in batches, so memory follows the size of the slice rather than the recording.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+FETCH_BATCH = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    file_id TEXT NOT NULL UNIQUE,
+    version INTEGER NOT NULL DEFAULT 1,
+    language TEXT,
+    duration REAL,
+    max_segment_seconds REAL NOT NULL DEFAULT 0,
+    max_word_seconds REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    transcript_id INTEGER NOT NULL,
+    segment_index INTEGER NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    speaker TEXT,
+    text TEXT NOT NULL,
+    original_text TEXT,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_start ON segments(transcript_id, start_time);
+CREATE INDEX IF NOT EXISTS idx_segments_speaker ON segments(transcript_id, speaker, start_time);
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY,
+    transcript_id INTEGER NOT NULL,
+    segment_id INTEGER NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    speaker TEXT,
+    word TEXT NOT NULL,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS idx_words_segment ON words(segment_id);
+CREATE INDEX IF NOT EXISTS idx_words_start ON words(transcript_id, start_time);
+CREATE INDEX IF NOT EXISTS idx_words_speaker ON words(transcript_id, speaker, start_time);
+CREATE TABLE IF NOT EXISTS speaker_turns (
+    id INTEGER PRIMARY KEY,
+    transcript_id INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    segment_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_start ON speaker_turns(transcript_id, start_time);
+CREATE INDEX IF NOT EXISTS idx_turns_speaker ON speaker_turns(transcript_id, speaker, start_time);
+"""
+
+SEGMENT_COLUMNS = "id, segment_index, start_time, end_time, speaker, text, original_text, score"
+
+
+def speaker_turns(segments: List[Dict[str, Any]]) -> List[Tuple[str, float, float, int]]:
+    """
+    Merge consecutive segments of the same speaker into turns
+    
+    Args:
+        segments: Transcript segments in time order
+    
+    Returns:
+        List of (speaker, start, end, segment_count)
+    """
+    turns: List[List[Any]] = []
+    for segment in segments:
+        speaker = segment.get("speaker")
+        if speaker is None:
+            continue
+        if turns and turns[-1][0] == speaker:
+            turns[-1][2] = max(turns[-1][2], segment.get("end", 0.0))
+            turns[-1][3] += 1
+        else:
+            turns.append([speaker, segment.get("start", 0.0), segment.get("end", 0.0), 1])
+    return [tuple(turn) for turn in turns]
+
+
+class SegmentStore:
+    """Normalized transcript store with indexed time-range and speaker queries"""
+    
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the store
+        
+        Args:
+            db_path: SQLite file path
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+    
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread read connection (WAL readers never block the writer)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+        return conn
+    
+    def write_transcript(self, file_id: str, transcript: Dict[str, Any]) -> int:
+        """
+        Store (or replace) a transcript's segments, words and speaker turns
+        
+        Args:
+            file_id: File ID
+            transcript: Transcript document with "segments" (and their "words")
+        
+        Returns:
+            Number of segments written
+        """
+        segments = transcript.get("segments", [])
+        max_segment = max((seg.get("end", 0.0) - seg.get("start", 0.0) for seg in segments), default=0.0)
+        max_word = max(
+            (w.get("end", 0.0) - w.get("start", 0.0) for seg in segments for w in seg.get("words", [])
+             if "start" in w and "end" in w),
+            default=0.0
+        )
+        
+        with self._lock, self.conn:
+            self._delete_locked(file_id)
+            transcript_id = self.conn.execute(
+                "INSERT INTO transcripts (file_id, version, language, duration, max_segment_seconds, "
+                "max_word_seconds, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_id, transcript.get("version", 1), transcript.get("language"),
+                 transcript.get("duration"), max_segment, max_word, time.time())
+            ).lastrowid
+            
+            # Segment ids are allocated up front so words can reference them in one executemany
+            first_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM segments").fetchone()[0]
+            self.conn.executemany(
+                "INSERT INTO segments (id, transcript_id, segment_index, start_time, end_time, speaker, "
+                "text, original_text, score) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (first_id + index, transcript_id, index, seg.get("start", 0.0), seg.get("end", 0.0),
+                     seg.get("speaker"), seg.get("text", ""), seg.get("original_text"), seg.get("score"))
+                    for index, seg in enumerate(segments)
+                )
+            )
+            self.conn.executemany(
+                "INSERT INTO words (transcript_id, segment_id, start_time, end_time, speaker, word, score) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (transcript_id, first_id + index, word.get("start"), word.get("end"),
+                     word.get("speaker", seg.get("speaker")), word.get("word", ""), word.get("score"))
+                    for index, seg in enumerate(segments)
+                    for word in seg.get("words", [])
+                )
+            )
+            self.conn.executemany(
+                "INSERT INTO speaker_turns (transcript_id, speaker, start_time, end_time, segment_count) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((transcript_id, *turn) for turn in speaker_turns(segments))
+            )
+        logger.info(f"Stored {len(segments)} segments for file {file_id} in segment store")
+        return len(segments)
+    
+    def delete_transcript(self, file_id: str) -> bool:
+        """Remove a transcript; returns False if it was not stored"""
+        with self._lock, self.conn:
+            return self._delete_locked(file_id)
+    
+    def _delete_locked(self, file_id: str) -> bool:
+        row = self.conn.execute("SELECT id FROM transcripts WHERE file_id = ?", (file_id,)).fetchone()
+        if row is None:
+            return False
+        for table in ("words", "segments", "speaker_turns"):
+            self.conn.execute(f"DELETE FROM {table} WHERE transcript_id = ?", (row[0],))
+        self.conn.execute("DELETE FROM transcripts WHERE id = ?", (row[0],))
+        return True
+    
+    def _transcript(self, conn: sqlite3.Connection, file_id: str) -> Optional[Tuple[int, float, float]]:
+        return conn.execute(
+            "SELECT id, max_segment_seconds, max_word_seconds FROM transcripts WHERE file_id = ?", (file_id,)
+        ).fetchone()
+    
+    def time_window(
+        self,
+        file_id: str,
+        start: float,
+        end: float,
+        include_words: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Segments overlapping [start, end), in time order
+        
+        Args:
+            file_id: File ID
+            start: Window start (seconds)
+            end: Window end (seconds)
+            include_words: Attach each segment's words
+        
+        Yields:
+            Segment dicts
+        """
+        conn = self._reader()
+        transcript = self._transcript(conn, file_id)
+        if transcript is None:
+            return
+        transcript_id, max_segment, _ = transcript
+        # start_time >= start - longest segment keeps the index range scan tight
+        cursor = conn.execute(
+            f"SELECT {SEGMENT_COLUMNS} FROM segments "
+            "WHERE transcript_id = ? AND start_time >= ? AND start_time < ? AND end_time > ? "
+            "ORDER BY start_time",
+            (transcript_id, start - max_segment, end, start)
+        )
+        yield from self._stream_segments(conn, cursor, include_words)
+    
+    def speaker_slice(
+        self,
+        file_id: str,
+        speaker: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        include_words: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Segments of one speaker, optionally limited to [start, end)
+        
+        Args:
+            file_id: File ID
+            speaker: Speaker label (e.g. SPEAKER_01)
+            start: Window start (seconds, optional)
+            end: Window end (seconds, optional)
+            include_words: Attach each segment's words
+        
+        Yields:
+            Segment dicts
+        """
+        conn = self._reader()
+        transcript = self._transcript(conn, file_id)
+        if transcript is None:
+            return
+        transcript_id, max_segment, _ = transcript
+        lower = float('-inf') if start is None else start - max_segment
+        upper = float('inf') if end is None else end
+        cursor = conn.execute(
+            f"SELECT {SEGMENT_COLUMNS} FROM segments "
+            "WHERE transcript_id = ? AND speaker = ? AND start_time >= ? AND start_time < ? AND end_time > ? "
+            "ORDER BY start_time",
+            (transcript_id, speaker, lower, upper, lower if start is None else start)
+        )
+        yield from self._stream_segments(conn, cursor, include_words)
+    
+    def words(
+        self,
+        file_id: str,
+        start: float,
+        end: float,
+        speaker: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Words overlapping [start, end), optionally of one speaker
+        
+        Yields:
+            Word dicts in time order
+        """
+        conn = self._reader()
+        transcript = self._transcript(conn, file_id)
+        if transcript is None:
+            return
+        transcript_id, _, max_word = transcript
+        sql = (
+            "SELECT word, start_time, end_time, speaker, score FROM words "
+            "WHERE transcript_id = ? AND start_time >= ? AND start_time < ? AND end_time > ?"
+        )
+        params: List[Any] = [transcript_id, start - max_word, end, start]
+        if speaker is not None:
+            sql += " AND speaker = ?"
+            params.append(speaker)
+        cursor = conn.execute(sql + " ORDER BY start_time", params)
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH)
+            if not rows:
+                return
+            for word, word_start, word_end, word_speaker, score in rows:
+                yield {"word": word, "start": word_start, "end": word_end, "speaker": word_speaker, "score": score}
+    
+    def speaker_turns(self, file_id: str, speaker: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Speaker turns (consecutive segments of one speaker), optionally of one speaker"""
+        conn = self._reader()
+        transcript = self._transcript(conn, file_id)
+        if transcript is None:
+            return []
+        sql = "SELECT speaker, start_time, end_time, segment_count FROM speaker_turns WHERE transcript_id = ?"
+        params: List[Any] = [transcript[0]]
+        if speaker is not None:
+            sql += " AND speaker = ?"
+            params.append(speaker)
+        return [
+            {"speaker": row[0], "start": row[1], "end": row[2], "segments": row[3]}
+            for row in conn.execute(sql + " ORDER BY start_time", params)
+        ]
+    
+    def summary(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Transcript metadata and per-speaker totals, without reading segments"""
+        conn = self._reader()
+        row = conn.execute(
+            "SELECT id, version, language, duration FROM transcripts WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        speakers = {
+            speaker: {"turns": turns, "seconds": seconds}
+            for speaker, turns, seconds in conn.execute(
+                "SELECT speaker, COUNT(*), SUM(end_time - start_time) FROM speaker_turns "
+                "WHERE transcript_id = ? GROUP BY speaker", (row[0],)
+            )
+        }
+        return {"file_id": file_id, "version": row[1], "language": row[2], "duration": row[3], "speakers": speakers}
+    
+    def _stream_segments(self, conn, cursor, include_words: bool) -> Iterator[Dict[str, Any]]:
+        """Yield segment rows batch by batch, attaching words per batch"""
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH)
+            if not rows:
+                return
+            words_by_segment: Dict[int, List[Dict[str, Any]]] = {}
+            if include_words:
+                ids = [row[0] for row in rows]
+                for segment_id, word, start, end, speaker, score in conn.execute(
+                    "SELECT segment_id, word, start_time, end_time, speaker, score FROM words "
+                    f"WHERE segment_id IN ({','.join('?' * len(ids))}) ORDER BY id",
+                    ids
+                ):
+                    words_by_segment.setdefault(segment_id, []).append(
+                        {"word": word, "start": start, "end": end, "speaker": speaker, "score": score}
+                    )
+            for segment_id, index, start, end, speaker, text, original_text, score in rows:
+                segment = {"index": index, "start": start, "end": end, "speaker": speaker, "text": text}
+                if original_text is not None:
+                    segment["original_text"] = original_text
+                if score is not None:
+                    segment["score"] = score
+                if include_words:
+                    segment["words"] = words_by_segment.get(segment_id, [])
+                yield segment
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
+
+
+def _synthetic_transcript(hours: float) -> Dict[str, Any]:
+    """Transcript shaped like WhisperX output: 5 s segments, 8 words each, two speakers"""
+    segments = []
+    start = 0.0
+    while start < hours * 3600:
+        speaker = f"SPEAKER_{(int(start) // 20) % 2:02d}"
+        words = [
+            {"word": f"語{i}", "start": start + i * 0.6, "end": start + i * 0.6 + 0.5, "score": 0.9, "speaker": speaker}
+            for i in range(8)
+        ]
+        segments.append({"start": start, "end": start + 5.0, "text": "血糖値は安定しています",
+                         "speaker": speaker, "score": 0.9, "words": words})
+        start += 5.0
+    return {"segments": segments, "language": "ja", "duration": hours * 3600, "version": 1}
+
+
+def main():
+    """Query the store, import a transcript, or benchmark against parsing the JSON blob"""
+    logging.basicConfig(level=logging.INFO)
+    
+    if len(sys.argv) < 2:
+        print("Usage: python segment_store.py window <file_id> <start> <end> [--words]")
+        print("       python segment_store.py speaker <file_id> <speaker> [start end]")
+        print("       python segment_store.py --import <file_id> <transcript.json>")
+        print("       python segment_store.py --benchmark [hours]")
+        sys.exit(1)
+    
+    if sys.argv[1] == '--benchmark':
+        import tempfile
+        hours = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+        transcript = _synthetic_transcript(hours)
+        blob = json.dumps(transcript["segments"], ensure_ascii=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SegmentStore(os.path.join(tmp, 'segments.db'))
+            start = time.perf_counter()
+            store.write_transcript('bench', transcript)
+            print(f"Write: {len(transcript['segments'])} segments in {(time.perf_counter() - start) * 1000:.0f} ms")
+            
+            start = time.perf_counter()
+            parsed = json.loads(blob)
+            window = [s for s in parsed if s["start"] < 14 * 60 and s["end"] > 12 * 60]
+            print(f"JSON blob ({len(blob) / 2**20:.1f} MB) parse + filter: "
+                  f"{(time.perf_counter() - start) * 1000:.1f} ms, {len(window)} segments")
+            
+            for label, query in [
+                ("time_window 12-14 min", lambda: list(store.time_window('bench', 720, 840))),
+                ("time_window 12-14 min + words", lambda: list(store.time_window('bench', 720, 840, True))),
+                ("speaker_slice SPEAKER_01 12-14 min", lambda: list(store.speaker_slice('bench', 'SPEAKER_01', 720, 840))),
+                ("speaker_turns SPEAKER_01", lambda: store.speaker_turns('bench', 'SPEAKER_01')),
+                ("words 12-14 min", lambda: list(store.words('bench', 720, 840))),
+            ]:
+                start = time.perf_counter()
+                rows = query()
+                print(f"{label}: {(time.perf_counter() - start) * 1000:.2f} ms, {len(rows)} rows")
+            store.close()
+        return
+    
+    store = SegmentStore(os.getenv(
+        'SEGMENT_STORE_PATH',
+        data_path('segments.db')
+    ))
+    if sys.argv[1] == '--import':
+        with open(sys.argv[3], 'r', encoding='utf-8') as f:
+            store.write_transcript(sys.argv[2], json.load(f))
+    elif sys.argv[1] == 'window':
+        for segment in store.time_window(sys.argv[2], float(sys.argv[3]), float(sys.argv[4]), '--words' in sys.argv):
+            print(json.dumps(segment, ensure_ascii=False))
+    elif sys.argv[1] == 'speaker':
+        bounds = [float(v) for v in sys.argv[4:6]] if len(sys.argv) > 5 else [None, None]
+        for segment in store.speaker_slice(sys.argv[2], sys.argv[3], *bounds):
+            print(json.dumps(segment, ensure_ascii=False))
+    print(json.dumps(store.summary(sys.argv[2]), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
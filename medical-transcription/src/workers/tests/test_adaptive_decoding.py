@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Re-decoded segments replace only the span of the segment they retry: words
+from the padding are dropped and the output stays in time order
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from whisper_processor import AdaptiveDecodingConfig, _clip_to_span, _sort_segments
+
+
+def segment(start, end, words, text=None):
+    """Segment dict as _segment_to_dict builds it from (word, start, end) triples"""
+    return {
+        'start': start, 'end': end,
+        'text': text if text is not None else ''.join(word for word, _, _ in words).strip(),
+        'confidence': -0.5, 'no_speech_prob': 0.1,
+        'words': [{'word': word, 'start': s, 'end': e, 'confidence': 0.9} for word, s, e in words],
+    }
+
+
+class ClipToSpanTest(unittest.TestCase):
+    
+    def test_padding_words_are_dropped(self):
+        # Original segment 10.0-12.0, retried on 9.7-12.3: "です" and "次" belong to the neighbours
+        retry = [
+            segment(9.7, 10.8, [("です", 9.7, 9.95), ("血圧", 10.0, 10.5), ("は", 10.5, 10.8)]),
+            segment(10.8, 12.3, [("正常", 10.8, 11.9), ("次", 11.95, 12.3)]),
+        ]
+        clipped = _clip_to_span(retry, 10.0, 12.0)
+        
+        self.assertEqual([seg['text'] for seg in clipped], ["血圧は", "正常"])
+        self.assertEqual([(seg['start'], seg['end']) for seg in clipped], [(10.0, 10.8), (10.8, 12.0)])
+        self.assertEqual([word['word'] for seg in clipped for word in seg['words']], ["血圧", "は", "正常"])
+    
+    def test_segment_wholly_in_padding_is_dropped(self):
+        retry = [
+            segment(9.7, 9.98, [("です", 9.7, 9.95)]),
+            segment(10.0, 12.0, [("血圧", 10.0, 12.0)]),
+        ]
+        self.assertEqual([seg['text'] for seg in _clip_to_span(retry, 10.0, 12.0)], ["血圧"])
+    
+    def test_word_boundaries_stay_inside_the_span(self):
+        clipped = _clip_to_span([segment(9.8, 12.2, [("血圧", 9.8, 11.0), ("正常", 11.0, 12.2)])], 10.0, 12.0)
+        words = clipped[0]['words']
+        self.assertEqual((words[0]['start'], words[-1]['end']), (10.0, 12.0))
+    
+    def test_segments_without_words_use_their_midpoint(self):
+        retry = [segment(9.7, 10.1, [], text="です"), segment(10.1, 11.9, [], text="血圧は正常")]
+        self.assertEqual([seg['text'] for seg in _clip_to_span(retry, 10.0, 12.0)], ["血圧は正常"])
+
+
+class SortSegmentsTest(unittest.TestCase):
+    
+    def test_sorted_and_repeats_dropped(self):
+        segments = [
+            segment(0.0, 2.0, [], text="こんにちは"),
+            segment(4.0, 6.0, [], text="次回"),
+            segment(2.0, 4.0, [], text="血圧は正常"),
+            segment(3.5, 4.0, [], text="血圧は正常"),
+            segment(6.0, 7.0, [], text="次回"),
+        ]
+        self.assertEqual(
+            [(seg['start'], seg['text']) for seg in _sort_segments(segments)],
+            [(0.0, "こんにちは"), (2.0, "血圧は正常"), (4.0, "次回"), (6.0, "次回")]
+        )
+
+
+class AdaptiveConfigTest(unittest.TestCase):
+    
+    def test_temperatures_from_env(self):
+        with mock.patch.dict(os.environ, {'WHISPER_ADAPTIVE_TEMPERATURES': '0.0, 0.4,0.8,'}):
+            self.assertEqual(AdaptiveDecodingConfig.from_env().retry_temperatures, (0.0, 0.4, 0.8))
+        with mock.patch.dict(os.environ, {'WHISPER_ADAPTIVE_TEMPERATURES': ''}):
+            self.assertEqual(AdaptiveDecodingConfig.from_env().retry_temperatures, (0.0, 0.2, 0.4, 0.6, 0.8, 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
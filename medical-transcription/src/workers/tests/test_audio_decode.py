@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Polyphase resampler accuracy (passband, stopband, length, streaming) and
+in-process decoding of a stereo file
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audio_decode import SAMPLE_RATE, PolyphaseResampler, decode_in_process
+
+EDGE = 400          # output samples at each end inside the filter's ramp-up
+
+
+def tone(frequency: float, rate: int, seconds: float = 2.0) -> np.ndarray:
+    return np.sin(2 * np.pi * frequency * np.arange(int(rate * seconds)) / rate).astype(np.float32)
+
+
+def resample(audio: np.ndarray, rate: int, block: int = None) -> np.ndarray:
+    resampler = PolyphaseResampler(rate)
+    block = block or len(audio)
+    parts = [resampler.process(audio[i:i + block]) for i in range(0, len(audio), block)]
+    return np.concatenate(parts + [resampler.flush()])
+
+
+class PolyphaseResamplerTest(unittest.TestCase):
+    
+    def test_passband_tones_match_the_analytic_signal(self):
+        for rate in (8000, 22050, 44100, 48000):
+            for frequency in (440.0, 1000.0, 3000.0):
+                output = resample(tone(frequency, rate), rate)
+                expected = tone(frequency, SAMPLE_RATE)
+                error = np.abs(output[EDGE:-EDGE] - expected[EDGE:-EDGE]).max()
+                self.assertLess(error, 1e-4, (rate, frequency))
+    
+    def test_content_above_8khz_is_removed(self):
+        for rate in (22050, 44100, 48000):
+            output = resample(tone(10000.0, rate), rate)
+            self.assertLess(np.sqrt(np.mean(output[EDGE:-EDGE] ** 2)), 1e-4, rate)
+    
+    def test_output_length(self):
+        for rate, frames in [(44100, 44100 * 3 + 17), (48000, 480), (22050, 1), (8000, 12345)]:
+            output = resample(np.zeros(frames, dtype=np.float32), rate)
+            self.assertEqual(len(output), -(-frames * SAMPLE_RATE // rate), rate)
+    
+    def test_block_size_does_not_change_the_output(self):
+        audio = np.random.default_rng(0).standard_normal(44100 * 2).astype(np.float32)
+        whole = resample(audio, 44100)
+        for block in (1000, 4096, 44099):
+            np.testing.assert_allclose(resample(audio, 44100, block), whole, atol=1e-6)
+
+
+class DecodeInProcessTest(unittest.TestCase):
+    
+    def test_stereo_wav_is_downmixed_and_resampled(self):
+        left, right = tone(440.0, 44100, 3.0), tone(1000.0, 44100, 3.0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / 'stereo.wav')
+            sf.write(path, np.stack([left, right], axis=1) * 0.5, 44100, subtype='FLOAT')
+            audio = decode_in_process(path)
+        
+        expected = 0.25 * (tone(440.0, SAMPLE_RATE, 3.0) + tone(1000.0, SAMPLE_RATE, 3.0))
+        self.assertEqual(audio.dtype, np.float32)
+        self.assertEqual(len(audio), 3 * SAMPLE_RATE)
+        self.assertLess(np.abs(audio[EDGE:-EDGE] - expected[EDGE:-EDGE]).max(), 1e-4)
+    
+    def test_16khz_mono_is_read_unchanged(self):
+        audio = np.random.default_rng(1).uniform(-0.5, 0.5, SAMPLE_RATE).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / 'mono.wav')
+            sf.write(path, audio, SAMPLE_RATE, subtype='FLOAT')
+            np.testing.assert_array_equal(decode_in_process(path), audio)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Fingerprint matching of re-encoded and partially overlapping recordings, and
+the de-duplication plan that reuses the matched transcript
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from audio_fingerprint import SAMPLE_RATE, FingerprintIndex, fingerprint
+
+
+def tone_bursts(seconds: float, seed: int) -> np.ndarray:
+    """Chords of random pitch changing every 0.1 s: distinctive spectral peaks"""
+    rng = np.random.default_rng(seed)
+    burst = SAMPLE_RATE // 10
+    t = np.arange(burst) / SAMPLE_RATE
+    return np.concatenate([
+        sum(np.sin(2 * np.pi * f * t) for f in rng.uniform(200, 4000, 3)) * rng.uniform(0.05, 0.2)
+        for _ in range(int(seconds * 10))
+    ]).astype(np.float32)
+
+
+def reencode(audio: np.ndarray, seed: int = 1) -> np.ndarray:
+    """Lossy-copy stand-in: gain change and added noise"""
+    noise = np.random.default_rng(seed).normal(0, 0.005, len(audio))
+    return (0.8 * audio + noise).astype(np.float32)
+
+
+class FingerprintMatchTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = FingerprintIndex(str(Path(self.tmp.name) / 'fingerprints.db'))
+        self.addCleanup(self.index.close)
+        self.original = tone_bursts(60.0, seed=0)
+        self.index.add('original', *fingerprint(self.original), 60.0)
+        self.index.add('other', *fingerprint(tone_bursts(60.0, seed=7)), 60.0)
+    
+    def test_reencoded_copy_matches_at_zero_offset(self):
+        matches = self.index.match(*fingerprint(reencode(self.original)), min_matches=50)
+        
+        self.assertEqual([match.file_id for match in matches], ['original'])
+        self.assertAlmostEqual(matches[0].offset, 0.0, delta=0.04)
+        self.assertGreater(matches[0].coverage, 0.9)
+        self.assertGreater(matches[0].density, 0.2)
+    
+    def test_excerpt_matches_with_its_offset(self):
+        excerpt = reencode(self.original[15 * SAMPLE_RATE:45 * SAMPLE_RATE])
+        matches = self.index.match(*fingerprint(excerpt), min_matches=50)
+        
+        self.assertEqual(matches[0].file_id, 'original')
+        # stored_time = query_time + offset
+        self.assertAlmostEqual(matches[0].offset, 15.0, delta=0.04)
+    
+    def test_unrelated_and_excluded_recordings_do_not_match(self):
+        self.assertEqual(self.index.match(*fingerprint(tone_bursts(30.0, seed=3)), min_matches=50), [])
+        self.assertEqual(self.index.match(*fingerprint(self.original), min_matches=50, exclude_file_id='original'), [])
+    
+    def test_remove(self):
+        self.index.remove('original')
+        self.assertEqual(self.index.match(*fingerprint(self.original), min_matches=50), [])
+
+
+class PlanDeduplicationTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.fingerprint_index = FingerprintIndex(str(Path(self.tmp.name) / 'fingerprints.db'))
+        self.addCleanup(worker.fingerprint_index.close)
+        worker.pending_fingerprints = {}
+        worker.dedup_min_matches = 50
+        worker.dedup_min_density = 0.05
+        self.worker = worker
+        
+        self.original = tone_bursts(60.0, seed=0)
+        worker.fingerprint_index.add('original', *fingerprint(self.original), 60.0)
+        self.transcript = {"segments": [
+            {"start": float(start), "end": float(start + 4), "text": f"補正{start}", "original_text": f"asr{start}"}
+            for start in range(0, 60, 5)
+        ]}
+        worker._load_stored_transcript = mock.Mock(return_value=self.transcript)
+    
+    def test_new_intro_before_a_copied_tail(self):
+        # 10 s of new audio, then the last 40 s of the stored recording
+        audio = np.concatenate([tone_bursts(10.0, seed=5), reencode(self.original[20 * SAMPLE_RATE:])])
+        plan = self.worker._plan_deduplication('upload', audio, len(audio) / SAMPLE_RATE)
+        
+        self.assertIsNotNone(plan)
+        self.worker._load_stored_transcript.assert_called_once_with('original')
+        self.assertAlmostEqual(plan["stats"]["offset"], 10.0, delta=0.04)
+        # Stored segments from 20 s on, shifted into this recording's time, with the ASR text
+        reused = plan["reused_segments"]
+        self.assertEqual([seg["text"] for seg in reused], [f"asr{start}" for start in range(20, 60, 5)])
+        self.assertAlmostEqual(reused[0]["start"], 10.0, delta=0.04)
+        self.assertAlmostEqual(reused[-1]["end"], 49.0, delta=0.04)
+        # Only the new intro needs ASR (the 1 s after the last segment is too short)
+        self.assertEqual(len(plan["asr_regions"]), 1)
+        self.assertEqual(plan["asr_regions"][0][0], 0.0)
+        self.assertAlmostEqual(plan["asr_regions"][0][1], 10.0, delta=0.04)
+        self.assertIn('upload', self.worker.pending_fingerprints)
+    
+    def test_no_match_means_no_plan(self):
+        audio = tone_bursts(30.0, seed=9)
+        self.assertIsNone(self.worker._plan_deduplication('upload', audio, 30.0))
+        self.worker._load_stored_transcript.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
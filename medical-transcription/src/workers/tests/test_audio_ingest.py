@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Canonical 16 kHz mono copy of uploads: codec settings, encoding, the download
+that prefers the copy (403/404 fall back to the upload) and storing the copy
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import io
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import soundfile as sf
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from audio_ingest import IngestStats, canonical_codec, canonical_key, encode_canonical
+
+
+def client_error(status: int, code: str, operation: str = 'GetObject') -> ClientError:
+    return ClientError({'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}, operation)
+
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * 16000)) / 16000
+    return (0.3 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+
+
+class CanonicalAudioTest(unittest.TestCase):
+    
+    def test_codec_setting(self):
+        with mock.patch.dict(os.environ, {'CANONICAL_AUDIO_CODEC': 'FLAC'}):
+            self.assertEqual(canonical_codec(), 'flac')
+        with mock.patch.dict(os.environ, {'CANONICAL_AUDIO_CODEC': 'off'}):
+            self.assertIsNone(canonical_codec())
+        with mock.patch.dict(os.environ, {'CANONICAL_AUDIO_CODEC': 'mp3'}):
+            with self.assertRaises(ValueError):
+                canonical_codec()
+        self.assertEqual(canonical_key('uploads/a.wav', 'opus'), 'uploads/a.wav.canonical.ogg')
+    
+    def test_encoded_copy_is_16k_mono(self):
+        audio = tone(2.0)
+        for codec in ('flac', 'opus'):
+            decoded, rate = sf.read(io.BytesIO(encode_canonical(audio, codec)), dtype='float32')
+            self.assertEqual((rate, decoded.ndim), (16000, 1), codec)
+            self.assertAlmostEqual(len(decoded) / rate, 2.0, delta=0.05)
+        # Lossless copy, 16-bit
+        decoded, _ = sf.read(io.BytesIO(encode_canonical(audio, 'flac')), dtype='float32')
+        self.assertLess(np.max(np.abs(decoded - audio)), 1e-4)
+    
+    def test_stats_report_the_saving(self):
+        stats = IngestStats('canonical', 'opus', 1000, 50_000, 0.1).to_dict()
+        self.assertEqual(stats['bytes_saved_ratio'], 50.0)
+        self.assertNotIn('bytes_saved_ratio', IngestStats('original', 'opus', 1000, None, 0.1).to_dict())
+
+
+class IngestPathTest(unittest.TestCase):
+    
+    def setUp(self):
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.s3_client = mock.Mock()
+        worker.s3_bucket = 'bucket'
+        worker.canonical_codec = 'opus'
+        self.worker = worker
+        self.s3 = worker.s3_client
+        self.s3.download_file.side_effect = lambda bucket, key, path: Path(path).write_bytes(b'x' * 5000)
+    
+    def download(self):
+        audio_path, stats = self.worker._download_audio('uploads/a.wav')
+        self.addCleanup(os.unlink, audio_path)
+        return audio_path, stats
+    
+    def test_canonical_copy_is_used_when_present(self):
+        self.s3.get_object.return_value = {'Body': io.BytesIO(b'c' * 100), 'Metadata': {'original-bytes': '5000'}}
+        
+        audio_path, stats = self.download()
+        
+        self.s3.get_object.assert_called_once_with(Bucket='bucket', Key='uploads/a.wav.canonical.ogg')
+        self.s3.download_file.assert_not_called()
+        self.assertTrue(audio_path.endswith('.ogg'))
+        self.assertEqual((stats.source, stats.bytes, stats.original_bytes), ('canonical', 100, 5000))
+    
+    def test_missing_copy_falls_back_to_the_upload(self):
+        # Without s3:ListBucket a missing key is a 403 rather than a 404
+        for error in (client_error(404, 'NoSuchKey'), client_error(403, 'AccessDenied')):
+            self.s3.reset_mock()
+            self.s3.get_object.side_effect = error
+            audio_path, stats = self.download()
+            self.s3.download_file.assert_called_once_with('bucket', 'uploads/a.wav', audio_path)
+            self.assertEqual((stats.source, stats.bytes, stats.original_bytes), ('original', 5000, 5000))
+    
+    def test_other_errors_are_raised(self):
+        self.s3.get_object.side_effect = client_error(500, 'InternalError')
+        with self.assertRaises(ClientError):
+            self.worker._download_audio('uploads/a.wav')
+        self.s3.download_file.assert_not_called()
+    
+    def test_disabled_copy_skips_the_lookup(self):
+        self.worker.canonical_codec = None
+        _, stats = self.download()
+        self.s3.get_object.assert_not_called()
+        self.assertEqual(stats.source, 'original')
+    
+    def test_store_canonical(self):
+        seconds = self.worker._store_canonical('uploads/a.wav', tone(1.0), 5000)
+        
+        self.assertIsNotNone(seconds)
+        kwargs = self.s3.put_object.call_args.kwargs
+        self.assertEqual(kwargs['Key'], 'uploads/a.wav.canonical.ogg')
+        self.assertEqual(kwargs['Metadata'], {'original-bytes': '5000', 'source-key': 'uploads/a.wav'})
+        self.s3.head_object.assert_called_once_with(Bucket='bucket', Key='uploads/a.wav')
+        self.s3.delete_object.assert_not_called()
+    
+    def test_copy_of_a_deleted_upload_is_removed(self):
+        self.s3.head_object.side_effect = client_error(404, '404', 'HeadObject')
+        self.worker._store_canonical('uploads/a.wav', tone(1.0), 5000)
+        self.s3.delete_object.assert_called_once_with(Bucket='bucket', Key='uploads/a.wav.canonical.ogg')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Energy VAD relative to the recording's noise floor and silence-aligned windowing
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audio_segmentation import SAMPLE_RATE, detect_voice_activity, frame_energy, split_audio
+
+
+def recording(seconds: float, speech, speech_level: float, noise_level: float) -> np.ndarray:
+    """Room noise with a 200 Hz tone at speech_level in the (start, end) speech spans"""
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0.0, noise_level, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    t = np.arange(len(audio)) / SAMPLE_RATE
+    for start, end in speech:
+        span = slice(int(start * SAMPLE_RATE), int(end * SAMPLE_RATE))
+        audio[span] += (speech_level * np.sin(2 * np.pi * 200.0 * t[span])).astype(np.float32)
+    return audio
+
+
+def voiced_seconds(audio: np.ndarray, frame_ms: int = 30) -> float:
+    return float(detect_voice_activity(frame_energy(audio, frame_ms)).sum()) * frame_ms / 1000
+
+
+class VoiceActivityTest(unittest.TestCase):
+    
+    def test_low_gain_speech_is_voiced(self):
+        # A recorder far from the speakers: speech around -70 dBFS, far below a fixed 1e-3 threshold
+        audio = recording(12.0, [(2.0, 5.0), (7.0, 10.0)], speech_level=4e-4, noise_level=1e-5)
+        self.assertAlmostEqual(voiced_seconds(audio), 6.0, delta=0.1)
+        
+        windows = split_audio(audio)
+        self.assertEqual(len(windows), 1)
+        self.assertAlmostEqual(windows[0].start_time, 1.8, delta=0.05)
+        self.assertAlmostEqual(windows[0].end_time, 10.2, delta=0.05)
+    
+    def test_threshold_follows_the_gain(self):
+        quiet = recording(12.0, [(2.0, 5.0), (7.0, 10.0)], speech_level=4e-4, noise_level=1e-5)
+        np.testing.assert_array_equal(
+            detect_voice_activity(frame_energy(quiet)),
+            detect_voice_activity(frame_energy(quiet * 500))
+        )
+    
+    def test_digital_silence_has_no_windows(self):
+        self.assertEqual(voiced_seconds(np.zeros(5 * SAMPLE_RATE, dtype=np.float32)), 0.0)
+        self.assertEqual(split_audio(np.zeros(5 * SAMPLE_RATE, dtype=np.float32)), [])
+
+
+class SplitAudioTest(unittest.TestCase):
+    
+    def test_windows_cut_in_pauses(self):
+        speech = [(0.0, 8.5), (9.5, 18.5), (19.5, 24.0)]
+        audio = recording(30.0, speech, speech_level=0.1, noise_level=1e-3)
+        windows = split_audio(audio, window_seconds=10.0, search_seconds=3.0)
+        
+        self.assertEqual([window.index for window in windows], list(range(len(windows))))
+        self.assertEqual(len(windows), 3)
+        for previous, window in zip(windows, windows[1:]):
+            self.assertLessEqual(previous.end, window.start)
+            # Every cut lies inside one of the pauses
+            self.assertTrue(8.5 <= window.start_time <= 9.5 or 18.5 <= window.start_time <= 19.5, window)
+        # All speech is covered; the silent tail after 24 s is dropped
+        self.assertLessEqual(windows[0].start_time, 0.0)
+        self.assertAlmostEqual(windows[-1].end_time, 24.2, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
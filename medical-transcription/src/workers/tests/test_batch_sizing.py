@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Out-of-memory backoff and batch-size learning under a simulated memory limit
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_sizing import BatchProfile, BatchSizer, SAFETY_FRACTION, is_out_of_memory
+
+PER_ITEM_MB = 350  # large-v2 float16
+
+
+def free_memory_for(batch_size: int):
+    """Free-memory probe whose estimate is exactly batch_size items"""
+    return lambda: batch_size * PER_ITEM_MB / SAFETY_FRACTION
+
+
+class MemoryLimit:
+    """Stand-in transcribe call that runs out of memory above a batch size"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.calls = []
+    
+    def __call__(self, batch_size: int) -> int:
+        self.calls.append(batch_size)
+        if batch_size > self.limit:
+            raise RuntimeError("CUDA failed with error out of memory")
+        return batch_size
+
+
+class BatchSizingTest(unittest.TestCase):
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "batch_profile.json"
+        patcher = mock.patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in ('WORKER_BATCH_SIZE', 'WORKER_MAX_BATCH_SIZE', 'WORKER_SIMULATED_MEMORY_MB'):
+            os.environ.pop(name, None)
+    
+    def sizer(self, free_items: int, profile=None) -> BatchSizer:
+        return BatchSizer(
+            'large-v2', 'cuda', 'float16',
+            profile=profile or BatchProfile(str(self.path)),
+            free_memory_mb=free_memory_for(free_items)
+        )
+    
+    def test_oom_halves_until_it_fits(self):
+        sizer = self.sizer(64)
+        limit = MemoryLimit(12)
+        
+        self.assertEqual(sizer.run(limit), 8)
+        self.assertEqual(limit.calls, [64, 32, 16, 8])
+        self.assertEqual(sizer.profile.get(sizer.key)['max_ok'], 8)
+        self.assertEqual(sizer.profile.get(sizer.key)['min_failed'], 16)
+        # Converged: the next call goes straight to the size that fits
+        self.assertEqual(sizer.choose(), 8)
+    
+    def test_oom_at_batch_size_one_is_raised(self):
+        with self.assertRaises(RuntimeError):
+            self.sizer(4).run(MemoryLimit(0))
+    
+    def test_other_errors_are_not_retried(self):
+        limit = MemoryLimit(64)
+        
+        def fail(batch_size):
+            limit(batch_size)
+            raise ValueError("bad audio")
+        
+        with self.assertRaises(ValueError):
+            self.sizer(16).run(fail)
+        self.assertEqual(limit.calls, [16])
+    
+    def test_learned_size_survives_restart(self):
+        self.sizer(64).run(MemoryLimit(12))
+        
+        # A new process with a pessimistic estimate starts from what worked
+        sizer = self.sizer(2, profile=BatchProfile(str(self.path)))
+        self.assertEqual(sizer.choose(), 8)
+    
+    def test_probes_up_towards_smallest_failure(self):
+        profile = BatchProfile(str(self.path))
+        sizer = self.sizer(2, profile=profile)
+        profile.record(sizer.key, 4, ok=True)
+        profile.record(sizer.key, 32, ok=False)
+        limit = MemoryLimit(12)
+        
+        self.assertEqual(sizer.run(limit), 8)
+        self.assertEqual(sizer.run(limit), 8)  # probed 16, backed off
+        self.assertEqual(limit.calls, [8, 16, 8])
+        self.assertEqual(sizer.choose(), 8)
+        self.assertEqual(sizer.run(limit), 8)
+        self.assertEqual(limit.calls[-1], 8)
+    
+    def test_profile_written_only_on_change(self):
+        sizer = self.sizer(8)
+        with mock.patch.object(BatchProfile, '_save_locked') as save:
+            for _ in range(5):
+                sizer.run(MemoryLimit(64))
+        self.assertEqual(save.call_count, 1)
+    
+    def test_simulated_memory_limit(self):
+        # Weights 4700 MB + 4 items of 350 MB fit in 6200 MB, 8 do not
+        os.environ['WORKER_SIMULATED_MEMORY_MB'] = '6200'
+        sizer = self.sizer(64)
+        self.assertEqual(sizer.choose(), 2)
+        
+        # Memory shrank since 16 worked: the simulated allocation fails and backs off
+        sizer.profile.record(sizer.key, 16, ok=True)
+        with self.assertRaises(MemoryError) as caught:
+            sizer._check_simulated_limit(8)
+        self.assertTrue(is_out_of_memory(caught.exception))
+        self.assertEqual(sizer.run(lambda batch_size: batch_size), 4)
+        self.assertEqual(sizer.profile.get(sizer.key)['min_failed'], 8)
+        self.assertEqual(sizer.choose(), 4)
+
+
+class CpuBatchSizingTest(unittest.TestCase):
+    
+    def test_cpu_batches_are_capped_lower(self):
+        with mock.patch.dict(os.environ):
+            for name in ('WORKER_BATCH_SIZE', 'WORKER_MAX_BATCH_SIZE', 'WORKER_SIMULATED_MEMORY_MB'):
+                os.environ.pop(name, None)
+            plenty = lambda: 10**6
+            self.assertEqual(BatchSizer('large-v2', 'cpu', 'int8', free_memory_mb=plenty).choose(), 8)
+            self.assertEqual(BatchSizer('large-v2', 'cuda', 'float16', free_memory_mb=plenty).choose(), 64)
+            os.environ['WORKER_MAX_BATCH_SIZE'] = '16'
+            self.assertEqual(BatchSizer('large-v2', 'cpu', 'int8', free_memory_mb=plenty).choose(), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Length-bucketed alignment batches and equality of batched alignment with
+one sequential whisperx.align call
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import os
+import sys
+import json
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batched_alignment import (
+    BUCKET_RATIO, BatchedAligner, default_workers, plan_batches, _synthetic_align, _synthetic_segments
+)
+
+
+class PlanBatchesTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.segments = _synthetic_segments(200)
+    
+    def test_every_segment_once_in_time_order(self):
+        batches = plan_batches(self.segments, batch_seconds=60.0)
+        indices = [index for batch in batches for index in batch]
+        
+        self.assertEqual(sorted(indices), list(range(len(self.segments))))
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch))
+    
+    def test_batches_are_length_bucketed_and_longest_first(self):
+        batches = plan_batches(self.segments, batch_seconds=60.0)
+        durations = [[self.segments[i]['end'] - self.segments[i]['start'] for i in batch] for batch in batches]
+        totals = [sum(batch) for batch in durations]
+        
+        self.assertEqual(totals, sorted(totals, reverse=True))
+        for batch in durations:
+            self.assertLess(max(batch) / min(batch), BUCKET_RATIO)
+            if len(batch) > 1:
+                self.assertLessEqual(sum(batch), 60.0)
+    
+    def test_segment_longer_than_a_batch_is_its_own_batch(self):
+        segments = [{'start': 0.0, 'end': 90.0}, {'start': 91.0, 'end': 92.0}]
+        self.assertEqual(plan_batches(segments, batch_seconds=60.0), [[0], [1]])
+
+
+class BatchedAlignerTest(unittest.TestCase):
+    
+    def test_equals_sequential_alignment(self):
+        segments = _synthetic_segments(24, seed=3)
+        reference = _synthetic_align(segments)
+        
+        for workers in (1, 4):
+            result = BatchedAligner(_synthetic_align, workers=workers, batch_seconds=10.0).align(segments)
+            self.assertEqual(json.dumps(result, sort_keys=True), json.dumps(reference, sort_keys=True))
+    
+    def test_cancellation_stops_the_batches(self):
+        calls = []
+        
+        def check_cancelled():
+            if len(calls) >= 3:
+                raise RuntimeError("cancelled")
+        
+        def align_fn(group):
+            calls.append(group)
+            return {'segments': group, 'word_segments': []}
+        
+        aligner = BatchedAligner(align_fn, workers=2, batch_seconds=5.0)
+        with self.assertRaises(RuntimeError):
+            aligner.align(_synthetic_segments(50), check_cancelled=check_cancelled)
+        self.assertLess(len(calls), 50)
+    
+    def test_one_thread_on_cpu(self):
+        with mock.patch.dict(os.environ, {'ALIGN_WORKERS': '0'}):
+            self.assertEqual(default_workers('cpu'), 1)
+            self.assertGreaterEqual(default_workers('cuda'), 1)
+        with mock.patch.dict(os.environ, {'ALIGN_WORKERS': '3'}):
+            self.assertEqual(default_workers('cpu'), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
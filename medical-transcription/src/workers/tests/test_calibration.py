@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Calibration picks the most accurate candidate meeting the RTF target, using
+the --simulate cost model on a fake clock
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import time
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import calibration
+import transcription_worker
+from calibration import (
+    COMPUTE_TYPE_ORDER, SAMPLE_RATE, calibrate, candidate_models, load_reference_clip, _simulated_load_model
+)
+
+CLIP = np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+
+class SimulatedCalibrationTest(unittest.TestCase):
+    
+    def setUp(self):
+        # "Transcribing" advances the clock by the candidate's RTF x clip length
+        self.clock = 0.0
+        patcher = mock.patch.object(calibration.time, 'perf_counter', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def transcribe(self, rtf, clip):
+        self.clock += rtf * len(clip) / SAMPLE_RATE
+    
+    def run_calibration(self, device, target_rtf, exhaustive=False):
+        return calibrate(
+            _simulated_load_model(device), self.transcribe, CLIP, device, target_rtf,
+            models=candidate_models('ja'), compute_types=COMPUTE_TYPE_ORDER[device], exhaustive=exhaustive
+        )
+    
+    def tried(self, entry):
+        return [(result['model_size'], result['compute_type']) for result in entry['results']]
+    
+    def test_cpu_keeps_the_model_and_drops_precision(self):
+        entry = self.run_calibration('cpu', 1.0)
+        
+        self.assertEqual((entry['model_size'], entry['compute_type']), ('large-v3', 'int8'))
+        self.assertAlmostEqual(entry['rtf'], 0.96)
+        self.assertTrue(entry['meets_target'])
+        self.assertEqual(self.tried(entry), [('large-v3', 'float32'), ('large-v3', 'int8')])
+    
+    def test_tighter_target_falls_back_to_the_japanese_distillation(self):
+        entry = self.run_calibration('cpu', 0.5)
+        self.assertEqual((entry['model_size'], entry['compute_type']),
+                         ('kotoba-tech/kotoba-whisper-v2.0-faster', 'int8'))
+    
+    def test_failed_tier_skips_same_accuracy_compute_types(self):
+        entry = self.run_calibration('cuda', 0.1)
+        
+        # float16 misses the target, so float32 (same tier) is not loaded
+        self.assertEqual(self.tried(entry)[:3], [
+            ('large-v3', 'float16'), ('large-v3', 'int8_float16'), ('large-v3', 'int8')
+        ])
+        self.assertEqual((entry['model_size'], entry['compute_type']), ('large-v3', 'int8'))
+    
+    def test_exhaustive_records_load_failures(self):
+        entry = self.run_calibration('cuda', 1.0, exhaustive=True)
+        errors = {(r['model_size'], r['compute_type']): r['error'] for r in entry['results'] if r['error']}
+        
+        self.assertIn(('large-v3', 'float32'), errors)
+        self.assertIn('out of memory', errors[('large-v3', 'float32')])
+        self.assertEqual((entry['model_size'], entry['compute_type']), ('large-v3', 'float16'))
+    
+    def test_no_candidate_meets_target_uses_fastest(self):
+        entry = self.run_calibration('cpu', 0.01)
+        
+        self.assertFalse(entry['meets_target'])
+        self.assertEqual((entry['model_size'], entry['compute_type']), ('tiny', 'int8'))
+
+
+class ReferenceClipTest(unittest.TestCase):
+    
+    def test_clip_is_required(self):
+        for path in (None, ''):
+            with self.assertRaises(ValueError):
+                load_reference_clip(path)
+
+
+class StartupOrderTest(unittest.TestCase):
+    
+    def test_calibration_runs_before_model_preloads(self):
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.auto_model = True
+        worker.startup_phases = {}
+        events, lock = [], threading.Lock()
+        
+        def phase(name, seconds=0.0):
+            def run(*args):
+                with lock:
+                    events.append(f"{name} start")
+                time.sleep(seconds)
+                with lock:
+                    events.append(f"{name} end")
+            return run
+        
+        for name in ('_init_device', '_init_redis', '_init_s3', '_init_dictionary', '_init_search_index',
+                     '_preload_whisper_models', '_load_align_model', '_preload_diarization'):
+            setattr(worker, name, phase(name))
+        worker._calibrate_model = phase('calibrate', 0.1)
+        with mock.patch.dict('os.environ', {'WORKER_PARALLEL_INIT': '1', 'WORKER_PRELOAD_MODELS': '1'}):
+            worker._startup()
+        
+        calibrated = events.index('calibrate end')
+        self.assertLess(events.index('_init_device end'), events.index('calibrate start'))
+        for name in ('_preload_whisper_models', '_load_align_model', '_preload_diarization'):
+            self.assertGreater(events.index(f"{name} start"), calibrated)
+        self.assertIn('calibration', worker.startup_phases)
+
+
+if __name__ == "__main__":
+    unittest.main()
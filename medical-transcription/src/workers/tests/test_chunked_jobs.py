@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Chunk planning, speaker reconciliation and merging of split recordings, and
+re-publication of chunk tasks lost with their worker
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import json
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import fakeredis
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from chunked_jobs import (
+    ChunkPlan, plan_chunks, shift_result, reconcile_speakers, merge_chunk_results, overdue_tasks
+)
+
+SAMPLE_RATE = 16000
+
+
+def speech_with_pauses(seconds: float, pause_every: float, pause_seconds: float = 0.5) -> np.ndarray:
+    """Noise with a silent gap every pause_every seconds"""
+    audio = np.random.default_rng(0).normal(0, 0.1, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    for start in np.arange(pause_every, seconds, pause_every):
+        audio[int(start * SAMPLE_RATE):int((start + pause_seconds) * SAMPLE_RATE)] = 0.0
+    return audio
+
+
+def chunk_result(plan: ChunkPlan, turns, embeddings=None):
+    """Chunk result with one segment per (start, end, local speaker) turn inside the chunk"""
+    segments = [
+        {"start": start, "end": end, "text": f"{speaker}@{start:.0f}", "speaker": speaker,
+         "words": [{"word": "w", "start": start, "end": end, "speaker": speaker}]}
+        for start, end, speaker in turns if plan.start <= start and end <= plan.end
+    ]
+    result = dict(plan.to_dict(), segments=segments, language="ja")
+    if embeddings is not None:
+        result["speaker_embeddings"] = embeddings
+    return result
+
+
+class PlanChunksTest(unittest.TestCase):
+    
+    def test_cuts_at_silence_and_tiles_the_recording(self):
+        audio = speech_with_pauses(300.0, pause_every=55.0)
+        plans = plan_chunks(audio, chunk_seconds=60.0, overlap_seconds=2.0, search_seconds=10.0)
+        
+        self.assertEqual(len(plans), 6)
+        self.assertEqual(plans[0].keep_start, 0.0)
+        self.assertIsNone(plans[-1].keep_end)
+        for previous, plan in zip(plans, plans[1:]):
+            self.assertEqual(previous.keep_end, plan.keep_start)
+            # Cut inside a pause, widened by the overlap on both sides
+            self.assertLess(abs(plan.keep_start - 55.0 * round(plan.keep_start / 55.0)), 0.6)
+            self.assertAlmostEqual(plan.start, plan.keep_start - 2.0)
+            self.assertAlmostEqual(previous.end, plan.keep_start + 2.0)
+        self.assertAlmostEqual(plans[-1].end, 300.0)
+    
+    def test_short_recording_is_one_chunk(self):
+        plans = plan_chunks(speech_with_pauses(70.0, pause_every=30.0), chunk_seconds=60.0)
+        self.assertEqual([(plan.start, plan.keep_end) for plan in plans], [(0.0, None)])
+    
+    def test_shift_result(self):
+        result = {"segments": [{"start": 1.0, "end": 2.0, "words": [{"word": "a", "start": 1.0, "end": 2.0}]}]}
+        shift_result(result, 100.0)
+        self.assertEqual(result["segments"][0]["start"], 101.0)
+        self.assertEqual(result["word_segments"], [{"word": "a", "start": 101.0, "end": 102.0}])
+
+
+class MergeTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.plans = [
+            ChunkPlan(0, 0.0, 65.0, 0.0, 60.0),
+            ChunkPlan(1, 55.0, 120.0, 60.0, None),
+        ]
+        # Doctor and patient alternate; the second chunk numbers them the other way round
+        self.turns = [
+            [(0.0, 20.0, "SPEAKER_00"), (20.0, 40.0, "SPEAKER_01"), (40.0, 62.0, "SPEAKER_00"),
+             (62.0, 65.0, "SPEAKER_01")],
+            [(56.0, 62.0, "SPEAKER_01"), (62.0, 90.0, "SPEAKER_00"), (90.0, 120.0, "SPEAKER_01")],
+        ]
+    
+    def test_embeddings_match_speakers_across_chunks(self):
+        doctor, patient = [1.0, 0.0, 0.1], [0.0, 1.0, 0.1]
+        chunks = [
+            chunk_result(self.plans[0], self.turns[0], {"SPEAKER_00": doctor, "SPEAKER_01": patient}),
+            chunk_result(self.plans[1], self.turns[1], {"SPEAKER_00": patient, "SPEAKER_01": doctor}),
+        ]
+        mappings, method = reconcile_speakers(chunks)
+        
+        self.assertEqual(method, "embedding")
+        self.assertEqual(mappings[1], {"SPEAKER_00": "SPEAKER_01", "SPEAKER_01": "SPEAKER_00"})
+    
+    def test_overlap_vote_without_embeddings(self):
+        chunks = [chunk_result(plan, turns) for plan, turns in zip(self.plans, self.turns)]
+        mappings, method = reconcile_speakers(chunks)
+        
+        self.assertEqual(method, "overlap")
+        self.assertEqual(mappings[1], {"SPEAKER_00": "SPEAKER_01", "SPEAKER_01": "SPEAKER_00"})
+    
+    def test_merge_keeps_each_segment_once(self):
+        chunks = [chunk_result(plan, turns) for plan, turns in zip(self.plans, self.turns)]
+        merged = merge_chunk_results(chunks)
+        
+        # Turns in the shared audio belong to the chunk that keeps their midpoint
+        self.assertEqual(
+            [(seg["start"], seg["speaker"]) for seg in merged["segments"]],
+            [(0.0, "SPEAKER_00"), (20.0, "SPEAKER_01"), (40.0, "SPEAKER_00"),
+             (62.0, "SPEAKER_01"), (90.0, "SPEAKER_00")]
+        )
+        self.assertEqual(len(merged["word_segments"]), 5)
+        self.assertEqual(merged["chunks"]["speakers"], 2)
+    
+    def test_segment_crossing_the_cut_is_split_at_words(self):
+        def crossing(start, end, words):
+            return {"start": start, "end": end, "text": "".join(word for word, _, _ in words), "speaker": "SPEAKER_00",
+                    "words": [{"word": word, "start": s, "end": e, "speaker": "SPEAKER_00"} for word, s, e in words]}
+        
+        # The same utterance seen by both chunks, timed a little differently: neither midpoint is kept
+        chunks = [
+            dict(self.plans[0].to_dict(), language="ja", segments=[
+                crossing(57.0, 63.0, [("心", 57.0, 58.5), ("筋", 58.5, 59.8), ("梗", 59.8, 60.4), ("塞", 60.4, 63.0)]),
+            ]),
+            dict(self.plans[1].to_dict(), language="ja", segments=[
+                crossing(56.5, 63.3, [("心", 56.5, 58.4), ("筋", 58.4, 59.7), ("梗", 59.7, 60.5), ("塞", 60.5, 63.3)]),
+            ]),
+        ]
+        merged = merge_chunk_results(chunks)
+        
+        self.assertEqual(
+            [(seg["start"], seg["end"], seg["text"]) for seg in merged["segments"]],
+            [(57.0, 59.8, "心筋"), (59.7, 63.3, "梗塞")]
+        )
+        self.assertEqual("".join(word["word"] for word in merged["word_segments"]), "心筋梗塞")
+
+
+class OverdueTasksTest(unittest.TestCase):
+    
+    def test_reasons(self):
+        now = 1000.0
+        started = {"000": 990.0, "001": 990.0, "002": 100.0, "003": 100.0, "004": 990.0}
+        claims = {"000": "dead", "001": "alive", "002": "alive", "003": None, "004": None}
+        
+        self.assertEqual(
+            overdue_tasks(started, claims, {"alive"}, now, deadline_seconds=60.0),
+            {"000": "worker_lost", "002": "deadline", "003": "unclaimed"}
+        )
+
+
+class ChunkSweepTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.redis_client = self.redis
+        worker.worker_id = 'sweeper'
+        worker.heartbeat_interval = 1.0
+        worker.chunk_deadline_seconds = 60.0
+        worker.chunk_max_attempts = 2
+        worker.s3_client = mock.Mock()
+        worker.s3_bucket = 'bucket'
+        worker._publish_error = mock.Mock()
+        self.worker = worker
+        
+        self.pubsub = self.redis.pubsub()
+        self.pubsub.subscribe('job:new')
+        self.pubsub.get_message(timeout=1)
+        self.redis.sadd('chunked_jobs', 'job-1')
+        for index in range(3):
+            worker._publish_task('job-1', f"{index:03d}", {
+                'jobId': f"job-1:chunk:{index:03d}", 'task': 'chunk', 'parentJobId': 'job-1', 'chunkCount': 3,
+            })
+        self.published()
+    
+    def published(self):
+        jobs = []
+        while (message := self.pubsub.get_message(timeout=0.05)) is not None:
+            jobs.append(json.loads(message['data'])['jobId'])
+        return jobs
+    
+    def sweep(self):
+        self.redis.delete('chunked_jobs:sweep')
+        self.worker._sweep_chunk_tasks()
+        return self.published()
+    
+    def test_republishes_task_of_lost_worker(self):
+        self.redis.set('job:job-1:chunk:000:claim', 'dead-worker')
+        self.redis.set('job:job-1:chunk:001:claim', 'live-worker')
+        self.redis.set('worker:live-worker:heartbeat', '{}')
+        
+        self.assertEqual(self.sweep(), ['job-1:chunk:000'])
+        self.assertIsNone(self.redis.get('job:job-1:chunk:000:claim'))
+        self.assertEqual(self.sweep(), [])
+    
+    def test_unclaimed_task_is_republished_without_counting(self):
+        self.redis.hset('job:job-1:task_times', '002', time.time() - 120)
+        
+        self.assertEqual(self.sweep(), ['job-1:chunk:002'])
+        self.assertIsNone(self.redis.hget('job:job-1:task_attempts', '002'))
+    
+    def test_finished_chunks_are_left_alone(self):
+        self.redis.set('job:job-1:chunk:000:claim', 'dead-worker')
+        self.redis.sadd('job:job-1:chunks_done', '000')
+        self.assertEqual(self.sweep(), [])
+    
+    def test_fails_job_after_max_attempts(self):
+        self.redis.set('job:job-1:chunk:000:claim', 'dead-worker')
+        self.assertEqual(self.sweep(), ['job-1:chunk:000'])
+        self.redis.set('job:job-1:chunk:000:claim', 'another-dead-worker')
+        
+        self.assertEqual(self.sweep(), [])
+        self.assertTrue(self.redis.exists('job:job-1:chunks_failed'))
+        self.assertEqual(self.redis.smembers('chunked_jobs'), set())
+        self.assertFalse(self.redis.exists('job:job-1:tasks'))
+        self.worker._publish_error.assert_called_once()
+    
+    def test_one_sweeper_per_interval(self):
+        self.redis.set('job:job-1:chunk:000:claim', 'dead-worker')
+        self.redis.set('chunked_jobs:sweep', 'other-worker', ex=1)
+        self.worker._sweep_chunk_tasks()
+        self.assertEqual(self.published(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+asyncio control plane: priority queue, cancellation of queued and running jobs,
+commands addressed to other workers and drain
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import time
+import asyncio
+import threading
+import itertools
+import unittest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import fakeredis
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from transcription_worker import JobCancelledError
+
+
+class ControlPlaneTest(unittest.TestCase):
+    
+    def setUp(self):
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.worker_id = 'worker-1'
+        worker.running = True
+        worker.draining = False
+        worker.pending = {}
+        worker.cancel_events = {}
+        worker.current_job = None
+        worker.background_tasks = {}
+        worker._sequence = itertools.count()
+        worker.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(worker.executor.shutdown)
+        worker._send_heartbeat = mock.AsyncMock()
+        self.worker = worker
+        self.ran = []
+    
+    def process_job(self, job_data):
+        """Stand-in job: checks for cancellation between its 'segments' like the real stages"""
+        job_id = job_data['jobId']
+        self.ran.append(job_id)
+        for _ in range(200):
+            self.worker._check_cancelled(job_id)
+            time.sleep(0.01)
+    
+    def run_loop(self, scenario):
+        async def main():
+            self.worker.loop = asyncio.get_running_loop()
+            self.worker.stop_event = asyncio.Event()
+            self.worker.queue = asyncio.PriorityQueue()
+            await scenario()
+        asyncio.run(main())
+    
+    def test_priority_command_reorders_the_queue(self):
+        async def scenario():
+            for job_id in ('job-a', 'job-b', 'job-c'):
+                self.worker._enqueue({'jobId': job_id})
+            await self.worker._handle_control({'command': 'priority', 'jobId': 'job-c', 'priority': 5})
+            order = []
+            while not self.worker.queue.empty():
+                _, _, job_data, valid = self.worker.queue.get_nowait()
+                if valid:
+                    order.append(job_data['jobId'])
+            self.assertEqual(order, ['job-c', 'job-a', 'job-b'])
+        
+        self.run_loop(scenario)
+    
+    def test_cancel_stops_the_running_job_within_a_segment(self):
+        self.worker.process_job = self.process_job
+        
+        async def scenario():
+            async_redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+            self.worker._enqueue({'jobId': 'job-1', 'fileId': 'file-1'})
+            self.worker._enqueue({'jobId': 'job-2', 'fileId': 'file-2'})
+            consumer = asyncio.create_task(self.worker._consume_jobs(async_redis))
+            while self.worker.current_job is None:
+                await asyncio.sleep(0.01)
+            
+            start = time.time()
+            await self.worker._handle_control({'command': 'cancel', 'fileId': 'file-1'})
+            await self.worker._handle_control({'command': 'cancel', 'jobId': 'job-2'})
+            while self.worker.current_job is not None:
+                await asyncio.sleep(0.01)
+            self.assertLess(time.time() - start, 1.0)
+            self.assertEqual(self.worker.pending, {})
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+            self.assertEqual(await async_redis.get('job:job-1:claim'), 'worker-1')
+        
+        self.run_loop(scenario)
+        # The queued job was dropped before it started
+        self.assertEqual(self.ran, ['job-1'])
+    
+    def test_commands_for_other_workers_are_ignored(self):
+        async def scenario():
+            self.worker._enqueue({'jobId': 'job-1'})
+            await self.worker._handle_control({'command': 'cancel', 'jobId': 'job-1', 'workerId': 'worker-2'})
+            self.assertIn('job-1', self.worker.pending)
+        
+        self.run_loop(scenario)
+    
+    def test_drain_leaves_new_jobs_to_other_workers(self):
+        async def scenario():
+            await self.worker._handle_control({'command': 'drain'})
+            await asyncio.sleep(0)  # the wake-up is scheduled thread-safely
+            self.assertTrue(self.worker.draining)
+            self.assertTrue(self.worker.stop_event.is_set())
+            self.worker._enqueue({'jobId': 'job-1'})
+            self.assertEqual(self.worker.pending, {})
+        
+        self.run_loop(scenario)
+    
+    def test_check_cancelled(self):
+        self.worker.cancel_events['job-1'] = threading.Event()
+        self.worker._check_cancelled('job-1')
+        self.worker.cancel_events['job-1'].set()
+        with self.assertRaises(JobCancelledError):
+            self.worker._check_cancelled('job-1')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+CPU-only workers (WORKER_ALLOW_CPU=1) load models with a compute type
+CTranslate2 supports on CPU
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from load_test import MemoryMeter, StubModelConfig, StubWhisperX
+
+NO_GPU = SimpleNamespace(cuda=SimpleNamespace(is_available=lambda: False))
+
+
+def make_worker(model_size='large-v2'):
+    worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+        transcription_worker.WhisperXTranscriptionWorker
+    )
+    worker.model_size = model_size
+    worker.auto_model = model_size == 'auto'
+    worker.compute_type = "float16"
+    return worker
+
+
+class CpuComputeTypeTest(unittest.TestCase):
+    
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(transcription_worker, 'torch', NO_GPU),
+            mock.patch.dict(os.environ, {'WORKER_ALLOW_CPU': '1'}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_int8_without_calibration(self):
+        worker = make_worker()
+        with mock.patch.object(transcription_worker, 'calibrated_compute_type', return_value=None):
+            worker._init_device()
+        
+        self.assertEqual((worker.device, worker.compute_type), ("cpu", "int8"))
+    
+    def test_calibrated_cpu_type_wins(self):
+        worker = make_worker()
+        with mock.patch.object(transcription_worker, 'calibrated_compute_type', return_value="float32") as lookup:
+            worker._init_device()
+        
+        lookup.assert_called_once_with("cpu", "large-v2")
+        self.assertEqual(worker.compute_type, "float32")
+    
+    def test_auto_leaves_the_choice_to_calibration(self):
+        worker = make_worker('auto')
+        worker._init_device()
+        self.assertEqual(worker.device, "cpu")
+    
+    def test_cpu_refused_without_opt_in(self):
+        with mock.patch.dict(os.environ, {'WORKER_ALLOW_CPU': '0'}):
+            with self.assertRaises(RuntimeError):
+                make_worker()._init_device()
+    
+    def test_stub_rejects_float16_on_cpu_like_ctranslate2(self):
+        stub = StubWhisperX(StubModelConfig(model_memory_mb=1), MemoryMeter())
+        with self.assertRaises(ValueError):
+            stub.load_model('base', device='cpu', compute_type='float16')
+        self.assertIsNotNone(stub.load_model('base', device='cpu', compute_type='int8'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Cancelling a concurrent diarization stops it and frees the executor
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from diarization_runner import DiarizationRunner, run_pipeline
+
+TURNS = [{"start": 0.0, "end": 1.0, "speaker": "SPEAKER_00"}]
+
+
+class StepModel:
+    """Stand-in pyannote pipeline: one hook call per step"""
+    
+    def __init__(self, steps: int, step_seconds: float):
+        self.steps = steps
+        self.step_seconds = step_seconds
+        self.completed = 0
+    
+    def __call__(self, audio, hook=None):
+        for step in range(self.steps):
+            time.sleep(self.step_seconds)
+            self.completed += 1
+            if hook is not None:
+                hook('embeddings', None, completed=step + 1, total=self.steps)
+        return TURNS
+
+
+class StandInPipeline:
+    """Stand-in whisperx.DiarizationPipeline (before 3.3: no return_embeddings)"""
+    
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+    
+    def __call__(self, audio):
+        self.calls += 1
+        return self.model(audio)
+
+
+class DiarizationRunnerTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.audio = np.zeros(16000, dtype=np.float32)
+    
+    def test_cancel_stops_running_diarization(self):
+        model = StepModel(steps=200, step_seconds=0.01)
+        pipeline = StandInPipeline(model)
+        runner = DiarizationRunner(lambda: pipeline, device='cpu', mode='thread')
+        self.addCleanup(runner.shutdown)
+        
+        future = runner.submit(self.audio)
+        time.sleep(0.1)
+        self.assertTrue(future.cancel())
+        
+        # The single diarization thread is free for the next job well before the 2s run would end
+        start = time.time()
+        runner._executor.submit(lambda: None).result(timeout=5)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertLess(model.completed, 50)
+        self.assertIs(pipeline.model, model)
+    
+    def test_thread_mode_leaves_torch_threads_alone(self):
+        runner = DiarizationRunner(lambda: None, device='cpu', mode='thread')
+        self.addCleanup(runner.shutdown)
+        self.assertIsNone(runner.asr_threads)
+        self.assertIsNone(runner.diarize_threads)
+    
+    def test_type_error_is_not_retried(self):
+        class FailingPipeline:
+            calls = 0
+            
+            def __call__(self, audio, return_embeddings=False):
+                FailingPipeline.calls += 1
+                raise TypeError("bad input")
+        
+        with self.assertRaises(TypeError):
+            run_pipeline(FailingPipeline(), self.audio, return_embeddings=True)
+        self.assertEqual(FailingPipeline.calls, 1)
+    
+    def test_old_pipeline_without_embeddings(self):
+        pipeline = StandInPipeline(StepModel(steps=1, step_seconds=0.0))
+        self.assertEqual(run_pipeline(pipeline, self.audio, return_embeddings=True), (TURNS, None))
+        self.assertEqual(pipeline.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
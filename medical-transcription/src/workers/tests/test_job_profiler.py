@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Per-job profiling: profiler choice from the payload and sample rate, the
+per-stage report and its upload next to the transcript
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import os
+import sys
+import json
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from job_profiler import JobProfiler, NullProfiler, format_profile, profiler_for_job
+
+
+def busy_loop(seconds: float) -> int:
+    total, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(i * i for i in range(1000))
+    return total
+
+
+class ProfilerChoiceTest(unittest.TestCase):
+    
+    def test_payload_flag_and_sample_rate(self):
+        with mock.patch.dict(os.environ, {'PROFILE_SAMPLE_RATE': '0'}):
+            self.assertIsInstance(profiler_for_job({}), NullProfiler)
+            self.assertIsInstance(profiler_for_job({'profile': True}), JobProfiler)
+        with mock.patch.dict(os.environ, {'PROFILE_SAMPLE_RATE': '1', 'PROFILE_INTERVAL_MS': '2'}):
+            self.assertEqual(profiler_for_job({}).interval, 0.002)
+            # An explicit false wins over the sample rate
+            self.assertIsInstance(profiler_for_job({'profile': False}), NullProfiler)
+    
+    def test_null_profiler_reports_nothing(self):
+        profiler = NullProfiler()
+        profiler.start()
+        profiler.mark('asr')
+        self.assertIsNone(profiler.stop())
+
+
+class ProfileReportTest(unittest.TestCase):
+    
+    def test_stages_top_functions_and_allocations(self):
+        profiler = JobProfiler(interval=0.001)
+        profiler.start()
+        profiler.mark('compute')
+        busy_loop(0.15)
+        profiler.mark('allocate')
+        blocks = [bytes(1000) for _ in range(5000)]
+        report = profiler.stop()
+        
+        self.assertEqual([stage['name'] for stage in report['stages']], ['setup', 'compute', 'allocate'])
+        compute, allocate = report['stages'][1:]
+        self.assertGreater(compute['samples'], 10)
+        self.assertTrue(any('busy_loop' in entry['function'] for entry in compute['top_cumulative']))
+        self.assertGreater(sum(entry['size_diff_kb'] for entry in allocate['allocations']), 4000)
+        self.assertEqual(report['samples'], sum(stage['samples'] for stage in report['stages']))
+        self.assertLess(report['sampler_overhead'], 0.5)
+        self.assertIn('[compute]', format_profile(report))
+        self.assertEqual(len(blocks), 5000)
+
+
+class ProfileUploadTest(unittest.TestCase):
+    
+    def setUp(self):
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.s3_client = mock.Mock()
+        worker.s3_bucket = 'bucket'
+        self.worker = worker
+    
+    def test_profile_is_uploaded_next_to_the_transcript(self):
+        self.worker.profiler = JobProfiler(interval=0.001)
+        self.worker.profiler.start()
+        self.worker.profiler.mark('asr')
+        self.worker._store_profile('job-1', 'file-1', 'completed')
+        
+        kwargs = self.worker.s3_client.put_object.call_args.kwargs
+        self.assertEqual(kwargs['Key'], 'transcripts/file-1.profile.json')
+        profile = json.loads(kwargs['Body'])
+        self.assertEqual((profile['jobId'], profile['status']), ('job-1', 'completed'))
+        self.assertEqual([stage['name'] for stage in profile['stages']], ['setup', 'asr'])
+        self.assertIsInstance(self.worker.profiler, NullProfiler)
+    
+    def test_unprofiled_job_uploads_nothing(self):
+        self.worker.profiler = NullProfiler()
+        self.worker._store_profile('job-1', 'file-1', 'completed')
+        self.worker.s3_client.put_object.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Load test harness: arrival patterns, file-length samplers, the report and a
+small end-to-end run through the worker with stub models
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from load_test import (
+    CLINIC_PROFILE, JobRecord, LoadTestConfig, MemoryMeter, TaskRecord,
+    build_report, generate_arrivals, length_sampler, run_worker_load_test
+)
+
+
+class WorkloadTest(unittest.TestCase):
+    
+    def test_arrival_patterns(self):
+        rng = random.Random(0)
+        self.assertEqual(generate_arrivals('backlog', 3, 12.0, rng), [0.0, 0.0, 0.0])
+        
+        poisson = generate_arrivals('poisson', 2000, 60.0, rng)
+        self.assertEqual(poisson, sorted(poisson))
+        self.assertAlmostEqual(len(poisson) / (poisson[-1] / 3600.0), 60.0, delta=5.0)
+        
+        # Clinic arrivals only fall in session hours, most of them in the upload bursts
+        clinic = generate_arrivals('clinic', 500, 12.0, rng)
+        hours = [(8 + int(t // 3600)) % 24 for t in clinic]
+        self.assertTrue(all(CLINIC_PROFILE.get(hour, 0.0) > 0 for hour in hours))
+        self.assertGreater(hours.count(17), hours.count(8))
+        
+        with self.assertRaises(ValueError):
+            generate_arrivals('weekly', 1, 1.0, rng)
+    
+    def test_length_samplers(self):
+        rng = random.Random(0)
+        self.assertEqual(length_sampler('fixed:120')(rng), 120.0)
+        self.assertTrue(all(300 <= length_sampler('uniform:300:600')(rng) <= 600 for _ in range(100)))
+        lognormal = length_sampler('lognormal:900:3.0')
+        self.assertTrue(all(10.0 <= lognormal(rng) <= 4 * 3600.0 for _ in range(500)))
+        with self.assertRaises(ValueError):
+            length_sampler('normal:1:2')
+    
+    def test_memory_limit(self):
+        meter = MemoryMeter(limit_mb=2)
+        with meter.hold(1.5):
+            with self.assertRaises(MemoryError):
+                meter.allocate(1)
+        self.assertEqual((meter.peak_mb, meter.current_mb, meter.out_of_memory), (1.5, 0.0, 1))
+
+
+class ReportTest(unittest.TestCase):
+    
+    def test_latency_throughput_and_utilisation(self):
+        # Simulated = wall × 10: two 60 s recordings, the second waits for the first
+        config = LoadTestConfig(speedup=10.0, priority_fraction=0.5)
+        records = [
+            JobRecord('job-1', 60.0, 1, submitted=0.0, started=0.0, completed=3.0, status='completed', worker='w1'),
+            JobRecord('job-2', 60.0, 0, submitted=0.0, started=3.0, completed=6.0, status='completed', worker='w1'),
+            JobRecord('job-3', 60.0, 0, submitted=1.0),
+        ]
+        report = build_report(records, config, MemoryMeter())
+        
+        self.assertEqual(report['jobs'], {'submitted': 3, 'completed': 2, 'failed': 0, 'unfinished': 1})
+        self.assertEqual(report['queue_wait_seconds']['max'], 30.0)
+        self.assertEqual(report['end_to_end_seconds']['p50'], 45.0)
+        self.assertEqual(report['realtime_factor']['max'], 0.5)
+        self.assertEqual(report['throughput']['makespan_seconds'], 60.0)
+        self.assertEqual(report['throughput']['jobs_per_hour'], 120.0)
+        self.assertEqual(report['utilisation'], {'w1': 1.0})
+        self.assertEqual(report['queue_wait_by_priority']['1']['max'], 0.0)
+        
+        # Split jobs: utilisation goes to the workers of the tasks
+        tasks = [TaskRecord('job-1', 'w1', 3.0), TaskRecord('job-2', 'w2', 1.5)]
+        self.assertEqual(build_report(records, config, MemoryMeter(), tasks)['utilisation'], {'w1': 0.5, 'w2': 0.25})
+
+
+class EndToEndTest(unittest.TestCase):
+    
+    def test_backlog_through_two_workers(self):
+        config = LoadTestConfig(workers=2, jobs=3, arrival='backlog', length='fixed:60', speedup=600.0, timeout=60.0)
+        with tempfile.TemporaryDirectory() as workdir:
+            records, tasks, meter, _ = run_worker_load_test(config, workdir)
+            report = build_report(records, config, meter, tasks)
+            transcripts = list(Path(workdir).rglob('transcripts/*.json'))
+        
+        self.assertEqual(report['jobs']['completed'], 3)
+        self.assertEqual(len(transcripts), 3)
+        self.assertEqual(len(report['utilisation']), 2)
+        self.assertEqual(report['memory']['stub_out_of_memory'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Term index lookups, incremental re-correction and the archive backfill
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import copy
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import fakeredis
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from job_profiler import NullProfiler
+from recorrection import (
+    TermIndex, RecorrectionEngine, apply_corrections, changed_terms, compile_corrections, stored_transcript_ids
+)
+
+DICTIONARY = {"しんきんこうそく": "心筋梗塞", "とうにょうびょう": "糖尿病"}
+
+
+def transcript(*texts, corrections=DICTIONARY):
+    """Stored transcript whose segments were corrected with the given dictionary"""
+    segments = []
+    for index, original in enumerate(texts):
+        text, applied = apply_corrections(original, corrections)
+        segments.append({"start": index * 5.0, "end": index * 5.0 + 5.0, "text": text,
+                         "original_text": original, "corrections": applied})
+    return {"segments": segments, "text": "", "version": 1}
+
+
+class FakeS3:
+    """list_objects_v2 paginator over fixed keys"""
+    
+    def __init__(self, keys):
+        self.keys = keys
+    
+    def get_paginator(self, name):
+        keys = self.keys
+        
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": key} for key in keys[:2] if key.startswith(Prefix)]}
+                yield {"Contents": [{"Key": key} for key in keys[2:] if key.startswith(Prefix)]}
+        
+        return Paginator()
+
+
+class RecorrectionTest(unittest.TestCase):
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = TermIndex(str(Path(directory.name) / "terms.db"))
+        self.addCleanup(self.index.close)
+        self.stored = {
+            "file-1": transcript("しんきんこうそくの既往", "特になし"),
+            "file-2": transcript("とうにょうびょうで通院", "きょうしんしょうあり"),
+        }
+        self.writes = []
+        self.engine = RecorrectionEngine(self.index, self.load, self.store, max_workers=1, io_workers=2)
+    
+    def load(self, file_id):
+        return copy.deepcopy(self.stored.get(file_id))
+    
+    def store(self, file_id, document):
+        self.writes.append(file_id)
+        self.stored[file_id] = document
+    
+    def index_all(self):
+        self.index.set_dictionary(DICTIONARY)
+        for file_id, document in self.stored.items():
+            self.index.index_transcript(file_id, document, DICTIONARY)
+    
+    def test_changed_terms_include_chained_replacements(self):
+        old = {"a": "b", "c": "xa"}
+        self.assertEqual(changed_terms(old, {"a": "B", "c": "xa", "d": "e"}), {"a", "c", "d"})
+    
+    def test_lookup_known_and_new_terms(self):
+        self.index_all()
+        self.assertEqual(self.index.lookup(["しんきんこうそく"]), {"file-1": {0}})
+        # Not in the indexed dictionary: resolved through the bigram index
+        self.assertEqual(self.index.lookup(["きょうしんしょう"]), {"file-2": {1}})
+        self.assertEqual(self.index.lookup(["まったくない"]), {})
+    
+    def test_recorrect_touches_only_affected_segments(self):
+        self.index_all()
+        stats = self.engine.recorrect(dict(DICTIONARY, きょうしんしょう="狭心症"))
+        
+        self.assertEqual((stats["files"], stats["segments"], stats["updated_segments"]), (1, 1, 1))
+        self.assertEqual(self.writes, ["file-2"])
+        segment = self.stored["file-2"]["segments"][1]
+        self.assertEqual(segment["text"], "狭心症あり")
+        self.assertEqual(segment["corrections"], ["きょうしんしょう → 狭心症"])
+        self.assertEqual(self.stored["file-2"]["version"], 2)
+    
+    def test_backfill_indexes_stored_archive(self):
+        # Stored before the index existed, corrected with an older dictionary
+        self.stored["file-3"] = transcript("とうにょうびょうの薬", corrections={})
+        self.index.set_dictionary(DICTIONARY)
+        self.index.index_transcript("file-1", self.stored["file-1"], DICTIONARY)
+        
+        stats = self.engine.backfill(["file-1", "file-2", "file-3", "file-gone"], DICTIONARY)
+        
+        self.assertEqual(
+            {key: stats[key] for key in ("files", "updated_files", "skipped", "missing")},
+            {"files": 2, "updated_files": 1, "skipped": 1, "missing": 1}
+        )
+        self.assertEqual(self.writes, ["file-3"])
+        self.assertEqual(self.stored["file-3"]["segments"][0]["text"], "糖尿病の薬")
+        self.assertEqual(self.index.indexed_files(), {"file-1", "file-2", "file-3"})
+        
+        # Backfilled transcripts are reached by the next dictionary change
+        stats = self.engine.recorrect({"しんきんこうそく": "心筋梗塞", "とうにょうびょう": "2型糖尿病"})
+        self.assertEqual(stats["files"], 2)
+        self.assertEqual(self.stored["file-3"]["segments"][0]["text"], "2型糖尿病の薬")
+    
+    def test_stored_transcript_ids(self):
+        keys = ["transcripts/a.json", "transcripts/a.profile.json", "transcripts/b.json",
+                "transcripts/sub/c.json", "transcripts/d.txt"]
+        self.assertEqual(list(stored_transcript_ids(FakeS3(keys), "bucket")), ["a", "b"])
+
+
+class WorkerRecorrectionTest(unittest.TestCase):
+    """Control command lease and the dictionary check when a job stores its transcript"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        self.index = TermIndex(str(Path(directory.name) / "terms.db"))
+        self.addCleanup(self.index.close)
+        self.worker = self.make_worker('worker-1')
+    
+    def make_worker(self, worker_id):
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.worker_id = worker_id
+        worker.redis_client = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        worker.heartbeat_interval = 10.0
+        worker.leases = set()
+        worker._recorrection_lock = threading.Lock()
+        worker.dictionary = (DICTIONARY, compile_corrections(DICTIONARY))
+        worker.profiler = NullProfiler()
+        worker.s3_client = mock.Mock()
+        worker.s3_bucket = 'bucket'
+        worker.search_index = mock.Mock()
+        worker.segment_store = mock.Mock()
+        worker.fingerprint_index = mock.Mock()
+        worker.term_index = self.index
+        worker.pending_fingerprints = {}
+        return worker
+    
+    def test_one_worker_runs_a_fleet_wide_command(self):
+        other = self.make_worker('worker-2')
+        runs = []
+        
+        def recorrect():
+            # worker:control reached both workers: the second finds the lease taken
+            self.assertIsNone(other._run_leased('recorrect', lambda: runs.append('worker-2')))
+            self.assertEqual(self.redis.get('control:recorrect:lease'), 'worker-1')
+            self.assertEqual(self.worker.leases, {'control:recorrect:lease'})
+            runs.append('worker-1')
+            return 'done'
+        
+        self.assertEqual(self.worker._run_leased('recorrect', recorrect), 'done')
+        self.assertEqual(runs, ['worker-1'])
+        self.assertIsNone(self.redis.get('control:recorrect:lease'))
+        self.assertEqual(self.worker.leases, set())
+        # Released: the next command runs on whichever worker takes it
+        self.assertEqual(other._run_leased('recorrect', lambda: 'again'), 'again')
+    
+    def test_finalize_recorrects_with_a_reloaded_dictionary(self):
+        # Corrected with the dictionary of job start, reloaded before the job stored it
+        result = transcript("きょうしんしょうの疑い")
+        result["text"] = result["segments"][0]["text"]
+        updated = dict(DICTIONARY, きょうしんしょう="狭心症")
+        self.worker.dictionary = (updated, compile_corrections(updated))
+        
+        self.worker._finalize_transcript('job-1', 'file-1', result)
+        
+        stored = json.loads(self.worker.s3_client.put_object.call_args.kwargs['Body'])
+        self.assertEqual(stored["text"], "狭心症の疑い")
+        self.assertEqual(stored["segments"][0]["original_text"], "きょうしんしょうの疑い")
+        self.assertEqual(stored["corrections"], ["きょうしんしょう → 狭心症"])
+        self.worker.segment_store.write_transcript.assert_called_once_with('file-1', result)
+        self.assertEqual(self.index.get_dictionary(), updated)
+        self.assertEqual(self.index.lookup(["きょうしんしょう"]), {"file-1": {0}})
+
+
+if __name__ == "__main__":
+    unittest.main()
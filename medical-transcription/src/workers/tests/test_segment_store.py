@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Segment store slices (time windows, speakers, words, turns) against a
+brute-force filter over the transcript they were written from
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from segment_store import SegmentStore, speaker_turns, _synthetic_transcript
+
+
+def overlapping(items, start, end):
+    """Items overlapping [start, end) in time order"""
+    return sorted((item for item in items if item["start"] < end and item["end"] > start), key=lambda i: i["start"])
+
+
+class SegmentStoreTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = SegmentStore(str(Path(self.tmp.name) / 'segments.db'))
+        self.addCleanup(self.store.close)
+        
+        # Half an hour (more rows than one fetch batch) plus a 60 s segment that
+        # starts long before the windows it overlaps
+        self.transcript = _synthetic_transcript(0.5)
+        self.transcript["segments"].insert(100, {
+            "start": 480.0, "end": 540.0, "text": "長い説明", "original_text": "ながいせつめい",
+            "speaker": "SPEAKER_02", "words": [],
+        })
+        self.store.write_transcript('file-1', self.transcript)
+        self.store.write_transcript('file-2', _synthetic_transcript(0.1))
+        self.segments = self.transcript["segments"]
+    
+    def test_time_windows(self):
+        for start, end in [(0.0, 10.0), (530.0, 531.0), (502.5, 700.0), (1795.0, 5000.0), (4000.0, 4100.0)]:
+            expected = overlapping(self.segments, start, end)
+            got = list(self.store.time_window('file-1', start, end))
+            self.assertEqual([(s["start"], s["end"], s["text"]) for s in got],
+                             [(s["start"], s["end"], s["text"]) for s in expected], (start, end))
+    
+    def test_window_with_words_and_original_text(self):
+        got = list(self.store.time_window('file-1', 530.0, 531.0, include_words=True))
+        long_segment = next(s for s in got if s["speaker"] == "SPEAKER_02")
+        
+        self.assertEqual(long_segment["original_text"], "ながいせつめい")
+        self.assertEqual(long_segment["words"], [])
+        other = next(s for s in got if s["speaker"] != "SPEAKER_02")
+        self.assertEqual([w["word"] for w in other["words"]], [f"語{i}" for i in range(8)])
+    
+    def test_speaker_slices(self):
+        for speaker, start, end in [("SPEAKER_00", None, None), ("SPEAKER_01", 100.0, 200.0),
+                                    ("SPEAKER_02", 500.0, 510.0), ("SPEAKER_03", None, None)]:
+            own = [s for s in self.segments if s["speaker"] == speaker]
+            expected = own if start is None else overlapping(own, start, end)
+            got = list(self.store.speaker_slice('file-1', speaker, start, end))
+            self.assertEqual([s["start"] for s in got], [s["start"] for s in expected], speaker)
+    
+    def test_words(self):
+        words = [w for s in self.segments for w in s.get("words", [])]
+        expected = overlapping(words, 100.2, 101.0)
+        got = list(self.store.words('file-1', 100.2, 101.0))
+        self.assertEqual([(w["word"], w["start"]) for w in got], [(w["word"], w["start"]) for w in expected])
+        
+        speaker_words = list(self.store.words('file-1', 0.0, 60.0, speaker="SPEAKER_01"))
+        self.assertTrue(speaker_words)
+        self.assertEqual({w["speaker"] for w in speaker_words}, {"SPEAKER_01"})
+    
+    def test_turns_and_summary(self):
+        turns = self.store.speaker_turns('file-1')
+        self.assertEqual([(t["speaker"], t["start"], t["end"], t["segments"]) for t in turns],
+                         speaker_turns(self.segments))
+        
+        summary = self.store.summary('file-1')
+        self.assertEqual(set(summary["speakers"]), {"SPEAKER_00", "SPEAKER_01", "SPEAKER_02"})
+        self.assertEqual(summary["speakers"]["SPEAKER_02"], {"turns": 1, "seconds": 60.0})
+    
+    def test_replace_and_delete(self):
+        self.store.write_transcript('file-1', {"segments": [{"start": 0.0, "end": 1.0, "text": "新", "speaker": "A"}]})
+        self.assertEqual([s["text"] for s in self.store.time_window('file-1', 0.0, 3600.0)], ["新"])
+        self.assertEqual(len(list(self.store.time_window('file-2', 0.0, 3600.0))), 72)
+        
+        self.assertTrue(self.store.delete_transcript('file-1'))
+        self.assertFalse(self.store.delete_transcript('file-1'))
+        self.assertEqual(list(self.store.time_window('file-1', 0.0, 10.0)), [])
+        self.assertIsNone(self.store.summary('file-1'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Worker cold start: deferred heavy imports, concurrent start-up phases and the
+readiness record
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import fakeredis
+
+WORKERS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(WORKERS_DIR))
+
+import transcription_worker
+
+PHASES = ('_init_device', '_init_redis', '_init_s3', '_init_dictionary', '_init_search_index',
+          '_preload_whisper_models', '_load_align_model', '_preload_diarization')
+
+
+class StartupTest(unittest.TestCase):
+    
+    def setUp(self):
+        worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+            transcription_worker.WhisperXTranscriptionWorker
+        )
+        worker.worker_id = 'worker-1'
+        worker.auto_model = False
+        worker.startup_phases = {}
+        worker.redis_client = None
+        worker.health_file = None
+        self.worker = worker
+    
+    def test_heavy_modules_are_not_imported_at_load(self):
+        code = ("import sys, transcription_worker; "
+                "print(sorted(name for name in ('torch', 'whisperx') if name in sys.modules))")
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=WORKERS_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(output.strip().splitlines()[-1], '[]')
+    
+    def test_lazy_module_imports_once_on_first_use(self):
+        lazy = transcription_worker._LazyModule('json')
+        with mock.patch.object(transcription_worker.importlib, 'import_module', wraps=__import__) as imported:
+            self.assertEqual(lazy.dumps([1]), '[1]')
+            self.assertEqual(lazy.loads('2'), 2)
+        imported.assert_called_once_with('json')
+    
+    def test_phases_run_concurrently_and_are_timed(self):
+        for name in PHASES:
+            setattr(self.worker, name, lambda *args: time.sleep(0.2))
+        
+        start = time.time()
+        with mock.patch.dict(os.environ, {'WORKER_PARALLEL_INIT': '1', 'WORKER_PRELOAD_MODELS': '1'}):
+            self.worker._startup()
+        
+        # Five independent phases, then the three model loads once the device is known
+        self.assertLess(time.time() - start, 0.8)
+        self.assertEqual(
+            set(self.worker.startup_phases),
+            {'device', 'redis', 's3', 'dictionary', 'search_index',
+             'whisper_model', 'align_model', 'diarize_model', 'total'}
+        )
+        self.assertGreaterEqual(self.worker.startup_phases['redis'], 0.2)
+    
+    def test_readiness_is_published_to_redis_and_health_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.worker.health_file = str(Path(directory.name) / 'health.json')
+        self.worker.redis_client = fakeredis.FakeRedis(decode_responses=True)
+        self.worker.startup_phases = {'redis': 0.1, 'total': 1.5}
+        
+        self.worker._set_readiness('ready')
+        
+        for payload in (Path(self.worker.health_file).read_text(),
+                        self.worker.redis_client.get('worker:worker-1:ready')):
+            state = json.loads(payload)
+            self.assertEqual(state['state'], 'ready')
+            self.assertEqual(state['phases'], {'redis': 0.1, 'total': 1.5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Bigram tokenization and queries of the transcript search index
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from transcript_search import TranscriptSearchIndex, to_bigrams
+
+SEGMENTS = [
+    {"text": "GLP-1受容体作動薬です", "speaker": "SPEAKER_00", "start": 0.0, "end": 2.5},
+    {"text": "GLP-1 を使う", "speaker": "SPEAKER_01", "start": 2.5, "end": 4.0},
+    {"text": "ＨｂＡ１ｃは7.2％でした", "speaker": "SPEAKER_00", "start": 4.0, "end": 6.0},
+    {"text": "血糖が高い", "speaker": "SPEAKER_01", "start": 6.0, "end": 7.5},
+    {"text": "GLP 10単位", "speaker": "SPEAKER_00", "start": 7.5, "end": 9.0},
+]
+
+
+class BigramTest(unittest.TestCase):
+    
+    def test_runs_split_at_punctuation(self):
+        self.assertEqual(to_bigrams("GLP-1受容体"), ["gl", "lp", "1受", "受容", "容体"])
+        self.assertEqual(to_bigrams("7.2%"), ["7", "2"])
+    
+    def test_full_width_is_folded(self):
+        self.assertEqual(to_bigrams("ＨｂＡ１ｃ"), to_bigrams("hba1c"))
+
+
+class SearchTest(unittest.TestCase):
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = TranscriptSearchIndex(str(Path(directory.name) / "search.db"))
+        self.addCleanup(self.index.close)
+        self.index.index_transcript("file-1", {"segments": SEGMENTS})
+    
+    def search(self, query):
+        return sorted(hit.segment_index for hit in self.index.search(query))
+    
+    def test_two_character_term(self):
+        hits = self.index.search("血糖")
+        self.assertEqual([(hit.segment_index, hit.start, hit.speaker) for hit in hits], [(3, 6.0, "SPEAKER_01")])
+    
+    def test_single_character_run_inside_term(self):
+        # "1" of GLP-1 is a run of its own in the query but not in "GLP-1受容体"
+        self.assertEqual(self.search("GLP-1"), [0, 1])
+        self.assertEqual(self.search("ＧＬＰ－１"), [0, 1])
+    
+    def test_decimal_numbers(self):
+        self.assertEqual(self.search("7.2"), [2])
+        self.assertEqual(self.search("7.2%"), [2])
+        self.assertEqual(self.search("7.3"), [])
+    
+    def test_single_character_term_is_normalized(self):
+        self.assertEqual(self.search("Ａ"), [2])
+        self.assertEqual(self.search("%"), [])
+    
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search("hba1c 7.2"), [2])
+        self.assertEqual(self.search("GLP-1 受容体"), [0])
+    
+    def test_reindex_and_delete(self):
+        self.index.index_transcript("file-1", {"segments": SEGMENTS[3:]})
+        self.assertEqual(self.search("GLP-1"), [])
+        self.assertEqual(self.search("血糖"), [0])
+        
+        self.assertEqual(self.index.delete_transcript("file-1"), 2)
+        self.assertEqual(self.index.stats(), {"files": 0, "segments": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Two-pass partial transcripts must not leak corrected text into alignment
+or into the final correction pass
+
+Usage:
+    python -m unittest discover -s src/workers/tests
+"""
+
+import sys
+import time
+import random
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transcription_worker
+from job_profiler import NullProfiler
+from recorrection import compile_corrections
+
+# "CT" → "CT検査" contains its own misrecognition: correcting corrected text doubles it
+CORRECTIONS = {"しんきんこうそく": "心筋梗塞", "CT": "CT検査"}
+ASR_TEXT = "しんきんこうそくの疑いでCT"
+CORRECTED_TEXT = "心筋梗塞の疑いでCT検査"
+
+
+def whisperx_align(segments, model, metadata, audio, device=None):
+    """Stand-in for whisperx.align: like the real one, keeps only start/end/text/words"""
+    aligned = [
+        {"start": seg["start"], "end": seg["end"], "text": seg["text"],
+         "words": [{"word": seg["text"], "start": seg["start"], "end": seg["end"], "score": 0.9}]}
+        for seg in segments
+    ]
+    return {"segments": aligned, "word_segments": [word for seg in aligned for word in seg["words"]]}
+
+
+def make_worker():
+    """Worker with just the state the transcription stages use (no Redis, S3 or models)"""
+    worker = transcription_worker.WhisperXTranscriptionWorker.__new__(
+        transcription_worker.WhisperXTranscriptionWorker
+    )
+    worker.dictionary = (CORRECTIONS, compile_corrections(CORRECTIONS))
+    worker.profiler = NullProfiler()
+    worker.refine_window_seconds = 240.0
+    worker.draft_model_size = 'base'
+    worker.model_size = 'large-v2'
+    worker.device = 'cpu'
+    worker.draft_model = worker.whisper_model = object()
+    worker.align_model = worker.align_metadata = None
+    worker.cancel_events = {}
+    worker._publish_progress = lambda *args: None
+    worker._load_draft_model = worker._load_whisper_model = lambda: None
+    worker._transcribe_window = lambda model, model_size, audio, window: (
+        [{"text": ASR_TEXT, "start": window.start_time, "end": window.end_time}], "ja"
+    )
+    return worker
+
+
+class TwoPassCorrectionTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.worker = make_worker()
+        self.audio = np.random.default_rng(0).normal(0, 0.1, 16000 * 10).astype(np.float32)
+        patcher = mock.patch.object(transcription_worker, 'whisperx', mock.Mock(align=whisperx_align))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_publish_then_final_pass(self):
+        partials = []
+        result, stats = self.worker._transcribe_two_pass(
+            self.audio, 10.0, 'job-1', time.time(), partials.append
+        )
+        
+        # Every partial is corrected once
+        self.assertEqual(stats["partial_versions"], 2)
+        for partial in partials:
+            self.assertEqual(partial["text"], CORRECTED_TEXT)
+            self.assertEqual(partial["segments"][0]["original_text"], ASR_TEXT)
+        # ... without touching the segments that go on to alignment
+        self.assertEqual(result["segments"][0]["text"], ASR_TEXT)
+        self.assertNotIn("original_text", result["segments"][0])
+        
+        aligned = self.worker._align_segments(result["segments"], self.audio, 'job-1')
+        output = self.worker._format_output(aligned, 10.0, time.time(), 'job-1')
+        
+        segment = output["segments"][0]
+        self.assertEqual(output["text"], CORRECTED_TEXT)
+        self.assertEqual(segment["original_text"], ASR_TEXT)
+        self.assertEqual(segment["corrections"], ["しんきんこうそく → 心筋梗塞", "CT → CT検査"])
+        self.assertEqual(output["corrections"], segment["corrections"])
+    
+    def test_alignment_uses_original_text(self):
+        segments = [{"text": CORRECTED_TEXT, "original_text": ASR_TEXT, "start": 0.0, "end": 5.0}]
+        
+        aligned = self.worker._align_segments(segments, self.audio, 'job-1')
+        output = self.worker._format_output(aligned, 10.0, time.time(), 'job-1')
+        
+        self.assertEqual(aligned["segments"][0]["text"], ASR_TEXT)
+        self.assertEqual(output["text"], CORRECTED_TEXT)
+        self.assertEqual(segments[0]["text"], CORRECTED_TEXT)
+    
+    def test_corrections_return_copies(self):
+        segments = [{"text": ASR_TEXT, "start": 0.0, "end": 5.0}]
+        
+        corrected, text, corrections = self.worker._apply_medical_corrections(segments)
+        
+        self.assertEqual(text, CORRECTED_TEXT)
+        self.assertEqual(len(corrections), 2)
+        self.assertEqual(segments, [{"text": ASR_TEXT, "start": 0.0, "end": 5.0}])
+        self.assertEqual(corrected[0]["original_text"], ASR_TEXT)
+
+
+def full_table_distance(reference: str, hypothesis: str) -> int:
+    """Textbook Levenshtein over the whole table"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1]
+
+
+class DraftErrorRateTest(unittest.TestCase):
+    
+    def test_banded_distance_is_exact(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            reference = ''.join(rng.choice('あいうCT') for _ in range(rng.randint(0, 40)))
+            hypothesis = list(reference)
+            for _ in range(rng.randint(0, 15)):
+                position = rng.randint(0, len(hypothesis))
+                if rng.random() < 0.5 and position < len(hypothesis):
+                    del hypothesis[position]
+                else:
+                    hypothesis.insert(position, rng.choice('あいうん'))
+            hypothesis = ''.join(hypothesis)
+            self.assertEqual(
+                transcription_worker._edit_distance(reference, hypothesis),
+                full_table_distance(reference, hypothesis),
+                (reference, hypothesis)
+            )
+    
+    def test_edge_cases(self):
+        self.assertEqual(transcription_worker._edit_distance("", "心筋梗塞"), 4)
+        self.assertEqual(transcription_worker._edit_distance("心筋梗塞", "心筋梗塞"), 0)
+        self.assertEqual(transcription_worker._edit_distance("しんきんこうそく", "心筋梗塞"), 8)
+    
+    def test_band_memory_does_not_grow_with_length(self):
+        rng = random.Random(1)
+        reference = ''.join(rng.choice('あいうえお') for _ in range(20000))
+        # Edits at both ends: stripping the shared prefix/suffix leaves the whole string
+        hypothesis = 'ん' + reference[1:-1] + 'ん'
+        tracemalloc.start()
+        try:
+            distance = transcription_worker._edit_distance(reference, hypothesis)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(distance, 2)
+        # A full row of 20001 cells alone is ~160 KB of list slots
+        self.assertLess(peak, 16 * 1024)
+        # Outside the band the result is only an upper bound
+        self.assertGreaterEqual(transcription_worker._banded_edit_distance("あいうえお", "えおあいう", 1), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Transcript Search Index - SQLite FTS5 full-text search over transcript segments
+Japanese text is indexed as character bigrams so 2-character terms (血糖, 腎症)
+match as well as longer terms and Latin abbreviations (HbA1c, GLP-1).
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Tuple
+
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    segment_index INTEGER NOT NULL,
+    speaker TEXT,
+    start_time REAL,
+    end_time REAL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_file ON segments(file_id, segment_index);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    bigrams,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 0'
+);
+"""
+
+
+@dataclass
+class SearchHit:
+    """A segment matching a search query"""
+    file_id: str
+    segment_index: int
+    speaker: Optional[str]
+    start: float
+    end: float
+    text: str
+    score: float
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalize and lowercase (ＨｂＡ１ｃ → hba1c)"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def _runs(text: str) -> List[str]:
+    """Split normalized text into runs of letters/digits, dropping punctuation"""
+    runs, current = [], []
+    for char in normalize_text(text):
+        if char.isalnum() or unicodedata.category(char) in ('Lm', 'Mn'):
+            current.append(char)
+        elif current:
+            runs.append(''.join(current))
+            current = []
+    if current:
+        runs.append(''.join(current))
+    return runs
+
+
+def to_bigrams(text: str) -> List[str]:
+    """
+    Tokenize text into overlapping character bigrams per run
+    
+    Args:
+        text: Raw segment or query text
+    
+    Returns:
+        Bigram tokens in order; single-character runs are kept as-is
+    """
+    tokens = []
+    for run in _runs(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class TranscriptSearchIndex:
+    """Incrementally updated full-text index of transcript segments"""
+    
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the index database
+        
+        Args:
+            db_path: SQLite file path
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.create_function('normalize_text', 1, normalize_text, deterministic=True)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+    
+    def index_transcript(self, file_id: str, transcript: Dict[str, Any]) -> int:
+        """
+        Index (or re-index) all segments of a transcript
+        
+        Args:
+            file_id: File ID the transcript belongs to
+            transcript: Transcript document with "segments"
+        
+        Returns:
+            Number of segments indexed
+        """
+        rows = []
+        for index, segment in enumerate(transcript.get("segments", [])):
+            text = segment.get("text", "").strip()
+            if not text:
+                continue
+            rows.append((
+                file_id,
+                index,
+                segment.get("speaker"),
+                segment.get("start"),
+                segment.get("end"),
+                text,
+            ))
+        
+        with self._lock, self.conn:
+            self._delete_locked(file_id)
+            self.conn.executemany(
+                "INSERT INTO segments (file_id, segment_index, speaker, start_time, end_time, text) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.executemany(
+                "INSERT INTO segments_fts (rowid, bigrams) VALUES (?, ?)",
+                self._fts_rows(file_id)
+            )
+        logger.info(f"Indexed {len(rows)} segments for file {file_id}")
+        return len(rows)
+    
+    def delete_transcript(self, file_id: str) -> int:
+        """
+        Remove a transcript from the index
+        
+        Args:
+            file_id: File ID
+        
+        Returns:
+            Number of segments removed
+        """
+        with self._lock, self.conn:
+            removed = self._delete_locked(file_id)
+        logger.info(f"Removed {removed} segments for file {file_id} from search index")
+        return removed
+    
+    def _fts_rows(self, file_id: str) -> List[Tuple[int, str]]:
+        """(rowid, bigram document) pairs for every stored segment of a file"""
+        return [
+            (row_id, ' '.join(to_bigrams(text)))
+            for row_id, text in self.conn.execute(
+                "SELECT id, text FROM segments WHERE file_id = ?", (file_id,)
+            )
+        ]
+    
+    def _delete_locked(self, file_id: str) -> int:
+        # Contentless FTS tables are deleted from by replaying the indexed document
+        self.conn.executemany(
+            "INSERT INTO segments_fts (segments_fts, rowid, bigrams) VALUES ('delete', ?, ?)",
+            self._fts_rows(file_id)
+        )
+        return self.conn.execute("DELETE FROM segments WHERE file_id = ?", (file_id,)).rowcount
+    
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        file_ids: Optional[List[str]] = None
+    ) -> List[SearchHit]:
+        """
+        Find segments containing every whitespace-separated term of the query
+        
+        Args:
+            query: Search terms (e.g. "オゼンピック HbA1c")
+            limit: Maximum number of hits
+            file_ids: Restrict the search to these files
+        
+        Returns:
+            Hits ordered by relevance (bm25)
+        """
+        match, substrings = self._build_query(query)
+        if match is None and not substrings:
+            return []
+        
+        conditions, params = [], []
+        if match is not None:
+            sql = (
+                "SELECT s.file_id, s.segment_index, s.speaker, s.start_time, s.end_time, s.text, "
+                "bm25(segments_fts) AS score "
+                "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid "
+            )
+            conditions.append("segments_fts MATCH ?")
+            params.append(match)
+            order = "score"
+        else:
+            # Only single-character runs: no bigram to look up, scan instead
+            sql = (
+                "SELECT s.file_id, s.segment_index, s.speaker, s.start_time, s.end_time, s.text, "
+                "0.0 AS score FROM segments s "
+            )
+            order = "s.file_id, s.segment_index"
+        for substring in substrings:
+            conditions.append("instr(normalize_text(s.text), ?) > 0")
+            params.append(substring)
+        if file_ids:
+            conditions.append(f"s.file_id IN ({','.join('?' * len(file_ids))})")
+            params.extend(file_ids)
+        sql += "WHERE " + " AND ".join(conditions) + f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [SearchHit(*row) for row in rows]
+    
+    @staticmethod
+    def _build_query(query: str) -> Tuple[Optional[str], List[str]]:
+        """
+        Translate a user query into an FTS5 MATCH expression plus substrings
+        of the normalized text that a hit must contain
+        
+        A one-character run ("1" in GLP-1, "7" and "2" in 7.2) is a token of
+        its own only where the document's run is one character too, so it is
+        left out of the MATCH phrases and the whole term is checked as a
+        substring instead.
+        """
+        phrases, substrings = [], []
+        for term in query.split():
+            runs = _runs(term)
+            if not runs:
+                continue
+            if all(len(run) > 1 for run in runs):
+                # Runs of a term are adjacent bigrams in the document as well
+                phrases.append(' '.join(to_bigrams(term)))
+                continue
+            phrases.extend(' '.join(to_bigrams(run)) for run in runs if len(run) > 1)
+            normalized = normalize_text(term)
+            first = normalized.index(runs[0])
+            last = normalized.rindex(runs[-1]) + len(runs[-1])
+            substrings.append(normalized[first:last])
+        match = ' AND '.join('"' + phrase.replace('"', '""') + '"' for phrase in phrases)
+        return (match or None), substrings
+    
+    def stats(self) -> Dict[str, int]:
+        """Return number of indexed files and segments"""
+        with self._lock:
+            files, segments = self.conn.execute(
+                "SELECT COUNT(DISTINCT file_id), COUNT(*) FROM segments"
+            ).fetchone()
+        return {'files': files, 'segments': segments}
+    
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
+
+
+def main():
+    """Query the index from the command line"""
+    logging.basicConfig(level=logging.INFO)
+    
+    if len(sys.argv) < 2:
+        print("Usage: python transcript_search.py <query> [limit]")
+        print("       python transcript_search.py --index <file_id> <transcript.json>")
+        sys.exit(1)
+    
+    db_path = os.getenv(
+        'SEARCH_INDEX_PATH',
+        data_path('transcript_search.db')
+    )
+    index = TranscriptSearchIndex(db_path)
+    
+    if sys.argv[1] == '--index':
+        with open(sys.argv[3], 'r', encoding='utf-8') as f:
+            index.index_transcript(sys.argv[2], json.load(f))
+        print(json.dumps(index.stats()))
+        return
+    
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    start = time.perf_counter()
+    hits = index.search(sys.argv[1], limit=limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    for hit in hits:
+        print(json.dumps(asdict(hit), ensure_ascii=False))
+    print(f"{len(hits)} hits in {elapsed_ms:.1f} ms ({index.stats()['segments']} segments indexed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,47 +11,134 @@ This worker processes audio transcription jobs using WhisperX, which integrates:
 Key Features:
 - GPU-accelerated (CUDA required, 6GB+ VRAM recommended)
 - Real-time progress updates via Redis pub/sub
-- Speaker diarization with automatic speaker assignment
+- asyncio control plane: cancel/priority/drain commands and heartbeats while a job runs
+- Speaker diarization with automatic speaker assignment, run concurrently with ASR
 - Medical term correction using custom dictionary
+- Acoustic fingerprint de-duplication of re-encoded uploads (ASR only for new audio)
+- Long recordings split into chunk tasks processed by the whole fleet, then merged
+- Canonical 16kHz mono copy of each upload ({s3Key}.canonical.ogg) fetched by every later run
 - S3/MinIO integration for audio and transcript storage
 
 Environment Variables:
 - HF_TOKEN: Hugging Face token for pyannote (required)
-- WHISPER_MODEL_SIZE: Model size (default: large-v2)
+- WHISPER_MODEL_SIZE: Model size, or auto to use the calibrated model/compute type for this host (default: large-v2)
+- CALIBRATION_RTF_TARGET: Required ASR processing seconds per audio second for auto (default: 1.0)
+- CALIBRATION_CLIP: Speech recording used for calibration (required for auto)
+- CALIBRATION_CLIP_SECONDS: Length of the calibration clip (default: 60)
+- CALIBRATION_PROFILE_PATH: Per-host calibration results (default: WORKER_DATA_DIR/calibration_profile.json)
+- CALIBRATION_FORCE: Recalibrate on start even if this host has a profile (default: 0)
+- CALIBRATION_CANDIDATES: Comma-separated candidate models, most accurate first
+- TRANSCRIPTION_MODE: single or two_pass (default: single)
+- DRAFT_MODEL_SIZE: Fast model for the two_pass draft (default: base)
+- REFINE_WINDOW_SECONDS: Window length for windowed ASR (default: 240)
+- ALIGN_WORKERS: Forced-alignment threads (default: 4 on GPU, 1 on CPU where torch already uses every core)
+- ALIGN_BATCH_SECONDS: Audio per length-bucketed alignment batch (default: 60)
+- DIARIZATION_EXECUTOR: Where diarization runs alongside ASR: thread, process or off (sequential) (default: thread)
+- DIARIZATION_CPU_SHARE: Share of the CPU cores for diarization on CPU hosts with the process executor, the rest for ASR (default: 0.5)
+- WORKER_ALLOW_CPU: Run without a CUDA GPU (CPU-only hosts; default: 0)
+- WORKER_DATA_DIR: Directory of the local indexes, segment store and profiles (default: medical-transcription/data if writable, else ~/.local/share/whisperplaud)
+- SEARCH_INDEX_PATH: SQLite full-text index of transcripts (default: WORKER_DATA_DIR/transcript_search.db)
+- TERM_INDEX_PATH: Dictionary term → segment index for re-correction (default: WORKER_DATA_DIR/term_index.db)
+- DEDUP_ENABLED: Reuse transcripts of acoustically matching uploads (default: 1)
+- DEDUP_MIN_MATCHES, DEDUP_MIN_DENSITY: Fingerprint match thresholds (default: 50, 0.05)
+- FINGERPRINT_INDEX_PATH: Audio fingerprint index (default: WORKER_DATA_DIR/fingerprints.db)
+- CHUNK_JOB_MIN_SECONDS: Split recordings at least this long into chunk tasks for the whole fleet (default: 0, off)
+- CHUNK_SECONDS, CHUNK_OVERLAP_SECONDS: Chunk length and audio shared with each neighbour (default: 600, 5)
+- CHUNK_SPEAKER_THRESHOLD: Embedding cosine similarity for matching speakers across chunks (default: 0.5)
+- CHUNK_DEADLINE_SECONDS: Time a chunk/reduce task may wait or run before it is published again (default: 1800)
+- CHUNK_MAX_ATTEMPTS: Re-publications after a lost worker or missed deadline before the recording fails (default: 3)
+- CANONICAL_AUDIO_CODEC: Codec of the canonical upload copy: opus, flac or off (default: opus)
+- CANONICAL_OPUS_KBPS: Opus bitrate of the canonical copy (default: 32)
+- SEGMENT_STORE_PATH: Normalized segment/word/speaker-turn store (default: WORKER_DATA_DIR/segments.db)
+- WORKER_BATCH_SIZE: Fixed ASR batch size (default: chosen from free memory, halved on OOM)
+- WORKER_MAX_BATCH_SIZE: Upper bound for the chosen batch size (default: 64 on GPU, 8 on CPU)
+- BATCH_PROFILE_PATH: Learned batch sizes per host/device/model (default: WORKER_DATA_DIR/batch_profile.json)
+- WORKER_SIMULATED_MEMORY_MB: Simulated memory limit for testing the OOM backoff on CPU
+- PROFILE_SAMPLE_RATE: Share of jobs profiled without the payload flag (default: 0)
+- PROFILE_INTERVAL_MS: CPU sampling interval for profiled jobs (default: 5)
+- WORKER_ID: Worker identity for claims and heartbeats (default: hostname-pid)
+- WORKER_HEARTBEAT_SECONDS: Heartbeat interval (default: 10)
+- WORKER_PRELOAD_MODELS: Load models during startup instead of on the first job (default: 1)
+- WORKER_PARALLEL_INIT: Run startup phases concurrently (default: 1)
+- WORKER_HEALTH_FILE: Optional file mirroring the readiness state
 - REDIS_URL: Redis connection string
 - S3_ENDPOINT: MinIO/S3 endpoint URL
 - S3_ACCESS_KEY, S3_SECRET_KEY: S3 credentials
 - S3_BUCKET: S3 bucket name
 
+Redis Channels:
+- job:new: New jobs ({jobId, fileId, s3Key, priority?, profile?}); claimed via job:{jobId}:claim
+  profile: true uploads a CPU/memory profile to transcripts/{fileId}.profile.json
+  task: chunk|reduce marks the map-reduce tasks of a split recording ({parentJobId, chunk, ...});
+  chunk audio and results live under chunks/{parentJobId}/, finished chunks in job:{parentJobId}:chunks_done;
+  the tasks of split jobs in flight (chunked_jobs) are re-published when their worker is lost or overdue
+- worker:control: Commands ({command: cancel|priority|drain|recorrect|backfill|calibrate, jobId?, fileId?, workerId?})
+  recorrect/backfill run on one worker of the fleet, the holder of control:{command}:lease
+- job:progress, job:transcript: Progress and stored transcript versions
+- worker:heartbeat: Periodic worker state (also kept in worker:{id}:heartbeat)
+- worker:{id}:ready: Readiness state (starting|ready|failed|stopped) with startup phase timings
+
 System Requirements:
-- NVIDIA GPU with CUDA 11.8+
+- NVIDIA GPU with CUDA 11.8+ (or WORKER_ALLOW_CPU=1)
 - 6GB+ VRAM
-- FFmpeg installed
+- FFmpeg installed (fallback decoder for formats libsndfile cannot read, e.g. m4a)
 
 Usage:
     python transcription_worker.py
+    python transcription_worker.py --startup-benchmark   # initialize, print phase timings, exit
+
+Signals:
+    SIGINT/SIGTERM once: drain (finish the running job, then exit)
+    SIGINT/SIGTERM twice: cancel the running job and exit
 
 Author: WhisperPlaud Project
 Date: 2025-10-17
 """
 
+import io
 import os
 import sys
 import json
 import time
+import importlib
+import socket
+import asyncio
 import logging
 import signal
+import shutil
 import tempfile
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Set
 from datetime import datetime
 
+import numpy as np
 import redis
+import redis.asyncio as aioredis
 import boto3
 from botocore.config import Config
+from botocore.exceptions import ClientError
 from dotenv import load_dotenv
-import torch
-import whisperx
+
+from audio_segmentation import AudioWindow, split_audio
+from audio_decode import decode_audio
+from audio_ingest import IngestStats, canonical_codec, canonical_key, encode_canonical, CODECS
+from audio_fingerprint import FingerprintIndex, fingerprint
+from job_profiler import NullProfiler, profiler_for_job
+from batch_sizing import BatchProfile, BatchSizer
+from batched_alignment import BatchedAligner
+from chunked_jobs import plan_chunks, encode_wav, shift_result, merge_chunk_results, overdue_tasks
+from diarization_runner import DiarizationRunner
+from calibration import auto_configure, calibrated_compute_type
+from data_dir import data_path
+from segment_store import SegmentStore
+from transcript_search import TranscriptSearchIndex
+from recorrection import (
+    TermIndex, RecorrectionEngine, apply_corrections, build_transcript_text, compile_corrections,
+    stored_transcript_ids
+)
 
 # Add parent directories to path
 project_root = Path(__file__).parent.parent.parent.parent
@@ -80,6 +167,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+PROCESS_START = time.time()
+
+
+class _LazyModule:
+    """Import a heavy module on first attribute access (keeps worker start-up fast)"""
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.time()
+                    self._module = importlib.import_module(self._name)
+                    logger.info(f"Imported {self._name} in {time.time() - start:.1f}s")
+        return getattr(self._module, attr)
+
+
+torch = _LazyModule('torch')
+whisperx = _LazyModule('whisperx')
+
+
+class JobCancelledError(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
 
 class WhisperXTranscriptionWorker:
     """
@@ -95,15 +210,150 @@ class WhisperXTranscriptionWorker:
         # Validate environment variables
         self._validate_environment()
         
-        # Initialize Redis
+        # Model configuration
+        self.model_size = os.getenv('WHISPER_MODEL_SIZE', 'large-v2')
+        self.compute_type = "float16"  # GPU optimization; CPU hosts switch in _init_device
+        # auto: model size and compute type come from the host calibration (see calibration)
+        self.auto_model = self.model_size == 'auto'
+        
+        # Two-pass mode: fast draft model first, then refinement with model_size
+        self.transcription_mode = os.getenv('TRANSCRIPTION_MODE', 'single')
+        self.draft_model_size = os.getenv('DRAFT_MODEL_SIZE', 'base')
+        self.refine_window_seconds = float(os.getenv('REFINE_WINDOW_SECONDS', '240'))
+        logger.info(f"Transcription mode: {self.transcription_mode}")
+        
+        # ASR batch size from free memory, learned per host/model (see batch_sizing)
+        self.batch_profile = BatchProfile(os.getenv(
+            'BATCH_PROFILE_PATH',
+            data_path('batch_profile.json')
+        ))
+        self.batch_sizers: Dict[str, BatchSizer] = {}
+        
+        # Near-duplicate detection before ASR
+        self.dedup_enabled = os.getenv('DEDUP_ENABLED', '1') == '1'
+        
+        # Canonical 16kHz mono copy of each upload, written in the background after the first decode
+        self.canonical_codec = canonical_codec()
+        self.ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest')
+        self.dedup_min_matches = int(os.getenv('DEDUP_MIN_MATCHES', '50'))
+        self.dedup_min_density = float(os.getenv('DEDUP_MIN_DENSITY', '0.05'))
+        self.pending_fingerprints: Dict[str, tuple] = {}
+        
+        # Map-reduce of long recordings across the fleet (see chunked_jobs)
+        self.chunk_min_seconds = float(os.getenv('CHUNK_JOB_MIN_SECONDS', '0'))
+        self.chunk_seconds = float(os.getenv('CHUNK_SECONDS', '600'))
+        self.chunk_overlap_seconds = float(os.getenv('CHUNK_OVERLAP_SECONDS', '5'))
+        self.chunk_speaker_threshold = float(os.getenv('CHUNK_SPEAKER_THRESHOLD', '0.5'))
+        self.chunk_deadline_seconds = float(os.getenv('CHUNK_DEADLINE_SECONDS', '1800'))
+        self.chunk_max_attempts = int(os.getenv('CHUNK_MAX_ATTEMPTS', '3'))
+        
+        # Per-job profiler (NullProfiler unless the job asks for profiling)
+        self.profiler = NullProfiler()
+        
+        # Lazy-loaded models
+        self.whisper_model = None
+        self.draft_model = None
+        self.align_model = None
+        self.align_metadata = None
+        self.diarize_model = None
+        self.current_language = None
+        self.diarization_runner: Optional[DiarizationRunner] = None
+        self._diarization_lock = threading.Lock()
+        
+        # Control plane state (see run_async)
+        self.worker_id = os.getenv('WORKER_ID', f"{socket.gethostname()}-{os.getpid()}")
+        self.heartbeat_interval = float(os.getenv('WORKER_HEARTBEAT_SECONDS', '10'))
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job')
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stop_event: Optional[asyncio.Event] = None
+        self.pending: Dict[str, list] = {}
+        self.cancel_events: Dict[str, threading.Event] = {}
+        self.subtasks: Dict[str, str] = {}  # running chunk task → parent job (progress goes to the parent)
+        self.current_job: Optional[Dict[str, Any]] = None
+        self.background_tasks: Dict[str, asyncio.Task] = {}  # control commands (calibrate, recorrect)
+        self._recorrection_lock = threading.Lock()  # recorrect and backfill share the term index dictionary
+        self.leases: Set[str] = set()  # fleet-wide control command leases held here (see _run_leased)
+        self._sequence = itertools.count()
+        
+        # Connections, device probe, dictionary and model loading (see _startup)
+        self.redis_client = None
+        self.startup_phases: Dict[str, float] = {}
+        self.health_file = os.getenv('WORKER_HEALTH_FILE')
+        self._set_readiness('starting')
+        try:
+            self._startup()
+        except Exception as e:
+            self._set_readiness('failed', error=str(e))
+            raise
+        
+        # Graceful shutdown handling
+        self.running = True
+        self.draining = False
+        signal.signal(signal.SIGINT, self._shutdown_handler)
+        signal.signal(signal.SIGTERM, self._shutdown_handler)
+        
+        logger.info(
+            f"Worker initialization complete in {time.time() - PROCESS_START:.1f}s "
+            f"(phases: {', '.join(f'{k}={v:.2f}s' for k, v in self.startup_phases.items())})"
+        )
+    
+    def _startup(self):
+        """
+        Run independent start-up phases concurrently: Redis, S3, dictionary and
+        search index in parallel with the CUDA probe, which gates model preloading
+        """
+        parallel = os.getenv('WORKER_PARALLEL_INIT', '1') == '1'
+        preload = os.getenv('WORKER_PRELOAD_MODELS', '1') == '1'
+        
+        with ThreadPoolExecutor(max_workers=6 if parallel else 1, thread_name_prefix='startup') as pool:
+            device_ready = pool.submit(self._timed_phase, 'device', self._init_device)
+            futures = [
+                device_ready,
+                pool.submit(self._timed_phase, 'redis', self._init_redis),
+                pool.submit(self._timed_phase, 's3', self._init_s3),
+                pool.submit(self._timed_phase, 'dictionary', self._init_dictionary),
+                pool.submit(self._timed_phase, 'search_index', self._init_search_index),
+            ]
+            if preload:
+                models_ready = device_ready
+                if self.auto_model:
+                    # The benchmark needs the device to itself: the other models load after it
+                    models_ready = pool.submit(self._after, device_ready, 'calibration', self._calibrate_model)
+                    futures.append(models_ready)
+                futures += [
+                    pool.submit(self._after, models_ready, 'whisper_model', self._preload_whisper_models),
+                    pool.submit(self._after, models_ready, 'align_model', self._load_align_model, 'ja'),
+                    pool.submit(self._after, models_ready, 'diarize_model', self._preload_diarization),
+                ]
+            for future in futures:
+                future.result()
+        
+        self.startup_phases['total'] = time.time() - PROCESS_START
+    
+    def _timed_phase(self, name: str, fn: Callable, *args):
+        """Run one start-up phase and record its duration"""
+        start = time.time()
+        result = fn(*args)
+        self.startup_phases[name] = time.time() - start
+        return result
+    
+    def _after(self, dependency: Future, name: str, fn: Callable, *args):
+        """Run a start-up phase once the phase it depends on has finished"""
+        dependency.result()
+        return self._timed_phase(name, fn, *args)
+    
+    def _init_redis(self):
+        """Initialize Redis"""
         redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
         self.redis_client = redis.Redis.from_url(
             redis_url,
             decode_responses=True
         )
+        self.redis_client.ping()
         logger.info(f"Connected to Redis: {redis_url}")
-        
-        # Initialize S3/MinIO client
+    
+    def _init_s3(self):
+        """Initialize S3/MinIO client"""
         self.s3_client = boto3.client(
             's3',
             endpoint_url=os.getenv('S3_ENDPOINT'),
@@ -113,41 +363,106 @@ class WhisperXTranscriptionWorker:
         )
         self.s3_bucket = os.getenv('S3_BUCKET', 'medical-transcription')
         logger.info(f"Connected to S3: {os.getenv('S3_ENDPOINT')}")
-        
-        # Check GPU availability
+    
+    def _init_device(self):
+        """Check GPU availability"""
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         if self.device == "cpu":
-            raise RuntimeError(
-                "WhisperX requires CUDA GPU. CPU mode is not supported. "
-                "Please ensure NVIDIA GPU with CUDA 11.8+ is available."
-            )
+            if os.getenv('WORKER_ALLOW_CPU', '0') != '1':
+                raise RuntimeError(
+                    "WhisperX requires CUDA GPU. CPU mode is not supported. "
+                    "Please ensure NVIDIA GPU with CUDA 11.8+ is available "
+                    "(or set WORKER_ALLOW_CPU=1 on CPU-only hosts)."
+                )
+            self._configure_cpu()
+            return
         
         logger.info(f"Using device: {self.device}")
         logger.info(f"CUDA available: {torch.cuda.is_available()}")
         logger.info(f"GPU: {torch.cuda.get_device_name(0)}")
         logger.info(f"VRAM: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
+    
+    def _configure_cpu(self):
+        """CPU-only host: CTranslate2 has no float16 kernels on CPU, use the calibrated CPU type or int8"""
+        if not self.auto_model:
+            self.compute_type = calibrated_compute_type(self.device, self.model_size) or "int8"
+        logger.warning(f"No CUDA GPU: running on CPU ({os.cpu_count()} cores, compute type {self.compute_type})")
+    
+    def _init_dictionary(self):
+        """Load medical dictionary and compile a prefilter for correction"""
+        terms = self._load_medical_dictionary()
+        # One attribute swapped in one step: readers always get a matching (terms, pattern) pair
+        self.dictionary = (terms, compile_corrections(terms))
+        logger.info(f"Loaded {len(terms)} medical terms")
+    
+    @property
+    def medical_dict(self) -> Dict[str, str]:
+        """Current medical dictionary (misrecognition → correct term)"""
+        return self.dictionary[0]
+    
+    def _init_search_index(self):
+        """Open the search/term/fingerprint indexes and the segment store, updated as each job completes"""
+        search_index_path = os.getenv(
+            'SEARCH_INDEX_PATH',
+            data_path('transcript_search.db')
+        )
+        self.search_index = TranscriptSearchIndex(search_index_path)
+        logger.info(f"Search index: {search_index_path}")
         
-        # Model configuration
-        self.model_size = os.getenv('WHISPER_MODEL_SIZE', 'large-v2')
-        self.compute_type = "float16"  # GPU optimization
-        
-        # Lazy-loaded models
-        self.whisper_model = None
-        self.align_model = None
-        self.align_metadata = None
-        self.diarize_model = None
-        self.current_language = None
-        
-        # Load medical dictionary
-        self.medical_dict = self._load_medical_dictionary()
-        logger.info(f"Loaded {len(self.medical_dict)} medical terms")
+        term_index_path = os.getenv(
+            'TERM_INDEX_PATH',
+            data_path('term_index.db')
+        )
+        self.term_index = TermIndex(term_index_path)
+        logger.info(f"Term index: {term_index_path}")
         
-        # Graceful shutdown handling
-        self.running = True
-        signal.signal(signal.SIGINT, self._shutdown_handler)
-        signal.signal(signal.SIGTERM, self._shutdown_handler)
+        fingerprint_index_path = os.getenv(
+            'FINGERPRINT_INDEX_PATH',
+            data_path('fingerprints.db')
+        )
+        self.fingerprint_index = FingerprintIndex(fingerprint_index_path)
+        logger.info(f"Fingerprint index: {fingerprint_index_path}")
         
-        logger.info("Worker initialization complete")
+        segment_store_path = os.getenv(
+            'SEGMENT_STORE_PATH',
+            data_path('segments.db')
+        )
+        self.segment_store = SegmentStore(segment_store_path)
+        logger.info(f"Segment store: {segment_store_path}")
+    
+    def _preload_whisper_models(self):
+        """Load the ASR model(s) the configured mode will use"""
+        self._load_whisper_model()
+        if self.transcription_mode == 'two_pass':
+            self._load_draft_model()
+    
+    def _set_readiness(self, state: str, **extra):
+        """
+        Publish readiness (starting|ready|failed|stopped) with start-up phase
+        timings to worker:{id}:ready and, if configured, WORKER_HEALTH_FILE
+        """
+        payload = json.dumps({
+            'workerId': self.worker_id,
+            'state': state,
+            'phases': self.startup_phases,
+            'uptime': time.time() - PROCESS_START,
+            'timestamp': time.time(),
+            **extra
+        })
+        if self.health_file:
+            try:
+                tmp_path = f"{self.health_file}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.health_file)
+            except OSError as e:
+                logger.warning(f"Failed to write health file: {e}")
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(f"worker:{self.worker_id}:ready", payload)
+            except redis.RedisError as e:
+                logger.warning(f"Failed to publish readiness: {e}")
+        logger.info(f"Readiness: {state}")
     
     def _validate_environment(self):
         """Validate required environment variables"""
@@ -160,6 +475,9 @@ class WhisperXTranscriptionWorker:
             'S3_BUCKET': 'S3 bucket name',
         }
         
+        if os.getenv('WHISPER_MODEL_SIZE') == 'auto':
+            required_vars['CALIBRATION_CLIP'] = 'Speech recording to calibrate WHISPER_MODEL_SIZE=auto on'
+        
         missing = []
         for var, description in required_vars.items():
             if not os.getenv(var):
@@ -171,30 +489,139 @@ class WhisperXTranscriptionWorker:
             raise ValueError(error_msg)
     
     def _shutdown_handler(self, signum, frame):
-        """Handle graceful shutdown"""
-        logger.info(f"Received signal {signum}, shutting down gracefully...")
-        self.running = False
+        """Handle graceful shutdown: drain first, cancel the running job on a second signal"""
+        if not self.draining:
+            logger.info(f"Received signal {signum}, draining (finishing current job)...")
+            self._request_drain()
+        else:
+            logger.info(f"Received signal {signum} again, cancelling current job...")
+            self.running = False
+            if self.current_job:
+                self._cancel(job_id=self.current_job.get('jobId'))
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake_loop)
+    
+    def _request_drain(self):
+        """Stop taking new jobs; exit once the running job has finished"""
+        self.draining = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake_loop)
+    
+    def _wake_loop(self):
+        """Wake the job consumer so it notices draining/shutdown"""
+        if self.draining and self.current_job is None and self.stop_event is not None:
+            self.stop_event.set()
+    
+    def _cancel(self, job_id: Optional[str] = None, file_id: Optional[str] = None) -> bool:
+        """
+        Cancel a queued or running job by job ID or file ID (chunk tasks
+        also by their parent job ID)
+        
+        Returns:
+            True if a matching job was found
+        """
+        found = False
+        for pending_id, entry in list(self.pending.items()):
+            job_data = entry[2]
+            parent_id = job_data.get('parentJobId')
+            if pending_id == job_id or (job_id and parent_id == job_id) or (file_id and job_data.get('fileId') == file_id):
+                entry[3] = False
+                del self.pending[pending_id]
+                logger.info(f"Removed queued job {pending_id}")
+                found = True
+        current = self.current_job
+        if current and (
+            current.get('jobId') == job_id
+            or (job_id and current.get('parentJobId') == job_id)
+            or (file_id and current.get('fileId') == file_id)
+        ):
+            event = self.cancel_events.get(current.get('jobId'))
+            if event is not None:
+                event.set()
+                logger.info(f"Cancellation requested for running job {current.get('jobId')}")
+                found = True
+        return found
+    
+    def _check_cancelled(self, job_id: str):
+        """Raise JobCancelledError if the job has been cancelled (called between chunks/stages)"""
+        event = self.cancel_events.get(job_id)
+        if event is not None and event.is_set():
+            raise JobCancelledError(f"Job {job_id} cancelled")
     
     def _load_medical_dictionary(self) -> Dict[str, str]:
-        """Load medical term correction dictionary"""
+        """Load medical term correction dictionary (misrecognition → correct term)"""
         dict_path = project_root / 'medical-transcription' / 'medical_dictionary.json'
         if dict_path.exists():
             with open(dict_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                data = json.load(f)
+            # Categorized dictionary: corrections live under "corrections"
+            if isinstance(data.get('corrections'), dict):
+                return data['corrections']
+            return {k: v for k, v in data.items() if isinstance(v, str)}
         logger.warning(f"Medical dictionary not found at {dict_path}")
         return {}
     
     def _load_whisper_model(self):
         """Load WhisperX model (lazy loading)"""
+        if self.model_size == 'auto':
+            self._calibrate_model()
         if self.whisper_model is None:
             logger.info(f"Loading WhisperX model: {self.model_size}...")
             self.whisper_model = whisperx.load_model(
                 self.model_size,
                 device=self.device,
-                compute_type=self.compute_type
+                compute_type=self.compute_type,
+                **self._asr_thread_options()
             )
             logger.info("WhisperX model loaded successfully")
     
+    def _calibrate_model(self, force: bool = False):
+        """
+        Use the calibrated model size and compute type for this host,
+        benchmarking the candidates first if there is no profile (or force)
+        
+        Args:
+            force: Recalibrate even if this host has already been calibrated
+        """
+        def load_model(model_size: str, compute_type: str):
+            return whisperx.load_model(model_size, device=self.device, compute_type=compute_type)
+        
+        def transcribe(model, audio):
+            return model.transcribe(audio, batch_size=16, language="ja")
+        
+        def unload():
+            if self.device == "cuda":
+                torch.cuda.empty_cache()
+        
+        entry = auto_configure(self.device, load_model, transcribe, unload=unload, force=force)
+        if not self.auto_model:
+            logger.info(
+                f"Calibration suggests {entry['model_size']}/{entry['compute_type']}; "
+                f"keeping WHISPER_MODEL_SIZE={self.model_size}"
+            )
+            return
+        if (entry['model_size'], entry['compute_type']) != (self.model_size, self.compute_type):
+            logger.info(f"Using calibrated model {entry['model_size']} ({entry['compute_type']})")
+            self.model_size = entry['model_size']
+            self.compute_type = entry['compute_type']
+            self.whisper_model = None
+            self.draft_model = None
+            self.batch_sizers.clear()
+    
+    def _load_draft_model(self):
+        """Load the small WhisperX model used for two-pass drafts (lazy loading)"""
+        if self.model_size == 'auto':
+            self._calibrate_model()
+        if self.draft_model is None:
+            logger.info(f"Loading WhisperX draft model: {self.draft_model_size}...")
+            self.draft_model = whisperx.load_model(
+                self.draft_model_size,
+                device=self.device,
+                compute_type=self.compute_type,
+                **self._asr_thread_options()
+            )
+            logger.info("WhisperX draft model loaded successfully")
+    
     def _load_align_model(self, language_code: str):
         """Load alignment model for word-level timestamps"""
         if self.align_model is None or self.current_language != language_code:
@@ -217,14 +644,52 @@ class WhisperXTranscriptionWorker:
             )
             logger.info("Diarization model loaded successfully")
     
-    def transcribe(self, audio_path: str, job_id: str) -> Dict[str, Any]:
+    def _diarization(self) -> DiarizationRunner:
+        """Diarization executor (created on first use; its pipeline loads lazily)"""
+        with self._diarization_lock:
+            if self.diarization_runner is None:
+                def load_pipeline():
+                    self._load_diarize_model()
+                    return self.diarize_model
+                
+                self.diarization_runner = DiarizationRunner(load_pipeline, device=self.device)
+            return self.diarization_runner
+    
+    def _preload_diarization(self):
+        """Load the diarization pipeline where it runs (a child process with DIARIZATION_EXECUTOR=process)"""
+        self._diarization().warmup()
+    
+    def _asr_thread_options(self) -> Dict[str, Any]:
+        """whisperx.load_model options leaving CPU cores to the concurrent diarization"""
+        threads = self._diarization().asr_threads
+        return {'threads': threads} if threads else {}
+    
+    def _join_diarization(self, diarization: Future, job_id: str) -> tuple:
+        """Wait for the diarization started with ASR, still honouring cancellation"""
+        while True:
+            try:
+                return diarization.result(timeout=0.5)
+            except FutureTimeoutError:
+                self._check_cancelled(job_id)
+    
+    def transcribe(
+        self,
+        audio_path: str,
+        job_id: str,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+        audio=None,
+        dedup: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Transcribe audio file with speaker diarization
         
         Args:
             audio_path: Path to audio file
             job_id: Job ID for progress tracking
-            
+            on_partial: Called with each intermediate transcript in two_pass mode
+            audio: Already decoded audio (16kHz); skips loading audio_path
+            dedup: De-duplication plan from _plan_deduplication (reuse an earlier transcript)
+        
         Returns:
             Dictionary containing transcription results
         """
@@ -233,112 +698,502 @@ class WhisperXTranscriptionWorker:
         
         try:
             # Phase 1: Load audio (10%)
-            self._publish_progress(job_id, 10, "音声ファイル読み込み中...")
-            audio = whisperx.load_audio(audio_path)
+            if audio is None:
+                self._publish_progress(job_id, 10, "音声ファイル読み込み中...")
+                self.profiler.mark('load_audio')
+                audio = self._load_audio(audio_path)
             audio_duration = len(audio) / 16000.0  # 16kHz sample rate
             logger.info(f"Audio loaded: {audio_duration:.1f}s duration")
             
-            # Phase 2: Transcribe (20-50%)
-            self._publish_progress(job_id, 20, "文字起こし処理中（Whisper）...")
-            self._load_whisper_model()
-            
-            result = self.whisper_model.transcribe(
-                audio,
-                batch_size=16,  # GPU optimization
-                language="ja"   # Japanese (or auto-detect)
-            )
-            
-            logger.info(f"Transcription complete: {len(result.get('segments', []))} segments")
-            
-            # Phase 3: Align for word-level timestamps (50-70%)
-            self._publish_progress(job_id, 50, "単語レベルアライメント中...")
-            language_code = result.get("language", "ja")
-            self._load_align_model(language_code)
-            
-            result = whisperx.align(
-                result["segments"],
-                self.align_model,
-                self.align_metadata,
-                audio,
-                device=self.device
+            # Phases 2-4: ASR, alignment, diarization
+            result, two_pass_stats = self._recognize(
+                audio, audio_duration, job_id, start_time, on_partial=on_partial, dedup=dedup
             )
             
-            logger.info("Word-level alignment complete")
-            
-            # Phase 4: Speaker diarization (70-85%)
-            self._publish_progress(job_id, 70, "話者分離処理中（pyannote）...")
-            self._load_diarize_model()
-            
-            diarize_segments = self.diarize_model(audio)
-            result = whisperx.assign_word_speakers(diarize_segments, result)
-            
-            logger.info("Speaker diarization complete")
-            
-            # Phase 5: Medical term correction (85-95%)
-            self._publish_progress(job_id, 85, "医療用語補正中...")
-            corrected_text, corrections = self._apply_medical_corrections(result)
-            
-            logger.info(f"Applied {len(corrections)} medical corrections")
-            
-            # Phase 6: Format results (95-100%)
-            self._publish_progress(job_id, 95, "結果整形中...")
-            
-            output = {
-                "language": language_code,
-                "text": corrected_text,
-                "segments": result.get("segments", []),
-                "word_segments": result.get("word_segments", []),
-                "speakers": self._extract_speakers(result),
-                "corrections": corrections,
-                "duration": audio_duration,
-                "model": self.model_size,
-                "processing_time": time.time() - start_time,
-            }
-            
-            # Calculate confidence score
-            confidence_scores = [
-                seg.get("score", 0.0) 
-                for seg in result.get("segments", [])
-                if "score" in seg
-            ]
-            if confidence_scores:
-                output["confidence"] = sum(confidence_scores) / len(confidence_scores)
+            # Phases 5-6: Medical term correction, formatting
+            output = self._format_output(result, audio_duration, start_time, job_id)
+            if two_pass_stats is not None:
+                output["two_pass"] = two_pass_stats
+            if dedup is not None:
+                output["dedup"] = dedup["stats"]
+            # Final result supersedes every partial transcript published so far
+            output["version"] = (two_pass_stats["partial_versions"] if two_pass_stats else 0) + 1
             
             logger.info(f"Transcription complete in {output['processing_time']:.1f}s")
             self._publish_progress(job_id, 100, "完了")
             
             return output
-            
+        
+        except JobCancelledError:
+            raise
         except Exception as e:
             logger.error(f"Transcription failed for job {job_id}: {e}", exc_info=True)
             self._publish_error(job_id, str(e))
             raise
     
-    def _apply_medical_corrections(self, result: Dict) -> tuple[str, List[str]]:
+    def _recognize(
+        self,
+        audio,
+        audio_duration: float,
+        job_id: str,
+        start_time: float,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+        dedup: Optional[Dict[str, Any]] = None,
+        speaker_embeddings: bool = False
+    ) -> tuple:
         """
-        Apply medical term corrections to transcription
+        ASR, word alignment and speaker diarization of decoded audio
         
         Args:
-            result: WhisperX result dictionary
+            audio: Decoded audio (16kHz)
+            audio_duration: Audio duration in seconds
+            job_id: Job ID for progress and cancellation
+            start_time: Job start (two_pass draft timing)
+            on_partial: Called with each intermediate transcript in two_pass mode
+            dedup: De-duplication plan (ASR only on its asr_regions)
+            speaker_embeddings: Also return diarization speaker embeddings
+                (result["speaker_embeddings"], used to match speakers across chunks)
+        
+        Returns:
+            Tuple of (aligned result with speakers and "language", two_pass stats or None)
+        """
+        # Diarization needs only the audio: it runs while ASR and alignment work
+        diarization = self._diarization().submit(audio, return_embeddings=speaker_embeddings)
+        try:
+            return self._recognize_speech(
+                audio, audio_duration, job_id, start_time, diarization, on_partial, dedup
+            )
+        finally:
+            # Stops the diarization if ASR failed or was cancelled (a running one too)
+            diarization.cancel()
+    
+    def _recognize_speech(
+        self,
+        audio,
+        audio_duration: float,
+        job_id: str,
+        start_time: float,
+        diarization: Future,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]],
+        dedup: Optional[Dict[str, Any]]
+    ) -> tuple:
+        """ASR and alignment of _recognize, joined with the concurrent diarization"""
+        # Phase 2: Transcribe (20-50%)
+        self.profiler.mark('asr')
+        two_pass_stats = None
+        if self.transcription_mode == 'two_pass' and dedup is None and on_partial is not None:
+            result, two_pass_stats = self._transcribe_two_pass(
+                audio, audio_duration, job_id, start_time, on_partial
+            )
+        else:
+            self._publish_progress(job_id, 20, "文字起こし処理中（Whisper）...")
+            
+            if dedup is None:
+                segments = []
+                windows = split_audio(audio, window_seconds=self.refine_window_seconds)
+            else:
+                segments = dedup["reused_segments"]
+                windows = self._windows_for_regions(audio, dedup["asr_regions"])
+            if windows:
+                self._load_whisper_model()
             
+            # Window by window so a cancelled job stops within one window
+            language = "ja"
+            for window in windows:
+                self._check_cancelled(job_id)
+                window_segments, language = self._transcribe_window(
+                    self.whisper_model, self.model_size, audio, window
+                )
+                segments.extend(window_segments)
+            segments.sort(key=lambda seg: seg["start"])
+            result = {"segments": segments, "language": language}
+        
+        logger.info(f"Transcription complete: {len(result.get('segments', []))} segments")
+        self._check_cancelled(job_id)
+        
+        # Phase 3: Align for word-level timestamps (50-70%)
+        self._publish_progress(job_id, 50, "単語レベルアライメント中...")
+        self.profiler.mark('align')
+        language_code = result.get("language", "ja")
+        self._load_align_model(language_code)
+        
+        result = self._align_segments(result["segments"], audio, job_id)
+        result["language"] = language_code
+        
+        logger.info("Word-level alignment complete")
+        self._check_cancelled(job_id)
+        
+        # Phase 4: Speaker diarization (70-85%), joined at word-speaker assignment
+        self._publish_progress(job_id, 70, "話者分離処理中（pyannote）...")
+        self.profiler.mark('diarize')
+        wait_start = time.time()
+        diarize_segments, embeddings = self._join_diarization(diarization, job_id)
+        result = whisperx.assign_word_speakers(diarize_segments, result)
+        if embeddings:
+            # Without embeddings (whisperx before 3.3) chunks fall back to overlap voting
+            result["speaker_embeddings"] = embeddings
+        
+        logger.info(f"Speaker diarization complete (waited {time.time() - wait_start:.1f}s after alignment)")
+        self._check_cancelled(job_id)
+        return result, two_pass_stats
+    
+    def _format_output(
+        self,
+        result: Dict[str, Any],
+        audio_duration: float,
+        start_time: float,
+        job_id: str
+    ) -> Dict[str, Any]:
+        """
+        Apply medical corrections and build the stored transcript document
+        
+        Args:
+            result: Aligned, diarized result with "language"
+            audio_duration: Audio duration in seconds
+            start_time: Job start (processing_time)
+            job_id: Job ID for progress
+        
         Returns:
-            Tuple of (corrected_text, list_of_corrections)
+            Transcript document (without "version")
+        """
+        # Phase 5: Medical term correction (85-95%)
+        self._publish_progress(job_id, 85, "医療用語補正中...")
+        self.profiler.mark('correction')
+        segments, corrected_text, corrections = self._apply_medical_corrections(result.get("segments", []))
+        
+        logger.info(f"Applied {len(corrections)} medical corrections")
+        
+        # Phase 6: Format results (95-100%)
+        self._publish_progress(job_id, 95, "結果整形中...")
+        self.profiler.mark('format')
+        
+        output = {
+            "language": result.get("language", "ja"),
+            "text": corrected_text,
+            "segments": segments,
+            "word_segments": result.get("word_segments", []),
+            "speakers": self._extract_speakers(result),
+            "corrections": corrections,
+            "duration": audio_duration,
+            "model": self.model_size,
+            "processing_time": time.time() - start_time,
+        }
+        
+        # Calculate confidence score
+        confidence_scores = [
+            seg.get("score", 0.0) 
+            for seg in result.get("segments", [])
+            if "score" in seg
+        ]
+        if confidence_scores:
+            output["confidence"] = sum(confidence_scores) / len(confidence_scores)
+        return output
+    
+    def _load_audio(self, audio_path: str):
+        """Decode to 16kHz mono in-process; formats libsndfile cannot read go through ffmpeg"""
+        return decode_audio(audio_path, fallback=whisperx.load_audio)
+    
+    def _transcribe_window(
+        self,
+        model,
+        model_size: str,
+        audio,
+        window: AudioWindow
+    ) -> tuple[List[Dict], str]:
         """
-        full_text = ""
-        corrections = []
+        Transcribe one window and shift its timestamps to absolute time.
+        The batch size adapts to free memory; on out-of-memory the window is
+        retried with half the batch size.
         
+        Args:
+            model: Loaded WhisperX pipeline
+            model_size: Model name (selects the batch sizing profile)
+            audio: Full decoded audio (16kHz)
+            window: Window to transcribe
+        
+        Returns:
+            Tuple of (segments, detected_language)
+        """
+        result = self._batch_sizer(model_size).run(
+            lambda batch_size: model.transcribe(
+                audio[window.start:window.end],
+                batch_size=batch_size,
+                language="ja"
+            ),
+            stage=f"asr ({model_size}, window {window.index})"
+        )
+        offset = window.start_time
+        segments = []
         for segment in result.get("segments", []):
-            text = segment.get("text", "")
+            segment = dict(segment)
+            segment["start"] = segment["start"] + offset
+            segment["end"] = segment["end"] + offset
+            segments.append(segment)
+        return segments, result.get("language", "ja")
+    
+    def _batch_sizer(self, model_size: str) -> BatchSizer:
+        """Batch sizer for a model on this worker's device (created on first use)"""
+        if model_size not in self.batch_sizers:
+            free_memory_mb, on_out_of_memory = None, None
+            if self.device == "cuda":
+                free_memory_mb = lambda: torch.cuda.mem_get_info()[0] / 2**20
+                on_out_of_memory = torch.cuda.empty_cache
+            sizer = BatchSizer(
+                model_size,
+                self.device,
+                self.compute_type,
+                profile=self.batch_profile,
+                free_memory_mb=free_memory_mb,
+                on_out_of_memory=on_out_of_memory
+            )
+            logger.info(f"Batch size for {model_size}: {sizer.choose()} ({sizer.key})")
+            self.batch_sizers[model_size] = sizer
+        return self.batch_sizers[model_size]
+    
+    def _plan_deduplication(
+        self,
+        file_id: str,
+        audio,
+        audio_duration: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Fingerprint the decoded audio and look for an already transcribed
+        recording that overlaps it (re-encoded copy, or one containing the other)
+        
+        Args:
+            file_id: File ID of this upload (excluded from matching)
+            audio: Decoded audio (16kHz)
+            audio_duration: Audio duration in seconds
+        
+        Returns:
+            None if no usable match, else {"reused_segments", "asr_regions", "stats"}
+            where asr_regions are the (start, end) seconds still needing ASR
+        """
+        start = time.time()
+        hashes, times = fingerprint(audio)
+        self.pending_fingerprints[file_id] = (hashes, times, audio_duration)
+        matches = self.fingerprint_index.match(
+            hashes, times, min_matches=self.dedup_min_matches, exclude_file_id=file_id
+        )
+        logger.info(f"Fingerprinted {len(hashes)} hashes in {time.time() - start:.1f}s, {len(matches)} candidates")
+        
+        for match in matches:
+            if match.density < self.dedup_min_density:
+                continue
+            source = self._load_stored_transcript(match.file_id)
+            if source is None:
+                continue
             
-            # Apply dictionary corrections
-            for wrong, correct in self.medical_dict.items():
-                if wrong in text:
-                    text = text.replace(wrong, correct)
-                    corrections.append(f"{wrong} → {correct}")
+            # Segments of the source that fall inside the matched span, in this recording's time
+            reused = []
+            for segment in source.get("segments", []):
+                seg_start = segment["start"] - match.offset
+                seg_end = segment["end"] - match.offset
+                if seg_start >= match.query_start - 1.0 and seg_end <= match.query_end + 1.0:
+                    reused.append({
+                        "text": segment.get("original_text", segment.get("text", "")),
+                        "start": max(0.0, seg_start),
+                        "end": min(audio_duration, seg_end),
+                    })
+            if not reused:
+                continue
+            
+            covered_start, covered_end = reused[0]["start"], reused[-1]["end"]
+            regions = [
+                (region_start, region_end)
+                for region_start, region_end in [(0.0, covered_start), (covered_end, audio_duration)]
+                if region_end - region_start >= 1.0
+            ]
+            stats = {
+                "source_file_id": match.file_id,
+                "offset": match.offset,
+                "matches": match.matches,
+                "density": match.density,
+                "reused_segments": len(reused),
+                "reused_seconds": covered_end - covered_start,
+                "asr_seconds": sum(end - begin for begin, end in regions),
+            }
+            logger.info(
+                f"Near-duplicate of file {match.file_id}: reusing {len(reused)} segments "
+                f"({stats['reused_seconds']:.0f}s), ASR on {stats['asr_seconds']:.0f}s"
+            )
+            return {"reused_segments": reused, "asr_regions": regions, "stats": stats}
+        return None
+    
+    def _windows_for_regions(self, audio, regions: List[tuple]) -> List[AudioWindow]:
+        """Silence-aligned windows covering only the given (start, end) second ranges"""
+        windows = []
+        for region_start, region_end in regions:
+            offset = int(region_start * 16000)
+            for window in split_audio(audio[offset:int(region_end * 16000)], window_seconds=self.refine_window_seconds):
+                windows.append(AudioWindow(len(windows), window.start + offset, window.end + offset))
+        return windows
+    
+    def _align_segments(self, segments: List[Dict], audio, job_id: str) -> Dict[str, Any]:
+        """
+        Align segments in length-bucketed batches on a thread pool (see
+        batched_alignment), checking for cancellation between segments. Segments
+        are aligned independently, so the result equals a single whisperx.align call.
+        
+        Args:
+            segments: Transcribed segments (absolute timestamps)
+            audio: Decoded audio (16kHz)
+            job_id: Job ID for cancellation checks
+        
+        Returns:
+            WhisperX alignment result with "segments" and "word_segments"
+        """
+        # Align the ASR text: corrections are applied afterwards, from original_text
+        segments = [
+            dict(segment, text=segment["original_text"]) if "original_text" in segment else segment
+            for segment in segments
+        ]
+        aligner = BatchedAligner(
+            lambda group: whisperx.align(
+                group,
+                self.align_model,
+                self.align_metadata,
+                audio,
+                device=self.device
+            ),
+            device=self.device
+        )
+        return aligner.align(segments, check_cancelled=lambda: self._check_cancelled(job_id))
+    
+    def _transcribe_two_pass(
+        self,
+        audio,
+        audio_duration: float,
+        job_id: str,
+        start_time: float,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]]
+    ) -> tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Draft the whole recording with the small model, then refine it window
+        by window with the large model. Both passes share the decoded audio and
+        the same silence-aligned windows.
+        
+        Args:
+            audio: Decoded audio (16kHz)
+            audio_duration: Audio duration in seconds
+            job_id: Job ID for progress tracking
+            start_time: Transcription start (time.time()) for latency stats
+            on_partial: Receives every intermediate transcript
+        
+        Returns:
+            Tuple of (WhisperX-style result, two-pass statistics)
+        """
+        windows = split_audio(audio, window_seconds=self.refine_window_seconds)
+        window_segments: List[List[Dict]] = [[] for _ in windows]
+        language = "ja"
+        version = 0
+        first_transcript_at = None
+        
+        def publish(model_name: str, refined: int):
+            nonlocal version, first_transcript_at
+            version += 1
+            if first_transcript_at is None:
+                first_transcript_at = time.time() - start_time
+            if on_partial is None:
+                return
+            # Corrected copies: the ASR segments go on to alignment and the final correction pass
+            segments, text, corrections = self._apply_medical_corrections(
+                [seg for segs in window_segments for seg in segs]
+            )
+            on_partial({
+                "language": language,
+                "text": text,
+                "segments": segments,
+                "word_segments": [],
+                "speakers": {},
+                "corrections": corrections,
+                "duration": audio_duration,
+                "model": model_name,
+                "draft": True,
+                "refined_windows": refined,
+                "total_windows": len(windows),
+                "version": version,
+            })
+        
+        # Draft pass: small model, published window by window
+        self._publish_progress(job_id, 20, f"下書き文字起こし中（{self.draft_model_size}）...")
+        self._load_draft_model()
+        draft_start = time.time()
+        for window in windows:
+            self._check_cancelled(job_id)
+            window_segments[window.index], language = self._transcribe_window(
+                self.draft_model, self.draft_model_size, audio, window
+            )
+            publish(self.draft_model_size, 0)
+        if not windows:
+            publish(self.draft_model_size, 0)
+        draft_seconds = time.time() - draft_start
+        logger.info(
+            f"Draft transcript ready after {first_transcript_at:.1f}s "
+            f"({len(windows)} windows, model {self.draft_model_size})"
+        )
+        draft_texts = ["".join(seg.get("text", "") for seg in segs) for segs in window_segments]
+        
+        # Refinement pass: large model replaces the draft window by window
+        self._publish_progress(job_id, 30, f"文字起こし精緻化中（{self.model_size}）...")
+        self._load_whisper_model()
+        refine_start = time.time()
+        for window in windows:
+            self._check_cancelled(job_id)
+            window_segments[window.index], language = self._transcribe_window(
+                self.whisper_model, self.model_size, audio, window
+            )
+            publish(self.model_size, window.index + 1)
+            self._publish_progress(
+                job_id,
+                30 + int(20 * (window.index + 1) / len(windows)),
+                f"文字起こし精緻化中（{window.index + 1}/{len(windows)}）..."
+            )
+        refine_seconds = time.time() - refine_start
+        
+        final_texts = ["".join(seg.get("text", "") for seg in segs) for segs in window_segments]
+        edits = sum(_edit_distance(ref, hyp) for ref, hyp in zip(final_texts, draft_texts))
+        reference_length = sum(len(text) for text in final_texts)
+        
+        stats = {
+            "draft_model": self.draft_model_size,
+            "windows": len(windows),
+            "partial_versions": version,
+            "time_to_first_transcript": first_transcript_at,
+            "draft_seconds": draft_seconds,
+            "refine_seconds": refine_seconds,
+            "draft_character_error_rate": edits / reference_length if reference_length else 0.0,
+        }
+        result = {
+            "segments": [seg for segs in window_segments for seg in segs],
+            "language": language,
+        }
+        return result, stats
+    
+    def _apply_medical_corrections(self, segments: List[Dict]) -> tuple[List[Dict], str, List[str]]:
+        """
+        Apply medical term corrections to copies of the segments (the input
+        segments are left as transcribed)
+        
+        Args:
+            segments: WhisperX segments
+        
+        Returns:
+            Tuple of (corrected_segments, corrected_text, list_of_corrections)
+        """
+        terms, pattern = self.dictionary  # one snapshot: a re-correction may swap it meanwhile
+        corrected = []
+        
+        for segment in segments:
+            # Keep the ASR text so corrections can be re-applied later (recorrection.py)
+            original = segment.get("original_text", segment.get("text", ""))
             
-            full_text += text + " "
+            # Apply dictionary corrections
+            text, applied = apply_corrections(original, terms, pattern)
+            corrected.append(dict(segment, original_text=original, text=text, corrections=applied))
         
-        return full_text.strip(), corrections
+        text, corrections = build_transcript_text(corrected)
+        return corrected, text, corrections
     
     def _extract_speakers(self, result: Dict) -> Dict[str, Any]:
         """
@@ -346,7 +1201,7 @@ class WhisperXTranscriptionWorker:
         
         Args:
             result: WhisperX result with speaker assignments
-            
+        
         Returns:
             Dictionary mapping speaker IDs to their utterances
         """
@@ -379,7 +1234,9 @@ class WhisperXTranscriptionWorker:
         return speakers
     
     def _publish_progress(self, job_id: str, progress: int, phase: str):
-        """Publish job progress to Redis pub/sub"""
+        """Publish job progress to Redis pub/sub (chunk tasks report per chunk to their parent instead)"""
+        if job_id in self.subtasks:
+            return
         message = {
             'jobId': job_id,
             'status': 'processing' if progress < 100 else 'completed',
@@ -401,6 +1258,99 @@ class WhisperXTranscriptionWorker:
         self.redis_client.publish('job:progress', json.dumps(message))
         logger.error(f"Job failed [{job_id}]: {error}")
     
+    def _publish_cancelled(self, job_id: str):
+        """Publish job cancellation to Redis pub/sub"""
+        message = {
+            'jobId': job_id,
+            'status': 'cancelled',
+            'timestamp': time.time()
+        }
+        self.redis_client.publish('job:progress', json.dumps(message))
+        logger.info(f"Job cancelled [{job_id}]")
+    
+    def recorrect_transcripts(self) -> Dict[str, Any]:
+        """
+        Reload the medical dictionary and re-correct only the stored transcript
+        segments affected by the change (no ASR)
+        
+        Returns:
+            Re-correction statistics
+        """
+        with self._recorrection_lock:
+            self._init_dictionary()
+            engine = RecorrectionEngine(self.term_index, self._load_stored_transcript, self._store_recorrected)
+            return engine.recorrect(self.medical_dict)
+    
+    def backfill_term_index(self) -> Dict[str, Any]:
+        """
+        Add every stored transcript missing from the term index (stored before
+        it existed), so recorrect reaches the whole archive
+        
+        Returns:
+            Backfill statistics
+        """
+        with self._recorrection_lock:
+            engine = RecorrectionEngine(self.term_index, self._load_stored_transcript, self._store_recorrected)
+            return engine.backfill(stored_transcript_ids(self.s3_client, self.s3_bucket), self.medical_dict)
+    
+    def _store_recorrected(self, file_id: str, transcript: Dict[str, Any]):
+        """Store a re-corrected transcript and refresh its search and segment store rows"""
+        self._store_transcript(None, file_id, transcript)
+        self.search_index.index_transcript(file_id, transcript)
+        self.segment_store.write_transcript(file_id, transcript)
+    
+    def _recalibrate(self):
+        """
+        Re-run calibration on demand (on the job executor, between jobs) and
+        reload the ASR models with the result
+        """
+        # Free the loaded models first: the benchmark must have the device to itself
+        reload = self.auto_model or self.whisper_model is not None
+        self.whisper_model = None
+        self.draft_model = None
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+        self._calibrate_model(force=True)
+        if reload:
+            self._preload_whisper_models()
+    
+    def _load_stored_transcript(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a stored transcript from S3 (None if it does not exist)"""
+        try:
+            obj = self.s3_client.get_object(Bucket=self.s3_bucket, Key=f"transcripts/{file_id}.json")
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return json.loads(obj['Body'].read())
+    
+    def _store_transcript(self, job_id: Optional[str], file_id: str, transcript: Dict[str, Any]):
+        """
+        Replace the stored transcript in a single S3 PUT so readers always see
+        one complete version, then announce the new version.
+        
+        Args:
+            job_id: Job ID
+            file_id: File ID (transcript key)
+            transcript: Transcript document including its "version"
+        """
+        transcript_key = f"transcripts/{file_id}.json"
+        version = transcript.get("version", 1)
+        logger.info(f"Uploading transcript to S3: {transcript_key} (version {version})")
+        self.s3_client.put_object(
+            Bucket=self.s3_bucket,
+            Key=transcript_key,
+            Body=json.dumps(transcript, ensure_ascii=False, indent=2),
+            ContentType='application/json',
+            Metadata={'version': str(version)}
+        )
+        message = {
+            'jobId': job_id,
+            'fileId': file_id,
+            'version': version,
+            'draft': transcript.get("draft", False),
+            'timestamp': time.time()
+        }
+        self.redis_client.publish('job:transcript', json.dumps(message))
+    
     def process_job(self, job_data: Dict[str, Any]):
         """
         Process a transcription job
@@ -408,34 +1358,80 @@ class WhisperXTranscriptionWorker:
         Args:
             job_data: Job data from Redis pub/sub
         """
+        if job_data.get('task') == 'chunk':
+            return self._process_chunk(job_data)
+        if job_data.get('task') == 'reduce':
+            return self._process_reduce(job_data)
+        
         job_id = job_data.get('jobId')
         file_id = job_data.get('fileId')
         s3_key = job_data.get('s3Key')
         
         logger.info(f"Processing job {job_id} for file {file_id}")
+        self.cancel_events.setdefault(job_id, threading.Event())
+        start_time = time.time()
+        
+        self.profiler = profiler_for_job(job_data)
+        self.profiler.start()
+        status = 'failed'
         
         try:
-            # Download audio from S3
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as tmp_file:
-                audio_path = tmp_file.name
-                logger.info(f"Downloading from S3: {s3_key}")
-                self.s3_client.download_file(self.s3_bucket, s3_key, audio_path)
+            # Download audio from S3 (the canonical copy if the upload has been ingested)
+            self.profiler.mark('download')
+            audio_path, ingest = self._download_audio(s3_key)
+            self._check_cancelled(job_id)
             
-            # Transcribe
-            result = self.transcribe(audio_path, job_id)
+            # Decode once; chunking, ingest and transcription share the samples
+            self._publish_progress(job_id, 10, "音声ファイル読み込み中...")
+            self.profiler.mark('load_audio')
+            decode_start = time.time()
+            audio = self._load_audio(audio_path)
+            ingest.decode_seconds = time.time() - decode_start
+            logger.info(
+                f"Audio from {ingest.source} object: {ingest.bytes / 1e6:.1f} MB, "
+                f"download {ingest.download_seconds:.2f}s, decode {ingest.decode_seconds:.2f}s"
+            )
+            canonical = None
+            if ingest.source == 'original' and self.canonical_codec:
+                canonical = self.ingest_executor.submit(self._store_canonical, s3_key, audio, ingest.bytes)
             
-            # Upload result to S3
-            transcript_key = f"transcripts/{file_id}.json"
-            logger.info(f"Uploading transcript to S3: {transcript_key}")
-            self.s3_client.put_object(
-                Bucket=self.s3_bucket,
-                Key=transcript_key,
-                Body=json.dumps(result, ensure_ascii=False, indent=2),
-                ContentType='application/json'
+            # Reuse an earlier transcript of the same recording if there is one; the
+            # fingerprint is indexed only once this job's transcript has been stored
+            dedup = None
+            if self.dedup_enabled and file_id:
+                self.profiler.mark('fingerprint')
+                dedup = self._plan_deduplication(file_id, audio, len(audio) / 16000.0)
+            
+            # Long recordings are handed to the whole fleet as chunk tasks (reusing a transcript is cheaper)
+            if dedup is None and self.chunk_min_seconds > 0 and len(audio) / 16000.0 >= self.chunk_min_seconds:
+                if self._split_job(job_data, audio, start_time):
+                    status = 'split'
+                    return
+            
+            # Transcribe (two_pass mode stores drafts as they are produced)
+            result = self.transcribe(
+                audio_path,
+                job_id,
+                on_partial=lambda partial: self._store_transcript(job_id, file_id, partial),
+                audio=audio,
+                dedup=dedup
             )
+            if canonical is not None:
+                # Encoded alongside ASR; its CPU time is part of what this upload cost
+                ingest.encode_seconds = canonical.result()
+            result["ingest"] = ingest.to_dict()
             
-            logger.info(f"Job {job_id} completed successfully")
+            # Upload result to S3, then the segment store and indexes
+            self.profiler.mark('store')
+            self._finalize_transcript(job_id, file_id, result)
             
+            logger.info(f"Job {job_id} completed successfully")
+            status = 'completed'
+        
+        except JobCancelledError:
+            status = 'cancelled'
+            self._publish_cancelled(job_id)
+            raise
         except Exception as e:
             logger.error(f"Job {job_id} failed: {e}", exc_info=True)
             raise
@@ -443,34 +1439,721 @@ class WhisperXTranscriptionWorker:
             # Cleanup temp file
             if 'audio_path' in locals() and os.path.exists(audio_path):
                 os.unlink(audio_path)
+            self.pending_fingerprints.pop(file_id, None)
+            self._store_profile(job_id, file_id, status)
+    
+    def _download_audio(self, s3_key: str) -> tuple:
+        """
+        Download a job's audio: the canonical copy if it exists, else the upload
+        
+        Args:
+            s3_key: S3 key of the upload
+        
+        Returns:
+            Tuple of (local file path, IngestStats without decode time)
+        """
+        start = time.time()
+        if self.canonical_codec:
+            key = canonical_key(s3_key, self.canonical_codec)
+            try:
+                obj = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)
+            except ClientError as e:
+                # Without s3:ListBucket a missing key is reported as 403 AccessDenied
+                status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+                if status not in (403, 404) and e.response.get('Error', {}).get('Code') != 'NoSuchKey':
+                    raise
+                obj = None
+            if obj is not None:
+                with tempfile.NamedTemporaryFile(suffix=Path(key).suffix, delete=False) as tmp_file:
+                    shutil.copyfileobj(obj['Body'], tmp_file)
+                    audio_path = tmp_file.name
+                original_bytes = obj.get('Metadata', {}).get('original-bytes')
+                return audio_path, IngestStats(
+                    'canonical', self.canonical_codec, os.path.getsize(audio_path),
+                    int(original_bytes) if original_bytes else None, time.time() - start
+                )
+        
+        suffix = Path(s3_key).suffix or '.mp3'
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
+            audio_path = tmp_file.name
+            logger.info(f"Downloading from S3: {s3_key}")
+            self.s3_client.download_file(self.s3_bucket, s3_key, audio_path)
+        size = os.path.getsize(audio_path)
+        return audio_path, IngestStats('original', self.canonical_codec, size, size, time.time() - start)
+    
+    def _store_canonical(self, s3_key: str, audio, original_bytes: int) -> Optional[float]:
+        """
+        Encode decoded audio and store it as the upload's canonical copy (ingest executor)
+        
+        Returns:
+            Encoding time in seconds (None if the copy could not be stored)
+        """
+        key = canonical_key(s3_key, self.canonical_codec)
+        try:
+            start = time.time()
+            data = encode_canonical(audio, self.canonical_codec)
+            encode_seconds = time.time() - start
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=key,
+                Body=data,
+                ContentType=CODECS[self.canonical_codec][3],
+                Metadata={'original-bytes': str(original_bytes), 'source-key': s3_key}
+            )
+            logger.info(
+                f"Stored canonical audio {key}: {len(data) / 1e6:.1f} MB "
+                f"({original_bytes / max(len(data), 1):.0f}x smaller than the upload), "
+                f"encoded in {encode_seconds:.1f}s"
+            )
+            # The file may have been deleted while encoding; do not leave an orphan behind
+            try:
+                self.s3_client.head_object(Bucket=self.s3_bucket, Key=s3_key)
+            except Exception:
+                self.s3_client.delete_object(Bucket=self.s3_bucket, Key=key)
+                logger.info(f"Upload {s3_key} was deleted; removed its canonical audio")
+            return encode_seconds
+        except Exception as e:
+            logger.warning(f"Failed to store canonical audio for {s3_key}: {e}")
+            return None
+    
+    def _finalize_transcript(self, job_id: str, file_id: str, result: Dict[str, Any]):
+        """
+        Store the final transcript, then update the segment store and indexes
+        
+        Runs under the re-correction lock: a dictionary reloaded since the job
+        corrected its segments is re-applied first, so the stored text and the
+        term index postings always agree with one dictionary.
+        """
+        with self._recorrection_lock:
+            segments, text, corrections = self._apply_medical_corrections(result.get("segments", []))
+            if text != result.get("text"):
+                logger.info(f"Dictionary changed during job {job_id}: re-corrected its transcript")
+                result.update(segments=segments, text=text, corrections=corrections)
+            self._store_transcript(job_id, file_id, result)
+            
+            # Segment store, search and re-correction indexes; a stale index must not fail the job
+            self.profiler.mark('index')
+            try:
+                self.segment_store.write_transcript(file_id, result)
+                self.search_index.index_transcript(file_id, result)
+                terms = self.medical_dict
+                if self.term_index.get_dictionary() is None:
+                    self.term_index.set_dictionary(terms)
+                self.term_index.index_transcript(file_id, result, terms)
+                if file_id in self.pending_fingerprints:
+                    self.fingerprint_index.add(file_id, *self.pending_fingerprints[file_id])
+            except Exception as e:
+                logger.warning(f"Failed to update indexes for file {file_id}: {e}")
+    
+    def _split_job(self, job_data: Dict[str, Any], audio, start_time: float) -> bool:
+        """
+        Queue a long recording as silence-aligned, overlapping chunk tasks on
+        job:new so every free worker takes a share (see chunked_jobs)
+        
+        Args:
+            job_data: Job data of the recording
+            audio: Decoded audio (16kHz)
+            start_time: Job start (processing_time of the merged transcript)
+        
+        Returns:
+            False if the recording is transcribed in one piece instead
+        """
+        job_id = job_data.get('jobId')
+        file_id = job_data.get('fileId')
+        audio_duration = len(audio) / 16000.0
+        
+        self.profiler.mark('split')
+        plans = plan_chunks(audio, self.chunk_seconds, self.chunk_overlap_seconds)
+        if len(plans) < 2:
+            return False
+        self._publish_progress(job_id, 15, f"音声を{len(plans)}チャンクに分割中...")
+        
+        # Upload every chunk before queueing any task
+        for plan in plans:
+            self._check_cancelled(job_id)
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=f"chunks/{job_id}/{plan.index:03d}.wav",
+                Body=encode_wav(audio[int(plan.start * 16000):int(plan.end * 16000)]),
+                ContentType='audio/wav'
+            )
+        if file_id in self.pending_fingerprints:
+            # The reducer (maybe on another worker) indexes it once the merged transcript is stored
+            hashes, times, duration = self.pending_fingerprints[file_id]
+            buffer = io.BytesIO()
+            np.savez(buffer, hashes=hashes, times=times, duration=duration)
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=f"chunks/{job_id}/fingerprint.npz",
+                Body=buffer.getvalue(),
+                ContentType='application/octet-stream'
+            )
+        self.redis_client.sadd('chunked_jobs', job_id)
+        for plan in plans:
+            self._publish_task(job_id, f"{plan.index:03d}", {
+                'jobId': f"{job_id}:chunk:{plan.index:03d}",
+                'task': 'chunk',
+                'parentJobId': job_id,
+                'fileId': file_id,
+                's3Key': f"chunks/{job_id}/{plan.index:03d}.wav",
+                'priority': job_data.get('priority', 0),
+                'chunk': plan.to_dict(),
+                'chunkCount': len(plans),
+                'duration': audio_duration,
+                'startedAt': start_time,
+            })
+        logger.info(
+            f"Split job {job_id} ({audio_duration:.0f}s) into {len(plans)} chunk tasks "
+            f"of ~{self.chunk_seconds:.0f}s (+{self.chunk_overlap_seconds:.0f}s overlap)"
+        )
+        return True
+    
+    def _publish_task(self, parent_id: str, name: str, task: Dict[str, Any]):
+        """Publish a chunk or reduce task, keeping it for the sweep to re-publish"""
+        self.redis_client.hset(f"job:{parent_id}:tasks", name, json.dumps(task))
+        self.redis_client.hset(f"job:{parent_id}:task_times", name, time.time())
+        for key in ('tasks', 'task_times'):
+            self.redis_client.expire(f"job:{parent_id}:{key}", 86400)
+        self.redis_client.publish('job:new', json.dumps(task))
+    
+    def _sweep_chunk_tasks(self):
+        """
+        Re-publish the chunk/reduce tasks of split jobs whose worker was lost or
+        that are overdue, and fail a recording after CHUNK_MAX_ATTEMPTS (one
+        worker sweeps per heartbeat interval)
+        """
+        if not self.redis_client.set('chunked_jobs:sweep', self.worker_id, nx=True,
+                                     ex=max(1, int(self.heartbeat_interval))):
+            return
+        for parent_id in self.redis_client.smembers('chunked_jobs'):
+            tasks = self.redis_client.hgetall(f"job:{parent_id}:tasks")
+            if not tasks or self.redis_client.exists(f"job:{parent_id}:chunks_failed"):
+                self.redis_client.srem('chunked_jobs', parent_id)
+                continue
+            tasks = {name: json.loads(task) for name, task in tasks.items()}
+            times = self.redis_client.hgetall(f"job:{parent_id}:task_times")
+            done = self.redis_client.smembers(f"job:{parent_id}:chunks_done")
+            started = {name: float(times.get(name, 0)) for name in tasks if name not in done}
+            claims = {name: self.redis_client.get(f"job:{tasks[name]['jobId']}:claim") for name in started}
+            alive = {
+                worker for worker in set(claims.values()) - {None}
+                if self.redis_client.exists(f"worker:{worker}:heartbeat")
+            }
+            
+            for name, reason in overdue_tasks(
+                started, claims, alive, time.time(), self.chunk_deadline_seconds
+            ).items():
+                task = tasks[name]
+                if reason != 'unclaimed':
+                    attempts = self.redis_client.hincrby(f"job:{parent_id}:task_attempts", name, 1)
+                    self.redis_client.expire(f"job:{parent_id}:task_attempts", 86400)
+                    if attempts >= self.chunk_max_attempts:
+                        self._fail_split_job(
+                            parent_id, task['chunkCount'],
+                            f"Task {task['jobId']} failed {attempts} times ({reason})"
+                        )
+                        break
+                    self.redis_client.delete(f"job:{task['jobId']}:claim")
+                logger.warning(f"Re-publishing task {task['jobId']} ({reason}, claimed by {claims[name]})")
+                self._publish_task(parent_id, name, task)
+    
+    def _fail_split_job(self, parent_id: str, count: int, error: str):
+        """Stop a split job: other chunk tasks skip it, its objects are removed"""
+        self.redis_client.set(f"job:{parent_id}:chunks_failed", error, ex=86400)
+        self._delete_chunk_objects(parent_id, count)
+        self._publish_error(parent_id, error)
+    
+    def _process_chunk(self, job_data: Dict[str, Any]):
+        """
+        Map task: transcribe, align and diarize one chunk, store the result
+        with recording-wide timestamps and queue the reduce task after the last chunk
+        
+        Args:
+            job_data: Chunk task from _split_job
+        """
+        job_id = job_data['jobId']
+        parent_id = job_data['parentJobId']
+        plan = job_data['chunk']
+        count = job_data['chunkCount']
+        name = f"{plan['index']:03d}"
+        self.cancel_events.setdefault(job_id, threading.Event())
+        if self.redis_client.exists(f"job:{parent_id}:chunks_failed"):
+            logger.info(f"Skipping {job_id}: job {parent_id} has already failed")
+            return
+        if self.redis_client.sismember(f"job:{parent_id}:chunks_done", name):
+            logger.info(f"Skipping {job_id}: already done by another worker")
+            return
+        self.redis_client.hset(f"job:{parent_id}:task_times", name, time.time())
+        
+        self.subtasks[job_id] = parent_id
+        start = time.time()
+        try:
+            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
+                audio_path = tmp_file.name
+            self.s3_client.download_file(self.s3_bucket, job_data['s3Key'], audio_path)
+            audio = self._load_audio(audio_path)
+            
+            result, _ = self._recognize(audio, len(audio) / 16000.0, job_id, start, speaker_embeddings=True)
+            shift_result(result, plan['start'])
+            result.update(plan)
+            result['processing_time'] = time.time() - start
+            if self.redis_client.exists(f"job:{parent_id}:chunks_failed"):
+                return
+            if self.redis_client.sismember(f"job:{parent_id}:chunks_done", name):
+                return  # re-published while this worker was slow; the other run counted
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=f"chunks/{parent_id}/{plan['index']:03d}.json",
+                Body=json.dumps(result, ensure_ascii=False),
+                ContentType='application/json'
+            )
+            
+            added = self.redis_client.sadd(f"job:{parent_id}:chunks_done", name)
+            self.redis_client.expire(f"job:{parent_id}:chunks_done", 86400)
+            done = self.redis_client.scard(f"job:{parent_id}:chunks_done")
+            self.subtasks.pop(job_id, None)
+            self._publish_progress(parent_id, 15 + 70 * done // count, f"分散文字起こし中（{done}/{count}チャンク完了）")
+            logger.info(f"Chunk {plan['index'] + 1}/{count} of job {parent_id} done in {result['processing_time']:.1f}s")
+            if added and done == count:
+                # Two last chunks finishing together both publish; the reduce claim keeps one
+                self._publish_task(parent_id, 'reduce', {
+                    'jobId': f"{parent_id}:reduce",
+                    'task': 'reduce',
+                    'parentJobId': parent_id,
+                    'fileId': job_data.get('fileId'),
+                    'priority': job_data.get('priority', 0),
+                    'chunkCount': count,
+                    'duration': job_data['duration'],
+                    'startedAt': job_data['startedAt'],
+                })
+        except JobCancelledError:
+            self.redis_client.set(f"job:{parent_id}:chunks_failed", job_id, ex=86400)
+            self._delete_chunk_objects(parent_id, count)
+            self._publish_cancelled(parent_id)
+            raise
+        except Exception as e:
+            logger.error(f"Chunk task {job_id} failed: {e}", exc_info=True)
+            self.subtasks.pop(job_id, None)
+            self._fail_split_job(parent_id, count, f"Chunk {plan['index']} failed: {e}")
+            raise
+        finally:
+            self.subtasks.pop(job_id, None)
+            if 'audio_path' in locals() and os.path.exists(audio_path):
+                os.unlink(audio_path)
+    
+    def _process_reduce(self, job_data: Dict[str, Any]):
+        """
+        Reduce task: merge the chunk results into one transcript (speakers
+        reconciled across chunks) and store it like a single job's transcript
+        
+        Args:
+            job_data: Reduce task from the last chunk task
+        """
+        job_id = job_data['parentJobId']
+        file_id = job_data.get('fileId')
+        count = job_data['chunkCount']
+        self.cancel_events.setdefault(job_data['jobId'], threading.Event())
+        self.redis_client.hset(f"job:{job_id}:task_times", 'reduce', time.time())
+        
+        try:
+            self._publish_progress(job_id, 85, "チャンク結果を統合中...")
+            chunks = [
+                json.loads(self.s3_client.get_object(
+                    Bucket=self.s3_bucket, Key=f"chunks/{job_id}/{index:03d}.json"
+                )['Body'].read())
+                for index in range(count)
+            ]
+            merged = merge_chunk_results(chunks, self.chunk_speaker_threshold)
+            stats = merged.pop("chunks")
+            logger.info(
+                f"Merged {count} chunks of job {job_id}: {len(merged['segments'])} segments, "
+                f"{stats['speakers']} speakers ({stats['speaker_reconciliation']})"
+            )
+            
+            output = self._format_output(merged, job_data['duration'], job_data['startedAt'], job_id)
+            output["chunks"] = dict(
+                stats,
+                chunk_seconds=self.chunk_seconds,
+                overlap_seconds=self.chunk_overlap_seconds,
+                chunk_processing_time=sum(chunk.get('processing_time', 0.0) for chunk in chunks),
+            )
+            output["version"] = 1
+            self._publish_progress(job_id, 100, "完了")
+            
+            fingerprint_data = self._load_chunk_fingerprint(job_id)
+            if fingerprint_data is not None and file_id:
+                self.pending_fingerprints[file_id] = fingerprint_data
+            self._finalize_transcript(job_id, file_id, output)
+            self._delete_chunk_objects(job_id, count)
+            logger.info(f"Job {job_id} completed successfully ({count} chunks)")
+        except Exception as e:
+            logger.error(f"Reduce of job {job_id} failed: {e}", exc_info=True)
+            self._publish_error(job_id, str(e))
+            raise
+        finally:
+            if file_id:
+                self.pending_fingerprints.pop(file_id, None)
+    
+    def _load_chunk_fingerprint(self, job_id: str) -> Optional[tuple]:
+        """Fingerprint of a split recording stored by _split_job (None if de-duplication was off)"""
+        try:
+            obj = self.s3_client.get_object(Bucket=self.s3_bucket, Key=f"chunks/{job_id}/fingerprint.npz")
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        with np.load(io.BytesIO(obj['Body'].read())) as data:
+            return data['hashes'], data['times'], float(data['duration'])
+    
+    def _delete_chunk_objects(self, job_id: str, count: int):
+        """Remove a split job's chunk audio, results and fingerprint from S3 and its Redis task state"""
+        keys = [f"chunks/{job_id}/{index:03d}.{suffix}" for index in range(count) for suffix in ('wav', 'json')]
+        for key in keys + [f"chunks/{job_id}/fingerprint.npz"]:
+            try:
+                self.s3_client.delete_object(Bucket=self.s3_bucket, Key=key)
+            except Exception as e:
+                logger.warning(f"Failed to delete chunk object of job {job_id}: {e}")
+        self.redis_client.delete(
+            f"job:{job_id}:chunks_done", f"job:{job_id}:tasks",
+            f"job:{job_id}:task_times", f"job:{job_id}:task_attempts"
+        )
+        self.redis_client.srem('chunked_jobs', job_id)
+    
+    def _store_profile(self, job_id: str, file_id: str, status: str):
+        """Stop the job profiler and upload its report next to the transcript"""
+        profiler, self.profiler = self.profiler, NullProfiler()
+        try:
+            profile = profiler.stop()
+            if profile is None:
+                return
+            profile_key = f"transcripts/{file_id}.profile.json"
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=profile_key,
+                Body=json.dumps(
+                    {'jobId': job_id, 'fileId': file_id, 'status': status, **profile},
+                    ensure_ascii=False,
+                    indent=2
+                ),
+                ContentType='application/json'
+            )
+            logger.info(f"Uploaded job profile to S3: {profile_key}")
+        except Exception as e:
+            logger.warning(f"Failed to store profile for job {job_id}: {e}")
     
     def run(self):
         """Run worker main loop"""
+        asyncio.run(self.run_async())
+    
+    async def run_async(self):
+        """
+        asyncio control plane: listens for jobs and control commands, sends
+        heartbeats and runs one job at a time on the job executor thread, so
+        commands are handled while a job is running
+        """
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        
+        async_redis = self._create_async_redis()
+        pubsub = async_redis.pubsub()
+        await pubsub.subscribe('job:new', 'worker:control')
+        
         logger.info("Worker is ready and listening for jobs...")
+        logger.info("Subscribed to Redis channels: job:new, worker:control")
+        logger.info(f"Worker ID: {self.worker_id}")
+        self.startup_phases['ready'] = time.time() - PROCESS_START
+        self._set_readiness('ready')
+        
+        tasks = [
+            asyncio.create_task(self._listen(pubsub)),
+            asyncio.create_task(self._consume_jobs(async_redis)),
+            asyncio.create_task(self._heartbeat_loop(async_redis)),
+        ]
+        try:
+            await self.stop_event.wait()
+        finally:
+            logger.info("Worker shutting down...")
+            tasks += self.background_tasks.values()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self._send_heartbeat(async_redis, status='stopped')
+            except Exception as e:
+                logger.warning(f"Failed to send final heartbeat: {e}")
+            self._set_readiness('stopped')
+            await pubsub.reset()
+            await getattr(async_redis, 'aclose', async_redis.close)()
+            self.executor.shutdown(wait=False)
+            # Let a drain finish a pending canonical copy so the next run does not transcode again
+            self.ingest_executor.shutdown(wait=self.draining and self.running)
+            if self.diarization_runner is not None:
+                self.diarization_runner.shutdown()
+    
+    def _create_async_redis(self):
+        """Create the asyncio Redis client used by the control plane"""
+        redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
+        return aioredis.Redis.from_url(redis_url, decode_responses=True)
+    
+    async def _listen(self, pubsub):
+        """Dispatch job:new and worker:control messages"""
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    try:
+                        data = json.loads(message['data'])
+                    except json.JSONDecodeError:
+                        logger.warning(f"Ignoring malformed message on {message['channel']}")
+                        continue
+                    
+                    if message['channel'] == 'job:new':
+                        self._enqueue(data)
+                    else:
+                        await self._handle_control(data)
+            except redis.ConnectionError as e:
+                logger.error(f"Redis connection lost: {e}, retrying...")
+                await asyncio.sleep(1)
+    
+    def _enqueue(self, job_data: Dict[str, Any]):
+        """Queue a job locally; it is claimed only when this worker is free to run it"""
+        if self.draining:
+            logger.info(f"Draining, leaving job {job_data.get('jobId')} to other workers")
+            return
+        job_id = job_data.get('jobId')
+        priority = int(job_data.get('priority', 0))
+        entry = [-priority, next(self._sequence), job_data, True]
+        self.pending[job_id] = entry
+        self.queue.put_nowait(entry)
+        logger.info(f"Queued job {job_id} (priority {priority}, {len(self.pending)} waiting)")
+    
+    async def _handle_control(self, command: Dict[str, Any]):
+        """
+        Handle a worker:control command
+        
+        Args:
+            command: {command: cancel|priority|drain|recorrect|backfill|calibrate, jobId?, fileId?, workerId?, ...}
+        """
+        target = command.get('workerId')
+        if target and target != self.worker_id:
+            return
+        
+        name = command.get('command')
+        if name == 'cancel':
+            file_id = command.get('fileId')
+            self._cancel(job_id=command.get('jobId'), file_id=file_id)
+            if command.get('reason') == 'deleted' and file_id:
+                await self.loop.run_in_executor(None, self.search_index.delete_transcript, file_id)
+                await self.loop.run_in_executor(None, self.term_index.delete_transcript, file_id)
+                await self.loop.run_in_executor(None, self.fingerprint_index.remove, file_id)
+                await self.loop.run_in_executor(None, self.segment_store.delete_transcript, file_id)
+        elif name == 'priority':
+            entry = self.pending.get(command.get('jobId'))
+            if entry is not None:
+                entry[3] = False
+                self._enqueue(dict(entry[2], priority=int(command.get('priority', 0))))
+        elif name == 'drain':
+            self._request_drain()
+        elif name == 'recorrect':
+            self._run_in_background('recorrect', None, lambda: self._run_leased('recorrect', self.recorrect_transcripts))
+        elif name == 'backfill':
+            self._run_in_background('backfill', None, lambda: self._run_leased('backfill', self.backfill_term_index))
+        elif name == 'calibrate':
+            # On the job executor: runs between jobs, never alongside one
+            self._run_in_background('calibrate', self.executor, self._recalibrate)
+        else:
+            logger.warning(f"Unknown control command: {command}")
+    
+    def _run_in_background(self, name: str, executor: Optional[ThreadPoolExecutor], fn: Callable):
+        """
+        Run a long control command off the listener, so cancel/priority/drain
+        and job:new are still handled while it runs
+        
+        Args:
+            name: Command name (one run per command at a time)
+            executor: Executor to run fn on (None: the loop's default executor)
+            fn: Blocking function
+        """
+        running = self.background_tasks.get(name)
+        if running is not None and not running.done():
+            logger.info(f"Command {name} is already running, ignoring")
+            return
         
-        pubsub = self.redis_client.pubsub()
-        pubsub.subscribe('job:new')
+        async def run():
+            start = time.time()
+            try:
+                result = await self.loop.run_in_executor(executor, fn)
+                logger.info(f"Command {name} finished in {time.time() - start:.1f}s: {result}")
+            except Exception as e:
+                logger.error(f"Command {name} failed: {e}", exc_info=True)
         
-        logger.info("Subscribed to Redis channel: job:new")
-        logger.info("Waiting for transcription jobs...")
+        self.background_tasks[name] = asyncio.create_task(run())
+    
+    def _run_leased(self, name: str, fn: Callable) -> Optional[Any]:
+        """
+        Run a fleet-wide control command on exactly one worker: worker:control
+        reaches every worker, the first to take the Redis lease runs it (like
+        the job claims). The heartbeat keeps the lease alive while it runs.
+        
+        Args:
+            name: Command name
+            fn: Blocking function
         
-        for message in pubsub.listen():
-            if not self.running:
-                logger.info("Worker shutting down...")
-                break
+        Returns:
+            fn's result, None when another worker holds the lease
+        """
+        key = f"control:{name}:lease"
+        if not self.redis_client.set(key, self.worker_id, nx=True, ex=max(1, int(self.heartbeat_interval * 3))):
+            logger.info(f"Command {name} is running on worker {self.redis_client.get(key)}, skipping")
+            return None
+        self.leases.add(key)
+        try:
+            return fn()
+        finally:
+            self.leases.discard(key)
+            if self.redis_client.get(key) == self.worker_id:
+                self.redis_client.delete(key)
+    
+    async def _consume_jobs(self, async_redis):
+        """Run queued jobs one at a time on the job executor"""
+        while True:
+            if self.draining or not self.running:
+                self.stop_event.set()
+                return
+            
+            entry = await self.queue.get()
+            _, _, job_data, valid = entry
+            if not valid:
+                continue
+            job_id = job_data.get('jobId')
+            self.pending.pop(job_id, None)
+            
+            # With several workers subscribed, the first free one claims the job
+            claimed = await async_redis.set(f"job:{job_id}:claim", self.worker_id, nx=True, ex=86400)
+            if not claimed:
+                logger.info(f"Job {job_id} already claimed by another worker")
+                continue
             
-            if message['type'] == 'message':
-                try:
-                    job_data = json.loads(message['data'])
-                    self.process_job(job_data)
-                except Exception as e:
-                    logger.error(f"Error processing job: {e}", exc_info=True)
+            self.current_job = job_data
+            self.cancel_events[job_id] = threading.Event()
+            try:
+                await self.loop.run_in_executor(self.executor, self.process_job, job_data)
+            except JobCancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"Error processing job: {e}", exc_info=True)
+            finally:
+                self.current_job = None
+                self.cancel_events.pop(job_id, None)
+            await self._send_heartbeat(async_redis)
+    
+    async def _heartbeat_loop(self, async_redis):
+        """Publish worker state every heartbeat interval, renew held leases and sweep lost chunk tasks"""
+        while True:
+            try:
+                await self._send_heartbeat(async_redis)
+                for key in list(self.leases):
+                    await async_redis.expire(key, max(1, int(self.heartbeat_interval * 3)))
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {e}")
+            try:
+                await self.loop.run_in_executor(None, self._sweep_chunk_tasks)
+            except Exception as e:
+                logger.warning(f"Chunk task sweep failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+    
+    async def _send_heartbeat(self, async_redis, status: Optional[str] = None):
+        """Store and publish the current worker state"""
+        current = self.current_job
+        if status is None:
+            status = 'draining' if self.draining else ('busy' if current else 'idle')
+        payload = json.dumps({
+            'workerId': self.worker_id,
+            'status': status,
+            'jobId': current.get('jobId') if current else None,
+            'queued': len(self.pending),
+            'timestamp': time.time()
+        })
+        await async_redis.set(
+            f"worker:{self.worker_id}:heartbeat",
+            payload,
+            ex=max(1, int(self.heartbeat_interval * 3))
+        )
+        await async_redis.publish('worker:heartbeat', payload)
+
+
+def _edit_distance(reference: str, hypothesis: str) -> int:
+    """
+    Character-level Levenshtein distance
+    
+    Draft and refined windows mostly agree, so the shared prefix and suffix
+    are stripped and the table is filled only in a diagonal band that doubles
+    until the distance fits inside it: O(n·d) time and O(d) memory instead of
+    O(n·m) for the whole table.
+    """
+    if len(reference) < len(hypothesis):
+        reference, hypothesis = hypothesis, reference
+    prefix = 0
+    while prefix < len(hypothesis) and reference[prefix] == hypothesis[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < len(hypothesis) - prefix
+           and reference[-1 - suffix] == hypothesis[-1 - suffix]):
+        suffix += 1
+    reference = reference[prefix:len(reference) - suffix]
+    hypothesis = hypothesis[prefix:len(hypothesis) - suffix]
+    if not hypothesis:
+        return len(reference)
+    
+    band = max(len(reference) - len(hypothesis), 8)
+    while True:
+        distance = _banded_edit_distance(reference, hypothesis, band)
+        # Paths leaving the band cost more than the band width, so a result inside it is exact
+        if distance <= band:
+            return distance
+        band *= 2
+
+
+def _banded_edit_distance(reference: str, hypothesis: str, band: int) -> int:
+    """
+    Levenshtein distance over cells with |i - j| <= band (an upper bound otherwise)
+    
+    Only the 2·band+1 cells of the band are kept per row, offset-indexed
+    (cell k of row i is column j = i - band + k), in two rows reused for the
+    whole table. Needs band >= len(reference) - len(hypothesis).
+    """
+    m = len(hypothesis)
+    width = 2 * band + 1
+    unreachable = len(reference) + m + 1
+    # One spare unreachable cell: read past the band's upper edge, and as index -1 past its lower edge
+    previous = [k - band if 0 <= k - band <= m else unreachable for k in range(width)] + [unreachable]
+    current = [unreachable] * (width + 1)
+    for i, ref_char in enumerate(reference, 1):
+        offset = i - band
+        for k in range(width):
+            j = offset + k
+            if j < 0 or j > m:
+                current[k] = unreachable
+            elif j == 0:
+                current[k] = i
+            else:
+                # Row i - 1 is shifted one cell left: its column j is previous[k + 1]
+                current[k] = min(
+                    previous[k + 1] + 1,
+                    current[k - 1] + 1,
+                    previous[k] + (ref_char != hypothesis[j - 1])
+                )
+        previous, current = current, previous
+    return previous[m - len(reference) + band]
 
 
 def main():
     """Main entry point"""
     try:
         worker = WhisperXTranscriptionWorker()
+        if '--startup-benchmark' in sys.argv:
+            print(json.dumps(worker.startup_phases, indent=2))
+            return
         worker.run()
     except KeyboardInterrupt:
         logger.info("Worker interrupted by user")
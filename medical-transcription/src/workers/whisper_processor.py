@@ -5,11 +5,12 @@ Handles actual audio transcription with GPU/CPU fallback
 """
 
 import os
+import time
 import logging
 import tempfile
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 import json
 
 import numpy as np
@@ -17,6 +18,8 @@ import soundfile as sf
 
 logger = logging.getLogger(__name__)
 
+SAMPLE_RATE = 16000
+
 @dataclass
 class Segment:
     """Transcription segment with timing and confidence"""
@@ -27,6 +30,109 @@ class Segment:
     confidence: float
     no_speech_prob: float
 
+@dataclass
+class AdaptiveDecodingConfig:
+    """Thresholds for confidence-driven selective re-decoding"""
+    first_pass_beam_size: int = 1
+    logprob_threshold: float = -1.0
+    no_speech_threshold: float = 0.6
+    compression_ratio_threshold: float = 2.4
+    retry_beam_size: int = 5
+    retry_best_of: int = 5
+    retry_temperatures: Tuple[float, ...] = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+    padding_seconds: float = 0.3
+    
+    @classmethod
+    def from_env(cls) -> "AdaptiveDecodingConfig":
+        """Build config from WHISPER_ADAPTIVE_* environment variables (TEMPERATURES: comma list)"""
+        defaults = cls()
+        return cls(
+            first_pass_beam_size=int(os.getenv('WHISPER_ADAPTIVE_FIRST_BEAM', defaults.first_pass_beam_size)),
+            logprob_threshold=float(os.getenv('WHISPER_ADAPTIVE_LOGPROB_THRESHOLD', defaults.logprob_threshold)),
+            no_speech_threshold=float(os.getenv('WHISPER_ADAPTIVE_NO_SPEECH_THRESHOLD', defaults.no_speech_threshold)),
+            compression_ratio_threshold=float(
+                os.getenv('WHISPER_ADAPTIVE_COMPRESSION_THRESHOLD', defaults.compression_ratio_threshold)
+            ),
+            retry_beam_size=int(os.getenv('WHISPER_ADAPTIVE_RETRY_BEAM', defaults.retry_beam_size)),
+            retry_best_of=int(os.getenv('WHISPER_ADAPTIVE_RETRY_BEST_OF', defaults.retry_best_of)),
+            retry_temperatures=tuple(
+                float(value) for value in os.getenv('WHISPER_ADAPTIVE_TEMPERATURES', '').split(',') if value.strip()
+            ) or defaults.retry_temperatures,
+        )
+    
+    def needs_redecode(self, segment: Dict[str, Any]) -> bool:
+        """Whether a first-pass segment is suspicious enough to decode again"""
+        return (
+            segment['confidence'] < self.logprob_threshold
+            or segment['no_speech_prob'] > self.no_speech_threshold
+            or segment.get('compression_ratio', 0.0) > self.compression_ratio_threshold
+        )
+
+
+def _segment_to_dict(segment, offset: float = 0.0) -> Dict[str, Any]:
+    """Convert a faster-whisper segment to a plain dict, shifted by offset seconds"""
+    seg_dict = {
+        'id': segment.id,
+        'start': segment.start + offset,
+        'end': segment.end + offset,
+        'text': segment.text.strip(),
+        'confidence': segment.avg_logprob,  # Log probability as confidence
+        'no_speech_prob': segment.no_speech_prob,
+        'compression_ratio': segment.compression_ratio,
+        'words': []
+    }
+    
+    # Add word-level timestamps if available
+    if hasattr(segment, 'words') and segment.words:
+        seg_dict['words'] = [
+            {
+                'word': word.word,
+                'start': word.start + offset,
+                'end': word.end + offset,
+                'confidence': word.probability
+            }
+            for word in segment.words
+        ]
+    return seg_dict
+
+
+def _clip_to_span(segments: List[Dict[str, Any]], start: float, end: float) -> List[Dict[str, Any]]:
+    """
+    Cut re-decoded segments back to the span of the segment they replace
+    
+    The retry decodes the segment padded on both sides, so its output can
+    repeat words of the neighbouring segments. Words are kept if their
+    midpoint lies inside [start, end]; segments without words by their own
+    midpoint.
+    """
+    clipped = []
+    for seg in segments:
+        words = [
+            dict(word, start=max(word['start'], start), end=min(word['end'], end))
+            for word in seg['words'] if start <= (word['start'] + word['end']) / 2 <= end
+        ]
+        if seg['words']:
+            if not words:
+                continue
+            text = seg['text'] if len(words) == len(seg['words']) else ''.join(w['word'] for w in words).strip()
+        elif start <= (seg['start'] + seg['end']) / 2 <= end:
+            text = seg['text']
+        else:
+            continue
+        clipped.append(dict(seg, start=max(seg['start'], start), end=min(seg['end'], end), text=text, words=words))
+    return clipped
+
+
+def _sort_segments(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Segments in time order, dropping a repeat of the overlapping segment before it"""
+    ordered: List[Dict[str, Any]] = []
+    for seg in sorted(segments, key=lambda seg: (seg['start'], seg['end'])):
+        if ordered and seg['text'] == ordered[-1]['text'] and seg['start'] < ordered[-1]['end']:
+            continue
+        ordered.append(seg)
+    return ordered
+
+
 class WhisperProcessor:
     """Whisper transcription processor with GPU/CPU fallback"""
     
@@ -34,22 +140,31 @@ class WhisperProcessor:
         self,
         model_size: str = "large-v3",
         device: str = "auto",
-        compute_type: str = "auto"
+        compute_type: str = "auto",
+        model=None
     ):
         """
         Initialize Whisper processor
         
         Args:
-            model_size: Model size (tiny, base, small, medium, large-v2, large-v3)
+            model_size: Model size (tiny, base, small, medium, large-v2, large-v3),
+                or auto for the calibrated model and compute type of this host
             device: Device to use (auto, cuda, cpu)
             compute_type: Compute type (auto, float16, int8, int8_float16)
+            model: Already loaded model with the faster-whisper transcribe()
+                interface (e.g. the load-test stub); skips model loading
         """
         self.model_size = model_size
         self.model = None
         self.device_used = None
         self.compute_type_used = None
         
-        self._initialize_model(device, compute_type)
+        if model is not None:
+            self.model = model
+            self.device_used = device
+            self.compute_type_used = compute_type
+        else:
+            self._initialize_model(device, compute_type)
     
     def _initialize_model(self, device: str, compute_type: str):
         """Initialize faster-whisper model with fallback strategy"""
@@ -66,7 +181,9 @@ class WhisperProcessor:
         if device == "auto":
             device = self._detect_device()
         
-        if compute_type == "auto":
+        if self.model_size == "auto":
+            self.model_size, compute_type = self._calibrate(device, WhisperModel)
+        elif compute_type == "auto":
             compute_type = self._detect_compute_type(device)
         
         logger.info(f"Initializing Whisper model: {self.model_size}")
@@ -117,8 +234,27 @@ class WhisperProcessor:
         logger.info("Using CPU device")
         return "cpu"
     
+    def _calibrate(self, device: str, model_class) -> Tuple[str, str]:
+        """Calibrated (model size, compute type) for this host, benchmarking if needed"""
+        from calibration import auto_configure
+        
+        def load_model(model_size: str, compute_type: str):
+            return model_class(model_size, device=device, compute_type=compute_type)
+        
+        def transcribe(model, audio: np.ndarray):
+            segments, _ = model.transcribe(audio, language="ja", beam_size=5)
+            return list(segments)
+        
+        entry = auto_configure(device, load_model, transcribe)
+        return entry['model_size'], entry['compute_type']
+    
     def _detect_compute_type(self, device: str) -> str:
-        """Detect best compute type for device"""
+        """Detect best compute type for device (calibrated choice for this model if any)"""
+        from calibration import calibrated_compute_type
+        
+        calibrated = calibrated_compute_type(device, self.model_size)
+        if calibrated:
+            return calibrated
         if device == "cuda":
             # NVIDIA GPU: use float16 for speed
             return "float16"
@@ -135,7 +271,9 @@ class WhisperProcessor:
         beam_size: int = 5,
         best_of: int = 5,
         temperature: float = 0.0,
-        progress_callback: Optional[callable] = None
+        progress_callback: Optional[callable] = None,
+        decoding: str = "fixed",
+        adaptive_config: Optional["AdaptiveDecodingConfig"] = None
     ) -> Dict[str, Any]:
         """
         Transcribe audio data
@@ -149,6 +287,9 @@ class WhisperProcessor:
             best_of: Number of candidates when sampling
             temperature: Temperature for sampling (0.0 = deterministic)
             progress_callback: Optional callback for progress updates
+            decoding: "fixed" (beam_size/best_of everywhere) or "adaptive"
+                (cheap first pass, re-decode only low-confidence segments)
+            adaptive_config: Thresholds for adaptive decoding (default: from env)
             
         Returns:
             Dict with transcript, segments, language, and metadata
@@ -166,17 +307,28 @@ class WhisperProcessor:
                 
                 logger.info(f"Transcribing audio file: {os.path.getsize(tmp_path)} bytes")
                 
-                # Transcribe with faster-whisper
-                segments_iter, info = self.model.transcribe(
-                    tmp_path,
-                    language=language,
-                    task=task,
-                    vad_filter=vad_filter,
-                    beam_size=beam_size,
-                    best_of=best_of,
-                    temperature=temperature,
-                    word_timestamps=True  # Enable word-level timestamps
-                )
+                decoding_stats = None
+                if decoding == "adaptive":
+                    segment_dicts, info, decoding_stats = self._transcribe_adaptive(
+                        tmp_path,
+                        adaptive_config or AdaptiveDecodingConfig.from_env(),
+                        language=language,
+                        task=task,
+                        vad_filter=vad_filter
+                    )
+                else:
+                    # Transcribe with faster-whisper
+                    segments_iter, info = self.model.transcribe(
+                        tmp_path,
+                        language=language,
+                        task=task,
+                        vad_filter=vad_filter,
+                        beam_size=beam_size,
+                        best_of=best_of,
+                        temperature=temperature,
+                        word_timestamps=True  # Enable word-level timestamps
+                    )
+                    segment_dicts = (_segment_to_dict(segment) for segment in segments_iter)
                 
                 # Process segments
                 segments = []
@@ -185,40 +337,21 @@ class WhisperProcessor:
                 segment_count = 0
                 
                 logger.info("Processing segments...")
-                for i, segment in enumerate(segments_iter):
-                    seg_dict = {
-                        'id': i,
-                        'start': segment.start,
-                        'end': segment.end,
-                        'text': segment.text.strip(),
-                        'confidence': segment.avg_logprob,  # Log probability as confidence
-                        'no_speech_prob': segment.no_speech_prob,
-                        'words': []
-                    }
-                    
-                    # Add word-level timestamps if available
-                    if hasattr(segment, 'words') and segment.words:
-                        seg_dict['words'] = [
-                            {
-                                'word': word.word,
-                                'start': word.start,
-                                'end': word.end,
-                                'confidence': word.probability
-                            }
-                            for word in segment.words
-                        ]
+                for i, seg_dict in enumerate(segment_dicts):
+                    seg_dict['id'] = i
+                    seg_dict.pop('compression_ratio', None)
                     
                     segments.append(seg_dict)
-                    full_text_parts.append(segment.text.strip())
+                    full_text_parts.append(seg_dict['text'])
                     
-                    total_confidence += segment.avg_logprob
+                    total_confidence += seg_dict['confidence']
                     segment_count += 1
                     
                     # Call progress callback every 10 segments
                     if progress_callback and i % 10 == 0:
                         progress_callback(i)
                     
-                    logger.debug(f"Segment {i}: {segment.start:.2f}s - {segment.end:.2f}s")
+                    logger.debug(f"Segment {i}: {seg_dict['start']:.2f}s - {seg_dict['end']:.2f}s")
                 
                 # Calculate average confidence
                 avg_confidence = total_confidence / segment_count if segment_count > 0 else 0.0
@@ -243,6 +376,8 @@ class WhisperProcessor:
                         'compute_type': self.compute_type_used
                     }
                 }
+                if decoding_stats is not None:
+                    result['decoding'] = decoding_stats
                 
                 return result
                 
@@ -253,6 +388,106 @@ class WhisperProcessor:
                 except Exception as e:
                     logger.warning(f"Failed to delete temp file: {e}")
     
+    def _transcribe_adaptive(
+        self,
+        audio_path: str,
+        config: "AdaptiveDecodingConfig",
+        language: str,
+        task: str,
+        vad_filter: bool
+    ) -> Tuple[List[Dict[str, Any]], Any, Dict[str, Any]]:
+        """
+        Greedy/small-beam first pass, then re-decode only the segments whose
+        confidence statistics fall outside the configured thresholds
+        
+        Args:
+            audio_path: Path to audio file
+            config: Adaptive decoding thresholds
+            language: Language code
+            task: Task type
+            vad_filter: Enable Voice Activity Detection for the first pass
+            
+        Returns:
+            Tuple of (segment dicts, transcription info, decoding statistics)
+        """
+        from faster_whisper import decode_audio as decode_with_pyav
+        from audio_decode import decode_audio
+        
+        audio = decode_audio(
+            audio_path,
+            fallback=lambda path: decode_with_pyav(path, sampling_rate=SAMPLE_RATE)
+        )
+        
+        first_pass_start = time.time()
+        segments_iter, info = self.model.transcribe(
+            audio,
+            language=language,
+            task=task,
+            vad_filter=vad_filter,
+            beam_size=config.first_pass_beam_size,
+            best_of=1,
+            temperature=0.0,
+            word_timestamps=True
+        )
+        segments = [_segment_to_dict(segment) for segment in segments_iter]
+        first_pass_seconds = time.time() - first_pass_start
+        
+        redecode_start = time.time()
+        redecoded = 0
+        replaced = 0
+        output: List[Dict[str, Any]] = []
+        for seg_dict in segments:
+            if not config.needs_redecode(seg_dict):
+                output.append(seg_dict)
+                continue
+            
+            redecoded += 1
+            start = max(0.0, seg_dict['start'] - config.padding_seconds)
+            end = min(len(audio) / SAMPLE_RATE, seg_dict['end'] + config.padding_seconds)
+            retry_iter, _ = self.model.transcribe(
+                audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)],
+                language=language,
+                task=task,
+                vad_filter=False,
+                beam_size=config.retry_beam_size,
+                best_of=config.retry_best_of,
+                temperature=list(config.retry_temperatures),
+                word_timestamps=True
+            )
+            retry = _clip_to_span(
+                [_segment_to_dict(segment, offset=start) for segment in retry_iter],
+                seg_dict['start'],
+                seg_dict['end']
+            )
+            
+            # Keep the re-decoded text only if it is at least as confident
+            if retry:
+                retry_logprob = sum(r['confidence'] for r in retry) / len(retry)
+                if retry_logprob >= seg_dict['confidence']:
+                    output.extend(retry)
+                    replaced += 1
+                    continue
+            output.append(seg_dict)
+        output = _sort_segments(output)
+        redecode_seconds = time.time() - redecode_start
+        
+        fraction = redecoded / len(segments) if segments else 0.0
+        logger.info(
+            f"Adaptive decoding: re-decoded {redecoded}/{len(segments)} segments "
+            f"({fraction:.1%}), replaced {replaced}"
+        )
+        stats = {
+            'mode': 'adaptive',
+            'segments': len(segments),
+            'redecoded': redecoded,
+            'redecoded_fraction': fraction,
+            'replaced': replaced,
+            'first_pass_seconds': first_pass_seconds,
+            'redecode_seconds': redecode_seconds,
+            'thresholds': asdict(config),
+        }
+        return output, info, stats
+    
     def get_model_info(self) -> Dict[str, Any]:
         """Get model information"""
         return {
@@ -270,10 +505,11 @@ def test_whisper_processor():
     logging.basicConfig(level=logging.INFO)
     
     if len(sys.argv) < 2:
-        print("Usage: python whisper_processor.py <audio_file>")
+        print("Usage: python whisper_processor.py <audio_file> [fixed|adaptive]")
         sys.exit(1)
     
     audio_file = sys.argv[1]
+    decoding = sys.argv[2] if len(sys.argv) > 2 else "fixed"
     
     if not os.path.exists(audio_file):
         print(f"Error: File not found: {audio_file}")
@@ -297,7 +533,9 @@ def test_whisper_processor():
     
     # Transcribe
     print("\nTranscribing...")
-    result = processor.transcribe_audio(audio_data, language="ja")
+    start = time.time()
+    result = processor.transcribe_audio(audio_data, language="ja", decoding=decoding)
+    elapsed = time.time() - start
     
     print("\n" + "="*80)
     print("TRANSCRIPTION RESULT")
@@ -305,6 +543,10 @@ def test_whisper_processor():
     print(f"\nLanguage: {result['language']} (prob: {result['language_probability']:.2%})")
     print(f"Duration: {result['duration']:.2f}s")
     print(f"Confidence: {result['confidence']:.2f}")
+    print(f"Decoding: {decoding} ({elapsed:.2f}s, RTF {elapsed / max(result['duration'], 1e-6):.3f})")
+    if 'decoding' in result:
+        print(f"Re-decoded: {result['decoding']['redecoded']}/{result['decoding']['segments']} "
+              f"segments ({result['decoding']['redecoded_fraction']:.1%})")
     print(f"\nFull text:\n{result['text']}")
     print(f"\nSegments: {len(result['segments'])}")
     